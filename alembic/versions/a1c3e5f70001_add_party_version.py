@@ -0,0 +1,29 @@
+"""add party version
+
+Revision ID: a1c3e5f70001
+Revises: 
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows start at version 1
+    with op.batch_alter_table('parties') as batch_op:
+        batch_op.add_column(
+            sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('parties') as batch_op:
+        batch_op.drop_column('version')
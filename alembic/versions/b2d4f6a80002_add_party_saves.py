@@ -0,0 +1,37 @@
+"""add party saves history
+
+Revision ID: b2d4f6a80002
+Revises: a1c3e5f70001
+Create Date: 2026-10-18 11:40:07.552913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a80002'
+down_revision = 'a1c3e5f70001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'party_saves',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('scene_index', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index(
+        'ix_party_saves_session_version', 'party_saves', ['session_id', 'version'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_party_saves_session_version', table_name='party_saves')
+    op.drop_table('party_saves')
@@ -0,0 +1,23 @@
+"""add party session version index
+
+Revision ID: c3e5a7b90003
+Revises: b2d4f6a80002
+Create Date: 2026-10-18 14:02:55.104736
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b90003'
+down_revision = 'b2d4f6a80002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_parties_session_version', 'parties', ['session_id', 'version'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_parties_session_version', table_name='parties')
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import threading
+import time
+
+
+class SessionStateCache:
+    """
+    Bounded in-process cache of load responses, keyed by session ID.
+
+    Entries are evicted least-recently-used once capacity is reached, and
+    expire after ttl seconds when a ttl is set. Saves overwrite entries with
+    put(); read misses fill them with add(), which never replaces an entry a
+    concurrent save has already written. Entries stored with a version are
+    only replaced by a newer one, so saves finishing out of order leave the
+    latest state cached.
+    """
+
+    def __init__(self, capacity: int = 1024, ttl: float = 0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Return the cached response, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at and expires_at <= time.monotonic():
+                    del self._entries[session_id]
+                else:
+                    self._entries.move_to_end(session_id)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, session_id: str, value: Any, version: Optional[int] = None) -> None:
+        """
+        Store a response, replacing any cached one of an older version
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and version is not None and entry[2] is not None \
+                    and entry[2] >= version:
+                return
+            self._store(session_id, value, version)
+
+    def add(self, session_id: str, value: Any, version: Optional[int] = None) -> None:
+        """
+        Store a response unless one is already cached
+        """
+        with self._lock:
+            if session_id not in self._entries:
+                self._store(session_id, value, version)
+
+    def invalidate(self, session_id: str) -> None:
+        """
+        Drop the cached response for a session
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        """
+        Drop every cached response
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return size and hit/miss counters
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _store(self, session_id: str, value: Any, version: Optional[int]) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        self._entries[session_id] = (value, expires_at, version)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
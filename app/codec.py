@@ -0,0 +1,193 @@
+from sqlalchemy import (
+    JSON, Column, LargeBinary, MetaData, Table, Text, bindparam, cast, inspect, select, text,
+    type_coerce
+)
+from sqlalchemy.types import TypeDecorator
+from typing import Any
+import argparse
+import json
+import os
+import struct
+import zlib
+
+# Frame header: magic byte, format version, flags, uncompressed payload length.
+# The magic byte can never start a JSON document, so legacy rows are told
+# apart from framed ones by their first byte.
+FRAME_MAGIC = b"\xa7"
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+HEADER = struct.Struct(">cBBI")
+
+# Column codec for Party.heroes and Party.choices: "json" or "compact"
+PARTY_STATE_CODEC = os.getenv("PARTY_STATE_CODEC", "json")
+# Framed payloads at least this large are zlib-compressed (0 disables it)
+PARTY_STATE_COMPRESS_THRESHOLD = int(os.getenv("PARTY_STATE_COMPRESS_THRESHOLD", "1024"))
+
+
+def encode(value: Any, compress_threshold: int = PARTY_STATE_COMPRESS_THRESHOLD) -> bytes:
+    """
+    Encode a JSON-compatible value as a versioned, length-prefixed frame
+    """
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    body, flags = raw, 0
+    if compress_threshold and len(raw) >= compress_threshold:
+        compressed = zlib.compress(raw)
+        if len(compressed) < len(raw):
+            body, flags = compressed, FLAG_ZLIB
+    return HEADER.pack(FRAME_MAGIC, FORMAT_VERSION, flags, len(raw)) + body
+
+
+def decode(data: Any) -> Any:
+    """
+    Decode a frame, or a legacy JSON value stored before the codec was enabled
+    """
+    if data is None or isinstance(data, (dict, list)):
+        # Already decoded by a native JSON column
+        return data
+    if isinstance(data, str):
+        return json.loads(data)
+    return json.loads(frame_payload(bytes(data)))
+
+
+def frame_payload(data: bytes) -> bytes:
+    """
+    Return the raw JSON bytes held by a frame (or legacy JSON bytes as is)
+    """
+    if not data.startswith(FRAME_MAGIC):
+        return data
+    _, version, flags, length = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported party state format version: {version}")
+    payload = data[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    if len(payload) != length:
+        raise ValueError("Party state frame length does not match its payload")
+    return payload
+
+
+class CompactJSON(TypeDecorator):
+    """
+    Stores JSON values as compact binary frames, reading legacy JSON rows
+    transparently
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+def party_state_type():
+    """
+    Column type for the party state columns, chosen by PARTY_STATE_CODEC
+    """
+    return CompactJSON() if PARTY_STATE_CODEC == "compact" else JSON
+
+
+def raw_party_state_column(column):
+    """
+    Select a party state column as its stored JSON, so it can be sent to
+    clients without being decoded and re-encoded
+    """
+    if PARTY_STATE_CODEC == "compact":
+        return type_coerce(column, LargeBinary)
+    return cast(column, Text)
+
+
+def raw_party_state(value: Any) -> bytes:
+    """
+    JSON bytes of a value selected with raw_party_state_column()
+    """
+    if value is None:
+        return b"null"
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return frame_payload(bytes(value))
+
+
+def convert_party_state(engine, to_compact: bool, batch_size: int = 500) -> int:
+    """
+    Rewrite every stored party state in the compact or plain JSON format.
+
+    On PostgreSQL the heroes and choices columns also change type between
+    json and bytea. Rows are converted in id order, one batch per
+    transaction. Returns the number of rows converted.
+    """
+    from app.models import Party
+
+    columns = ("heroes", "choices")
+    postgres = engine.dialect.name == "postgresql"
+    raw = Table(
+        "parties", MetaData(),
+        Column("id", Party.__table__.c.id.type, primary_key=True),
+        *[Column(name, LargeBinary if to_compact or postgres else Text) for name in columns]
+    )
+
+    # Only change column types that are not already in the target form, so
+    # an interrupted conversion can simply be run again
+    binary = postgres and all(
+        isinstance(column["type"], LargeBinary)
+        for column in inspect(engine).get_columns("parties") if column["name"] in columns
+    )
+    if postgres and to_compact and not binary:
+        with engine.begin() as conn:
+            for name in columns:
+                conn.execute(text(
+                    f"ALTER TABLE parties ALTER COLUMN {name} TYPE bytea "
+                    f"USING convert_to({name}::text, 'UTF8')"
+                ))
+
+    update = raw.update().where(raw.c.id == bindparam("_id")).values(
+        **{name: bindparam(name) for name in columns}
+    )
+    converted, last_id = 0, None
+    while True:
+        query = select(raw).order_by(raw.c.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(raw.c.id > last_id)
+        with engine.begin() as conn:
+            rows = conn.execute(query).all()
+            if not rows:
+                break
+            params = []
+            for row in rows:
+                values = {"_id": row.id}
+                for name in columns:
+                    value = decode(getattr(row, name))
+                    if to_compact:
+                        values[name] = encode(value)
+                    else:
+                        dumped = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+                        values[name] = dumped.encode("utf-8") if postgres else dumped
+                params.append(values)
+            conn.execute(update, params)
+        converted += len(rows)
+        last_id = rows[-1].id
+
+    if postgres and not to_compact and binary:
+        with engine.begin() as conn:
+            for name in columns:
+                conn.execute(text(
+                    f"ALTER TABLE parties ALTER COLUMN {name} TYPE json "
+                    f"USING convert_from({name}, 'UTF8')::json"
+                ))
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored party state between codecs")
+    parser.add_argument("target", choices=["compact", "json"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    from app.database import engines
+
+    count = sum(
+        convert_party_state(shard_engine, args.target == "compact", args.batch_size)
+        for shard_engine in engines
+    )
+    print(f"Converted {count} parties to {args.target}")
@@ -1,19 +1,29 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.sharding import ShardRouter
+from src.engines import async_url, create_async_session_factory, create_tuned_engine
 import os
 from urllib.parse import urlparse
 
 # Get database URL from environment, default to SQLite for demo
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./omega.db")
 
-# For PostgreSQL URLs, we might need to handle connection pooling
-if DATABASE_URL.startswith("postgresql"):
-    # Add connection parameters for PostgreSQL if needed
-    DATABASE_URL = DATABASE_URL
+# Comma-separated database URLs to hash-shard parties across by session ID.
+# When set, these replace DATABASE_URL for the game API.
+SHARD_DATABASE_URLS = [
+    url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()
+]
 
-engine = create_engine(DATABASE_URL, echo=False)  # Set echo=True for SQL debugging
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+shard_router = None
+if SHARD_DATABASE_URLS:
+    shard_router = ShardRouter(SHARD_DATABASE_URLS, engine_factory=create_tuned_engine)
+    engine = shard_router.engines[0]
+    engines = list(shard_router.engines.values())
+    SessionLocal = shard_router.session_factory
+else:
+    engine = create_tuned_engine(DATABASE_URL)  # Pass echo=True for SQL debugging
+    engines = [engine]
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
@@ -22,4 +32,20 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async engine for the async request path (opt-in, needs greenlet and an
+# async driver such as aiosqlite or asyncpg)
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() == "true"
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB_ENABLED:
+    if shard_router is not None:
+        raise RuntimeError("ASYNC_DB_ENABLED does not support SHARD_DATABASE_URLS yet")
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url(DATABASE_URL))
+    async_engine, AsyncSessionLocal = create_async_session_factory(ASYNC_DATABASE_URL)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
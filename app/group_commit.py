@@ -0,0 +1,130 @@
+from concurrent.futures import Future
+from app.store import party_values, upsert_parties
+from typing import Callable, Dict, Any, Optional
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Collects saves that arrive within a short window and writes them to the
+    parties table in a single transaction.
+
+    Each caller gets its own future, resolved once the batch holding its save
+    has committed. Saves for the same session_id inside one batch collapse
+    into the last one, so only the newest state is written. The values
+    written by each batch, keyed by session ID and including the new version,
+    are passed to on_write (with the session, inside the batch transaction)
+    and to on_commit (after the batch has committed) when those are given.
+    """
+
+    def __init__(self, session_factory, window_ms: float = 5.0, max_batch: int = 256,
+                 on_write: Optional[Callable[[Any, Dict[str, Dict[str, Any]]], None]] = None,
+                 on_commit: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None):
+        self.session_factory = session_factory
+        self.on_write = on_write
+        self.on_commit = on_commit
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, state: Dict[str, Any]) -> Future:
+        """
+        Queue a save and return a future resolving to the saved scene index
+        """
+        # Map the payload up front so a malformed save fails its own request
+        # instead of the whole batch
+        values = party_values(state)
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((session_id, values, future))
+        return future
+
+    def save(self, session_id: str, state: Dict[str, Any], timeout: Optional[float] = None) -> int:
+        """
+        Queue a save and block until its batch has committed
+        """
+        return self.submit(session_id, state).result(timeout)
+
+    def stop(self) -> None:
+        """
+        Flush everything queued so far and stop the writer thread
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch) -> None:
+        # Later saves for a session overwrite earlier ones in the same batch
+        latest = {}
+        for session_id, values, _ in batch:
+            latest[session_id] = values
+
+        db = self.session_factory()
+        try:
+            saved = {
+                session_id: {**latest[session_id], "version": version}
+                for session_id, (_, version) in upsert_parties(db, latest).items()
+            }
+            if self.on_write is not None:
+                self.on_write(db, saved)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Group commit of {len(batch)} saves failed: {str(e)}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(saved)
+            except Exception as e:
+                logger.error(f"Group commit callback failed: {str(e)}")
+
+        for _, values, future in batch:
+            future.set_result(values["scene_index"])
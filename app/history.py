@@ -0,0 +1,246 @@
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from app.models import PartySave
+from app.patch import MERGE_PATCH, JSON_PATCH, apply_patch, diff_json_patch
+from app.store import values_state
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT = "snapshot"
+
+# History entry kind for each patch content type, and back
+PATCH_KINDS = {MERGE_PATCH: "merge-patch", JSON_PATCH: "json-patch"}
+KIND_CONTENT_TYPES = {kind: content_type for content_type, kind in PATCH_KINDS.items()}
+
+
+def record_saves(db: Session, saved: Dict[str, Dict[str, Any]],
+                 snapshot_interval: int = 0) -> None:
+    """
+    Append a history entry for each full save, keyed by session ID with
+    column values including the new version.
+
+    Like record_patch, a full snapshot is written every snapshot_interval
+    versions; other saves are stored as a JSON Patch against the previous
+    version, rebuilt from the history in one query. A save whose previous
+    version is not in the history is stored as a snapshot.
+
+    The caller owns the transaction: nothing is committed here.
+    """
+    previous = {}
+    if snapshot_interval:
+        previous = states_before(db, {
+            session_id: values["version"] for session_id, values in saved.items()
+            if values["version"] % snapshot_interval
+        }, snapshot_interval)
+    entries = []
+    for session_id, values in saved.items():
+        state = values_state(values)
+        kind, payload = SNAPSHOT, state
+        if session_id in previous:
+            kind, payload = PATCH_KINDS[JSON_PATCH], diff_json_patch(previous[session_id], state)
+        entries.append(PartySave(
+            session_id=session_id,
+            version=values["version"],
+            scene_index=values["scene_index"],
+            kind=kind,
+            payload=payload
+        ))
+    db.add_all(entries)
+
+
+def states_before(db: Session, versions: Dict[str, int],
+                  snapshot_interval: int) -> Dict[str, Dict[str, Any]]:
+    """
+    The state of each session at the version before the given one, for the
+    sessions whose history holds it. A snapshot is written at least every
+    snapshot_interval versions, so only that many entries are read.
+    """
+    if not versions:
+        return {}
+    entries = db.query(PartySave).filter(or_(*[
+        and_(PartySave.session_id == session_id,
+             PartySave.version >= version - snapshot_interval,
+             PartySave.version < version)
+        for session_id, version in versions.items()
+    ])).order_by(PartySave.session_id, PartySave.version).all()
+    by_session: Dict[str, List[PartySave]] = {}
+    for entry in entries:
+        by_session.setdefault(entry.session_id, []).append(entry)
+    states = {}
+    for session_id, session_entries in by_session.items():
+        rebuilt = replay(session_entries, versions[session_id] - 1)
+        if rebuilt is not None:
+            states[session_id] = rebuilt[1]
+    return states
+
+
+def replay(entries: Iterable[PartySave], version: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """
+    Rebuild (version, state) from entries in version order, starting at the
+    last snapshot at or before version. None unless every version from that
+    snapshot up to version is present.
+    """
+    state, reached = None, None
+    for entry in entries:
+        if entry.version > version:
+            break
+        if entry.kind == SNAPSHOT:
+            state, reached = entry.payload, entry.version
+        elif reached is not None and entry.version == reached + 1:
+            state = apply_patch(KIND_CONTENT_TYPES[entry.kind], state, entry.payload)
+            reached = entry.version
+        else:
+            state, reached = None, None
+    if reached != version:
+        return None
+    return reached, state
+
+
+def record_patch(db: Session, session_id: str, previous: Dict[str, Any],
+                 saved: Dict[str, Any], snapshot_interval: int) -> None:
+    """
+    Append the entry for a patched save, from the column values before the
+    patch and the saved column values including the new version.
+
+    The entry holds what was saved, not the client's patch document: a JSON
+    Patch from the previous state to the saved one, or a full snapshot every
+    snapshot_interval versions so replays never walk more than
+    snapshot_interval - 1 deltas.
+
+    The caller owns the transaction: nothing is committed here.
+    """
+    version = saved["version"]
+    state = values_state(saved)
+    if snapshot_interval and version % snapshot_interval == 0:
+        kind, payload = SNAPSHOT, state
+    else:
+        kind, payload = PATCH_KINDS[JSON_PATCH], diff_json_patch(values_state(previous), state)
+    db.add(PartySave(
+        session_id=session_id,
+        version=version,
+        scene_index=saved["scene_index"],
+        kind=kind,
+        payload=payload
+    ))
+
+
+def load_as_of(db: Session, session_id: str, version: Optional[int] = None,
+               scene_index: Optional[int] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """
+    Rebuild the (version, state) of a session as of a version, or as of the
+    latest save at or before a scene.
+
+    Replays deltas on top of the nearest snapshot at or before the target.
+    Returns None when the target is not covered by the retained history.
+    """
+    entries = db.query(PartySave).filter(PartySave.session_id == session_id)
+    if scene_index is not None:
+        target = entries.filter(PartySave.scene_index <= scene_index).with_entities(
+            func.max(PartySave.version)
+        ).scalar()
+        if target is None:
+            return None
+        version = target if version is None else min(version, target)
+    if version is None:
+        version = entries.with_entities(func.max(PartySave.version)).scalar()
+        if version is None:
+            return None
+
+    snapshot = entries.filter(
+        PartySave.kind == SNAPSHOT, PartySave.version <= version
+    ).order_by(PartySave.version.desc()).first()
+    if snapshot is None:
+        return None
+
+    return replay(entries.filter(
+        PartySave.version >= snapshot.version, PartySave.version <= version
+    ).order_by(PartySave.version), version)
+
+
+def compact_session(db: Session, session_id: str, max_entries: int) -> int:
+    """
+    Drop the oldest history entries of a session beyond max_entries, turning
+    the oldest entry kept into a snapshot so it still replays on its own.
+
+    Returns the number of entries deleted. The caller owns the transaction.
+    """
+    entries = db.query(PartySave).filter(PartySave.session_id == session_id)
+    oldest_kept = entries.order_by(PartySave.version.desc()).offset(max_entries - 1).first()
+    if oldest_kept is None:
+        return 0
+
+    if oldest_kept.kind != SNAPSHOT:
+        rebuilt = load_as_of(db, session_id, version=oldest_kept.version)
+        if rebuilt is None:
+            return 0
+        oldest_kept.kind = SNAPSHOT
+        oldest_kept.payload = rebuilt[1]
+
+    return entries.filter(PartySave.version < oldest_kept.version).delete(
+        synchronize_session=False
+    )
+
+
+def compact_history(db: Session, max_entries: int) -> int:
+    """
+    Compact every session holding more than max_entries history entries
+    """
+    oversized = db.query(PartySave.session_id).group_by(PartySave.session_id).having(
+        func.count(PartySave.id) > max_entries
+    ).all()
+    deleted = 0
+    for (session_id,) in oversized:
+        deleted += compact_session(db, session_id, max_entries)
+        db.commit()
+    return deleted
+
+
+class HistoryCompactor:
+    """
+    Background thread that periodically bounds history storage per session
+    """
+
+    def __init__(self, session_factory, max_entries: int = 100, interval: float = 60.0):
+        self.session_factory = session_factory
+        self.max_entries = max_entries
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start compacting in the background
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the compactor thread
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> int:
+        """
+        Run a single compaction pass and return the number of entries deleted
+        """
+        db = self.session_factory()
+        try:
+            return compact_history(db, self.max_entries)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"History compaction failed: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -1,15 +1,134 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.models import Party
-from app.database import SessionLocal, engine
-from typing import Dict, Any
+from app.database import SessionLocal, engines, shard_router, ASYNC_DB_ENABLED, get_async_db
+from app.cache import SessionStateCache
+from app.group_commit import GroupCommitWriter
+from app.history import HistoryCompactor, record_saves, record_patch, load_as_of
+from app.transfer import iter_export, import_lines, iter_lines
+from app.schemas import (
+    SaveBatchRequest, SaveRequest, SaveResponse, SaveState, LoadBatchRequest, LoadResponse,
+    BATCH_MAX_SESSIONS, SAVE_MAX_BODY_BYTES,
+    error_summary, read_body, read_save, read_save_batch, validation_errors
+)
+from app.patch import MERGE_PATCH, JSON_PATCH, PatchError, PatchTestFailed, apply_patch
+from app.store import (
+    get_party, get_party_version, get_party_raw, get_parties_raw, upsert_parties, party_values,
+    party_state, raw_state, values_state
+)
+from src.structured_logging import configure_logging
+from src.api.middleware import ProfilingMiddleware, PROFILING_ENABLED
+from src.admission import install_admission
+from src.idempotency import install_idempotency
+from src.metrics import install_metrics
+from src.query_stats import install_query_stats
+from src.singleflight import SingleFlight, AsyncSingleFlight
+from src.json_encoding import FastJSONResponse, dumps
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+import anyio
+import asyncio
+import json
 import os
 
 # Create database tables
 from app.models import Base
-Base.metadata.create_all(bind=engine)
+for shard_engine in engines:
+    Base.metadata.create_all(bind=shard_engine)
 
-app = FastAPI(title="Spiral Archives API", version="1.0.0")
+configure_logging()
+
+# Group commit batches concurrent saves into one transaction (opt-in)
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "256"))
+
+# Rows per chunk for NDJSON export and per transaction for import
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Append-only save history for time-travel loads (opt-in)
+SAVE_HISTORY_ENABLED = os.getenv("SAVE_HISTORY_ENABLED", "false").lower() == "true"
+SAVE_HISTORY_SNAPSHOT_INTERVAL = int(os.getenv("SAVE_HISTORY_SNAPSHOT_INTERVAL", "20"))
+SAVE_HISTORY_MAX_ENTRIES = int(os.getenv("SAVE_HISTORY_MAX_ENTRIES", "100"))
+SAVE_HISTORY_COMPACT_INTERVAL = float(os.getenv("SAVE_HISTORY_COMPACT_INTERVAL", "60"))
+
+history_compactor = None
+if SAVE_HISTORY_ENABLED:
+    history_compactor = HistoryCompactor(
+        SessionLocal,
+        max_entries=SAVE_HISTORY_MAX_ENTRIES,
+        interval=SAVE_HISTORY_COMPACT_INTERVAL
+    )
+
+def record_history(db: Session, saved: Dict[str, Dict[str, Any]]) -> None:
+    record_saves(db, saved, SAVE_HISTORY_SNAPSHOT_INTERVAL)
+
+# Read-through cache of load responses, refreshed by saves (0 disables it)
+LOAD_CACHE_SIZE = int(os.getenv("LOAD_CACHE_SIZE", "0"))
+LOAD_CACHE_TTL = float(os.getenv("LOAD_CACHE_TTL", "0"))
+
+load_cache = None
+if LOAD_CACHE_SIZE > 0:
+    load_cache = SessionStateCache(capacity=LOAD_CACHE_SIZE, ttl=LOAD_CACHE_TTL)
+
+# Concurrent loads of the same session share one query
+load_flights = SingleFlight("load")
+async_load_flights = AsyncSingleFlight("load")
+
+def encode_load_response(session_id: str, state: Dict[str, Any]) -> bytes:
+    return dumps({"session_id": session_id, "state": state})
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+def etag_matches(header: str, version: int) -> bool:
+    # A comma-separated If-Match or If-None-Match list, or "*". Tags compare
+    # by their opaque part, so a weak W/ form of the current tag matches too
+    tag = etag(version)
+    return any(
+        candidate.strip() in ("*", tag, f"W/{tag}") for candidate in header.split(",")
+    )
+
+def refresh_load_cache(saved: Dict[str, Dict[str, Any]]):
+    for session_id, values in saved.items():
+        body = encode_load_response(session_id, values_state(values))
+        load_cache.put(session_id, (values["version"], body), version=values["version"])
+
+group_commit = None
+if GROUP_COMMIT_ENABLED:
+    group_commit = GroupCommitWriter(
+        SessionLocal,
+        window_ms=GROUP_COMMIT_WINDOW_MS,
+        max_batch=GROUP_COMMIT_MAX_BATCH,
+        on_write=record_history if SAVE_HISTORY_ENABLED else None,
+        on_commit=refresh_load_cache if load_cache is not None else None
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if history_compactor is not None:
+        history_compactor.start()
+    yield
+    # Flush any saves still waiting for their batch
+    if group_commit is not None:
+        group_commit.stop()
+    if history_compactor is not None:
+        history_compactor.stop()
+
+# Endpoints return FastJSONResponse themselves where it matters, which also
+# skips FastAPI's jsonable_encoder pass
+app = FastAPI(title="Spiral Archives API", version="1.0.0", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+install_idempotency(app)
+install_admission(app)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+install_query_stats(app)
+install_metrics(app)
 
 # Dependency to get database session
 def get_db():
@@ -19,55 +138,314 @@ def get_db():
     finally:
         db.close()
 
-@app.post("/api/v1/save")
-def save_game(payload: Dict[str, Any], db: Session = Depends(get_db)):
-    session_id = payload["session_id"]
-    state = payload["state"]
+def write_save(db: Session, session_id: str, state: Dict[str, Any]) -> int:
+    values = party_values(state)
+    scene_index, version = upsert_parties(db, {session_id: values})[session_id]
+    if SAVE_HISTORY_ENABLED:
+        record_history(db, {session_id: {**values, "version": version}})
+    db.commit()
+    if load_cache is not None:
+        refresh_load_cache({session_id: {**values, "version": version}})
+    return scene_index
 
-    # Try to find existing party
-    party = db.query(Party).filter(Party.session_id == session_id).first()
+def save_game(payload: SaveRequest = Depends(read_save), db: Session = Depends(get_db)):
+    session_id = payload.session_id
+    state = payload.state.to_state()
 
-    if not party:
-        # Create new party on first save
-        party = Party(
-            session_id=session_id,
-            name=state["party_name"],
-            heroes=state["heroes"],
-            symbol_choice=state.get("symbol_choice"),
-            scene_index=state["scene_index"],
-            choices=state.get("choices", {})
-        )
-        db.add(party)
+    if group_commit is not None:
+        # Wait for the batch holding this save to commit
+        scene_index = group_commit.save(session_id, state)
     else:
-        # Update existing
-        party.name = state["party_name"]
-        party.heroes = state["heroes"]
-        party.symbol_choice = state.get("symbol_choice")
-        party.scene_index = state["scene_index"]
-        party.choices = state.get("choices", {})
-    
-    db.commit()
-    db.refresh(party)
-    return {"status": "saved", "scene_index": party.scene_index}
+        scene_index = write_save(db, session_id, state)
+    return FastJSONResponse({"status": "saved", "scene_index": scene_index})
+
+async def save_game_async(payload: SaveRequest = Depends(read_save), db=Depends(get_async_db)):
+    session_id = payload.session_id
+    state = payload.state.to_state()
 
-@app.get("/api/v1/load/{session_id}")
-def load_game(session_id: str, db: Session = Depends(get_db)):
-    party = db.query(Party).filter(Party.session_id == session_id).first()
-    
+    if group_commit is not None:
+        scene_index = await asyncio.wrap_future(group_commit.submit(session_id, state))
+    else:
+        scene_index = await db.run_sync(write_save, session_id, state)
+    return FastJSONResponse({"status": "saved", "scene_index": scene_index})
+
+app.add_api_route(
+    "/api/v1/save", save_game_async if ASYNC_DB_ENABLED else save_game, methods=["POST"],
+    response_model=SaveResponse
+)
+
+async def read_patch(request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in (MERGE_PATCH, JSON_PATCH):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Patch must be {MERGE_PATCH} or {JSON_PATCH}"
+        )
+    try:
+        document = json.loads(await read_body(request, SAVE_MAX_BODY_BYTES))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Patch body is not valid JSON")
+    return content_type, document
+
+@app.patch("/api/v1/save/{session_id}", response_model=SaveResponse)
+def patch_game(session_id: str, patch=Depends(read_patch),
+               if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    if if_match is None:
+        raise HTTPException(status_code=428, detail="If-Match header with the base version is required")
+
+    party = get_party(db, session_id)
     if not party:
         raise HTTPException(status_code=404, detail="No saved game")
-    
-    return {
-        "session_id": session_id,
-        "state": {
-            "scene_index": party.scene_index,
-            "party_name": party.name,
-            "heroes": party.heroes,
-            "symbol_choice": party.symbol_choice,
-            "choices": party.choices
+    if not etag_matches(if_match, party.version):
+        raise HTTPException(status_code=412, detail="Saved game has changed since the base version")
+
+    content_type, document = patch
+    try:
+        state = apply_patch(content_type, party_state(party), document)
+        values = party_values(SaveState.model_validate(state).to_state())
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=f"Patch produced an invalid state: {e}")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=validation_errors(e))
+
+    # Only write the columns the patch actually changed
+    previous = {key: getattr(party, key) for key in values}
+    changed = {key: value for key, value in values.items() if previous[key] != value}
+    version = party.version
+    if changed:
+        updated = db.query(Party).filter(
+            Party.session_id == session_id, Party.id == party.id, Party.version == version
+        ).update({**changed, Party.version: version + 1}, synchronize_session=False)
+        if not updated:
+            db.rollback()
+            raise HTTPException(status_code=412, detail="Saved game has changed since the base version")
+        version += 1
+        if SAVE_HISTORY_ENABLED:
+            record_patch(db, session_id, previous, {**values, "version": version},
+                         SAVE_HISTORY_SNAPSHOT_INTERVAL)
+        db.commit()
+        if load_cache is not None:
+            refresh_load_cache({session_id: {**values, "version": version}})
+
+    return FastJSONResponse(
+        {"status": "saved", "scene_index": values["scene_index"], "version": version},
+        headers={"ETag": etag(version)}
+    )
+
+def write_batch(db: Session, latest: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    try:
+        saved = {
+            session_id: {**latest[session_id], "version": version}
+            for session_id, (_, version) in upsert_parties(db, latest).items()
         }
+        if SAVE_HISTORY_ENABLED:
+            record_history(db, saved)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return saved
+
+@app.post("/api/v1/save/batch")
+def save_game_batch(payload: SaveBatchRequest = Depends(read_save_batch),
+                    db: Session = Depends(get_db)):
+    saves = payload.saves
+    if len(saves) > BATCH_MAX_SESSIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_SESSIONS} saves per batch")
+
+    # Map every save first so a malformed entry only fails itself
+    results: List[Dict[str, Any]] = []
+    latest: Dict[str, Dict[str, Any]] = {}
+    for item in saves:
+        try:
+            save = SaveRequest.model_validate(item)
+        except ValidationError as e:
+            session_id = item.get("session_id") if isinstance(item, dict) else None
+            results.append({
+                "session_id": session_id if isinstance(session_id, str) else None,
+                "status": "error",
+                "error": f"Invalid save: {error_summary(e)}"
+            })
+            continue
+        session_id = save.session_id
+        values = party_values(save.state.to_state())
+        # Repeated sessions collapse into the last save
+        latest[session_id] = values
+        results.append({"session_id": session_id, "status": "saved", "scene_index": values["scene_index"]})
+
+    if latest:
+        if shard_router is not None:
+            # Each shard commits its own part of the batch, in parallel
+            outcomes = shard_router.map_shards(
+                lambda shard_db, session_ids: write_batch(
+                    shard_db, {session_id: latest[session_id] for session_id in session_ids}
+                ),
+                latest
+            )
+        else:
+            try:
+                outcomes = [(list(latest), write_batch(db, latest), None)]
+            except Exception as e:
+                outcomes = [(list(latest), None, e)]
+
+        failed: Dict[str, Exception] = {}
+        for session_ids, saved, error in outcomes:
+            if error is not None:
+                failed.update(dict.fromkeys(session_ids, error))
+            elif load_cache is not None:
+                refresh_load_cache(saved)
+        for result in results:
+            if result["status"] == "saved" and result["session_id"] in failed:
+                result.update(status="error", error=f"Batch write failed: {failed[result['session_id']]}")
+                del result["scene_index"]
+
+    return FastJSONResponse({"results": results})
+
+@app.post("/api/v1/load/batch")
+def load_game_batch(payload: LoadBatchRequest, db: Session = Depends(get_db)):
+    requested = list(dict.fromkeys(payload.session_ids))
+    bodies: Dict[str, bytes] = {}
+    misses = []
+    for session_id in requested:
+        cached = load_cache.get(session_id) if load_cache is not None else None
+        if cached is not None:
+            bodies[session_id] = cached[1]
+        else:
+            misses.append(session_id)
+
+    if misses:
+        if shard_router is not None:
+            parties = []
+            for _, shard_parties, error in shard_router.map_shards(get_parties_raw, misses):
+                if error is not None:
+                    raise error
+                parties.extend(shard_parties)
+        else:
+            parties = get_parties_raw(db, misses)
+        for party in parties:
+            body = encode_load_response(party.session_id, raw_state(party))
+            bodies[party.session_id] = body
+            if load_cache is not None:
+                load_cache.add(party.session_id, (party.version, body), version=party.version)
+
+    # Each body is already a serialized {"session_id", "state"} object
+    missing = [session_id for session_id in requested if session_id not in bodies]
+    content = b"".join([
+        b'{"sessions":[',
+        b",".join(bodies[session_id] for session_id in requested if session_id in bodies),
+        b'],"missing":',
+        dumps(missing),
+        b"}"
+    ])
+    return FastJSONResponse(content)
+
+def read_load(db: Session, session_id: str,
+              if_none_match: Optional[str] = None) -> Optional[Tuple[int, Optional[bytes]]]:
+    if if_none_match is not None:
+        # Answer revalidations from the version index without touching the
+        # JSON columns
+        version = get_party_version(db, session_id)
+        if version is None:
+            return None
+        if etag_matches(if_none_match, version):
+            return version, None
+
+    # Heroes and choices go out as stored, without a decode/encode round trip
+    party = get_party_raw(db, session_id)
+    if not party:
+        return None
+
+    body = encode_load_response(session_id, raw_state(party))
+    if load_cache is not None:
+        load_cache.add(session_id, (party.version, body), version=party.version)
+    return party.version, body
+
+def load_response(loaded: Optional[Tuple[int, Optional[bytes]]],
+                  if_none_match: Optional[str] = None) -> Response:
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="No saved game")
+    version, body = loaded
+    if body is None or (if_none_match is not None and etag_matches(if_none_match, version)):
+        return Response(status_code=304, headers={"ETag": etag(version)})
+    return FastJSONResponse(body, headers={"ETag": etag(version)})
+
+def load_game(session_id: str, if_none_match: Optional[str] = Header(None),
+              db: Session = Depends(get_db)):
+    loaded = load_cache.get(session_id) if load_cache is not None else None
+    if loaded is None:
+        loaded, _ = load_flights.do(
+            (session_id, if_none_match), lambda: read_load(db, session_id, if_none_match)
+        )
+    return load_response(loaded, if_none_match)
+
+async def load_game_async(session_id: str, if_none_match: Optional[str] = Header(None),
+                          db=Depends(get_async_db)):
+    loaded = load_cache.get(session_id) if load_cache is not None else None
+    if loaded is None:
+        loaded, _ = await async_load_flights.do(
+            (session_id, if_none_match), lambda: db.run_sync(read_load, session_id, if_none_match)
+        )
+    return load_response(loaded, if_none_match)
+
+app.add_api_route(
+    "/api/v1/load/{session_id}", load_game_async if ASYNC_DB_ENABLED else load_game,
+    methods=["GET"], response_model=LoadResponse
+)
+
+@app.get("/api/v1/load/{session_id}/history")
+def load_game_as_of(session_id: str, version: Optional[int] = None, scene: Optional[int] = None,
+                    db: Session = Depends(get_db)):
+    if not SAVE_HISTORY_ENABLED:
+        raise HTTPException(status_code=404, detail="Save history is disabled")
+    rebuilt = load_as_of(db, session_id, version=version, scene_index=scene)
+    if rebuilt is None:
+        raise HTTPException(status_code=404, detail="No saved history for that point")
+    version, state = rebuilt
+    return FastJSONResponse({"session_id": session_id, "version": version, "state": state})
+
+@app.get("/api/v1/export")
+def export_parties():
+    return StreamingResponse(
+        iter_export(SessionLocal, EXPORT_CHUNK_SIZE, shard_router), media_type="application/x-ndjson"
+    )
+
+def import_hooks() -> Dict[str, Any]:
+    # Imports record history and refresh the load cache like any other save
+    return {
+        "on_write": record_history if SAVE_HISTORY_ENABLED else None,
+        "on_commit": refresh_load_cache if load_cache is not None else None
     }
 
+@app.post("/api/v1/import")
+async def import_parties(request: Request):
+    hooks = import_hooks()
+    stream = request.stream()
+
+    async def next_chunk() -> Optional[bytes]:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def chunks():
+        # Pull the body from the event loop as the import thread needs it,
+        # so large imports never sit in memory
+        while (chunk := anyio.from_thread.run(next_chunk)) is not None:
+            yield chunk
+
+    return await run_in_threadpool(
+        import_lines, SessionLocal, iter_lines(chunks(), SAVE_MAX_BODY_BYTES),
+        IMPORT_BATCH_SIZE, **hooks
+    )
+
+@app.get("/api/v1/cache/stats")
+def cache_stats():
+    if load_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **load_cache.stats()}
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
\ No newline at end of file
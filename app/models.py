@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, UUID, func
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UUID, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from app.codec import party_state_type
 import uuid
 
 Base = declarative_base()
@@ -11,9 +12,31 @@ class Party(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(String, unique=True, nullable=False)  # "shard-472-demo"
     name = Column(String, nullable=False)
-    heroes = Column(JSON, nullable=False)      # full hero list with HP
+    heroes = Column(party_state_type(), nullable=False)  # full hero list with HP
     symbol_choice = Column(String, nullable=True)
     scene_index = Column(Integer, default=1)   # ← KEY FIELD
-    choices = Column(JSON, default=dict)       # {"scene8": "fight"}
+    choices = Column(party_state_type(), default=dict)   # {"scene8": "fight"}
+    version = Column(Integer, nullable=False, default=1)  # bumped on every save
     created_at = Column(DateTime(timezone=True), default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Covers version-only lookups for conditional loads
+        Index("ix_parties_session_version", "session_id", "version"),
+    )
+
+
+class PartySave(Base):
+    __tablename__ = "party_saves"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)   # Party.version this entry produced
+    scene_index = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)       # snapshot, merge-patch or json-patch
+    payload = Column(JSON, nullable=False)      # full state, or the patch document
+    created_at = Column(DateTime(timezone=True), default=func.now())
+
+    __table_args__ = (
+        Index("ix_party_saves_session_version", "session_id", "version", unique=True),
+    )
@@ -0,0 +1,196 @@
+from typing import Any, Dict, List
+import copy
+
+MERGE_PATCH = "application/merge-patch+json"
+JSON_PATCH = "application/json-patch+json"
+
+_MISSING = object()
+
+
+class PatchError(ValueError):
+    """
+    Raised when a patch document is malformed or cannot be applied
+    """
+
+
+class PatchTestFailed(PatchError):
+    """
+    Raised when a JSON Patch "test" operation does not match
+    """
+
+
+def apply_patch(content_type: str, target: Any, patch: Any) -> Any:
+    """
+    Apply a merge patch or JSON Patch document, chosen by content type
+    """
+    if content_type == MERGE_PATCH:
+        return apply_merge_patch(target, patch)
+    if content_type == JSON_PATCH:
+        return apply_json_patch(target, patch)
+    raise PatchError(f"Unsupported patch content type: {content_type}")
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """
+    Apply a JSON Merge Patch (RFC 7396) and return the patched document.
+
+    The target is never modified; only the objects along patched keys are
+    copied.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def apply_json_patch(target: Any, operations: List[Dict[str, Any]]) -> Any:
+    """
+    Apply a JSON Patch (RFC 6902) and return the patched document.
+
+    The target is never modified; only the containers along each operation's
+    path are copied, so small patches to large documents stay cheap.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("JSON Patch document must be a list of operations")
+    document = target
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PatchError("JSON Patch operation must be an object")
+        op = operation.get("op")
+        tokens = _parse_pointer(_required(operation, "path"))
+        if op == "add":
+            document = _modify(document, tokens, "add", _required(operation, "value"))
+        elif op == "remove":
+            document = _modify(document, tokens, "remove", None)
+        elif op == "replace":
+            document = _modify(document, tokens, "replace", _required(operation, "value"))
+        elif op == "move":
+            source = _parse_pointer(_required(operation, "from"))
+            value = _resolve(document, source)
+            document = _modify(document, source, "remove", None)
+            document = _modify(document, tokens, "add", value)
+        elif op == "copy":
+            source = _parse_pointer(_required(operation, "from"))
+            value = copy.deepcopy(_resolve(document, source))
+            document = _modify(document, tokens, "add", value)
+        elif op == "test":
+            if _resolve(document, tokens) != _required(operation, "value"):
+                raise PatchTestFailed(f"Test failed at {operation['path']}")
+        else:
+            raise PatchError(f"Unsupported JSON Patch operation: {op}")
+    return document
+
+
+def diff_json_patch(source: Any, target: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    A JSON Patch turning source into target. Objects, and arrays of the same
+    length, are compared member by member, so small changes to a large
+    document give a small patch.
+    """
+    if isinstance(source, dict) and isinstance(target, dict):
+        operations = []
+        for key in source:
+            if key not in target:
+                operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            if key in source:
+                operations.extend(diff_json_patch(source[key], value, f"{path}/{_escape(key)}"))
+            else:
+                operations.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+        return operations
+    if isinstance(source, list) and isinstance(target, list) and len(source) == len(target):
+        operations = []
+        for index, (old, new) in enumerate(zip(source, target)):
+            operations.extend(diff_json_patch(old, new, f"{path}/{index}"))
+        return operations
+    if type(source) is type(target) and source == target:
+        return []
+    return [{"op": "replace", "path": path, "value": target}]
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _required(operation: Dict[str, Any], key: str) -> Any:
+    value = operation.get(key, _MISSING)
+    if value is _MISSING:
+        raise PatchError(f"JSON Patch operation is missing '{key}'")
+    return value
+
+
+def _parse_pointer(pointer: str) -> List[str]:
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise PatchError(f"Invalid JSON pointer: {pointer}")
+    if not pointer:
+        return []
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise PatchError(f"Array index out of range: {token}")
+    return index
+
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise PatchError(f"Path not found: {token}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_index(document, token, allow_end=False)]
+        else:
+            raise PatchError(f"Path not found: {token}")
+    return document
+
+
+def _modify(node: Any, tokens: List[str], action: str, value: Any) -> Any:
+    if not tokens:
+        if action == "remove":
+            raise PatchError("Cannot remove the whole document")
+        return value
+
+    token, rest = tokens[0], tokens[1:]
+    if isinstance(node, dict):
+        result = dict(node)
+        if rest:
+            if token not in result:
+                raise PatchError(f"Path not found: {token}")
+            result[token] = _modify(result[token], rest, action, value)
+        elif action == "add":
+            result[token] = value
+        elif token not in result:
+            raise PatchError(f"Path not found: {token}")
+        elif action == "remove":
+            del result[token]
+        else:
+            result[token] = value
+        return result
+
+    if isinstance(node, list):
+        result = list(node)
+        if rest:
+            index = _index(result, token, allow_end=False)
+            result[index] = _modify(result[index], rest, action, value)
+        elif action == "add":
+            result.insert(_index(result, token, allow_end=True), value)
+        elif action == "remove":
+            del result[_index(result, token, allow_end=False)]
+        else:
+            result[_index(result, token, allow_end=False)] = value
+        return result
+
+    raise PatchError(f"Path not found: {token}")
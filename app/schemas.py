@@ -0,0 +1,129 @@
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Annotated, Any, Dict, List, Optional, Type, TypeVar
+import os
+
+# Largest request body accepted by the save endpoints, checked before it is
+# read in full (413 beyond it)
+SAVE_MAX_BODY_BYTES = int(os.getenv("SAVE_MAX_BODY_BYTES", "262144"))
+# Largest body accepted by POST /api/v1/save/batch
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", "8388608"))
+# Largest number of sessions accepted by the batch endpoints
+BATCH_MAX_SESSIONS = int(os.getenv("BATCH_MAX_SESSIONS", "500"))
+# Limits on the party state
+SAVE_MAX_HEROES = int(os.getenv("SAVE_MAX_HEROES", "16"))
+SAVE_MAX_CHOICES = int(os.getenv("SAVE_MAX_CHOICES", "500"))
+SAVE_MAX_STRING_LENGTH = int(os.getenv("SAVE_MAX_STRING_LENGTH", "256"))
+
+SESSION_ID_MAX_LENGTH = 128
+
+Text = Annotated[str, Field(max_length=SAVE_MAX_STRING_LENGTH)]
+SessionId = Annotated[str, Field(min_length=1, max_length=SESSION_ID_MAX_LENGTH)]
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class Hero(BaseModel):
+    """
+    One hero of the party. Fields beyond these are kept as sent.
+    """
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    name: Text
+    hero_class: Optional[Text] = Field(None, alias="class")
+    hp: Optional[int] = None
+
+
+class SaveState(BaseModel):
+    """
+    The party state a client saves and loads
+    """
+    scene_index: int = Field(ge=0)
+    party_name: Text
+    heroes: List[Hero] = Field(max_length=SAVE_MAX_HEROES)
+    symbol_choice: Optional[Text] = None
+    choices: Dict[Text, Optional[Text]] = Field(default_factory=dict, max_length=SAVE_MAX_CHOICES)
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        The state as a plain dict, with only the fields the client sent
+        """
+        return self.model_dump(by_alias=True, exclude_unset=True)
+
+
+class SaveRequest(BaseModel):
+    session_id: SessionId
+    state: SaveState
+
+
+class SaveBatchRequest(BaseModel):
+    # Entries are validated one by one, so a malformed save only fails itself
+    saves: List[Any]
+
+
+class LoadBatchRequest(BaseModel):
+    session_ids: List[SessionId] = Field(min_length=1, max_length=BATCH_MAX_SESSIONS)
+
+
+class SaveResponse(BaseModel):
+    status: str
+    scene_index: int
+    version: Optional[int] = None
+
+
+class LoadResponse(BaseModel):
+    session_id: str
+    state: SaveState
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """
+    Read a request body, failing with 413 as soon as it exceeds max_bytes:
+    up front from Content-Length, otherwise while streaming
+    """
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def validation_errors(error: ValidationError) -> list:
+    return error.errors(include_url=False, include_context=False)
+
+
+def error_summary(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+def parse_json(model: Type[Model], body: bytes) -> Model:
+    """
+    Validate a JSON body straight from bytes, without an intermediate dict.
+    Errors are reported as FastAPI reports request validation errors.
+    """
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**item, "loc": ("body", *item["loc"])} for item in validation_errors(e)], body=body
+        )
+
+
+async def read_save(request: Request) -> SaveRequest:
+    """
+    Dependency reading and validating a save request before any database
+    work is done
+    """
+    return parse_json(SaveRequest, await read_body(request, SAVE_MAX_BODY_BYTES))
+
+
+async def read_save_batch(request: Request) -> SaveBatchRequest:
+    return parse_json(SaveBatchRequest, await read_body(request, BATCH_MAX_BODY_BYTES))
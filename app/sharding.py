@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import heapq
+import queue
+import threading
+import zlib
+
+
+def shard_index(session_id: str, shard_count: int) -> int:
+    """
+    Stable shard for a session ID.
+
+    crc32 gives the same answer in every process, unlike hash(), so any API
+    worker finds a session on the shard it was first saved to.
+    """
+    return zlib.crc32(session_id.encode("utf-8")) % shard_count
+
+
+def session_id_criteria(whereclause) -> Optional[List[str]]:
+    """
+    Session IDs a statement's WHERE clause is restricted to, or None when it
+    may touch any session.
+
+    Only session_id = value and session_id IN (...) terms ANDed at the top
+    level narrow the statement, which covers every lookup the store makes.
+    """
+    if whereclause is None:
+        return None
+    terms = [whereclause]
+    if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_:
+        terms = list(whereclause.clauses)
+    for term in terms:
+        if not isinstance(term, BinaryExpression) or getattr(term.left, "key", None) != "session_id":
+            continue
+        if not isinstance(term.right, BindParameter):
+            continue
+        value = term.right.effective_value
+        if term.operator is operators.eq:
+            return [value]
+        if term.operator is operators.in_op:
+            return list(value)
+    return None
+
+
+class PartyShardedSession(ShardedSession):
+    """
+    Session that routes each statement to the shards holding its session IDs
+    """
+
+    def __init__(self, router: "ShardRouter", **kwargs):
+        self.router = router
+        super().__init__(
+            shards=router.engines,
+            shard_chooser=self._choose_shard,
+            identity_chooser=self._choose_identity,
+            execute_chooser=self._choose_execute,
+            **kwargs
+        )
+
+    def shard_for(self, session_id: str) -> int:
+        return self.router.shard_for(session_id)
+
+    def _choose_shard(self, mapper, instance, clause=None):
+        # New rows follow their session ID; anything else (such as a dialect
+        # lookup) goes to the first shard, as all shards share one schema
+        session_id = getattr(instance, "session_id", None)
+        return self.shard_for(session_id) if session_id is not None else 0
+
+    def _choose_identity(self, mapper, primary_key, **kwargs):
+        return list(self.router.engines)
+
+    def _choose_execute(self, orm_context):
+        session_ids = session_id_criteria(getattr(orm_context.statement, "whereclause", None))
+        if session_ids is None:
+            return list(self.router.engines)
+        return sorted({self.shard_for(session_id) for session_id in session_ids}) or [0]
+
+
+class ShardRouter:
+    """
+    Hash-shards parties across several databases by session ID.
+
+    Each shard has its own engine and connection pool. session_factory opens
+    sessions that route transparently; map_shards and merge_sorted fan work
+    out across shards in parallel.
+    """
+
+    def __init__(self, urls: List[str], engine_factory: Callable[[str], Any] = create_engine):
+        if not urls:
+            raise ValueError("At least one shard database URL is required")
+        self.urls = list(urls)
+        self.engines = {index: engine_factory(url) for index, url in enumerate(self.urls)}
+        self.shard_session_factories = {
+            index: sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for index, engine in self.engines.items()
+        }
+        self.session_factory = sessionmaker(
+            class_=PartyShardedSession, router=self, autocommit=False, autoflush=False
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.engines), thread_name_prefix="shard"
+        )
+
+    def shard_for(self, session_id: str) -> int:
+        return shard_index(session_id, len(self.engines))
+
+    def group(self, session_ids: Iterable[str]) -> Dict[int, List[str]]:
+        """
+        Group session IDs by the shard that holds them
+        """
+        groups: Dict[int, List[str]] = {}
+        for session_id in session_ids:
+            groups.setdefault(self.shard_for(session_id), []).append(session_id)
+        return groups
+
+    def map_shards(self, fn: Callable[[Any, List[str]], Any],
+                   session_ids: Iterable[str]) -> List[Tuple[List[str], Any, Optional[Exception]]]:
+        """
+        Call fn(db, shard_session_ids) on every shard holding some of the
+        session IDs, in parallel, each with its own session.
+
+        Returns (shard_session_ids, result, error) per shard, so a failing
+        shard does not hide the results of the others.
+        """
+        def run(shard: int, shard_session_ids: List[str]):
+            db = self.shard_session_factories[shard]()
+            try:
+                return fn(db, shard_session_ids)
+            finally:
+                db.close()
+
+        futures = [
+            (shard_session_ids, self._executor.submit(run, shard, shard_session_ids))
+            for shard, shard_session_ids in self.group(session_ids).items()
+        ]
+        results = []
+        for shard_session_ids, future in futures:
+            try:
+                results.append((shard_session_ids, future.result(), None))
+            except Exception as e:
+                results.append((shard_session_ids, None, e))
+        return results
+
+    def merge_sorted(self, iterate: Callable[[Any], Iterator[Tuple[Any, Any]]],
+                     buffer: int = 1000) -> Iterator[Any]:
+        """
+        Merge iterate(shard_session_factory) across all shards by key.
+
+        iterate yields (key, item) pairs in key order. Each shard is read
+        ahead in its own thread, at most buffer items at a time, and only the
+        items are yielded.
+        """
+        streams = [
+            prefetch(iterate(factory), buffer) for factory in self.shard_session_factories.values()
+        ]
+        try:
+            for _, item in heapq.merge(*streams, key=lambda pair: pair[0]):
+                yield item
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def dispose(self) -> None:
+        """
+        Stop the fan-out workers and close every shard's connections
+        """
+        self._executor.shutdown(wait=True)
+        for engine in self.engines.values():
+            engine.dispose()
+
+
+_DONE = object()
+
+
+def prefetch(iterator: Iterator[Any], buffer: int = 1000) -> Iterator[Any]:
+    """
+    Read an iterator ahead in a background thread, buffering up to buffer
+    items. Closing the returned generator stops the thread.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=buffer)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as e:
+            put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    thread = threading.Thread(target=produce, name="shard-prefetch", daemon=True)
+    thread.start()
+
+    def consume():
+        try:
+            while True:
+                item = items.get()
+                if isinstance(item, tuple) and len(item) == 2 and item[0] is _DONE:
+                    if item[1] is not None:
+                        raise item[1]
+                    return
+                yield item
+        finally:
+            stopped.set()
+            thread.join()
+
+    return consume()
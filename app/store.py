@@ -0,0 +1,205 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import Party
+from app.codec import raw_party_state, raw_party_state_column
+from src.json_encoding import RawJSON
+from typing import Dict, Any, List, Optional, Tuple
+import uuid
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE support
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def party_values(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a client state payload to Party column values
+    """
+    return {
+        "name": state["party_name"],
+        "heroes": state["heroes"],
+        "symbol_choice": state.get("symbol_choice"),
+        "scene_index": state["scene_index"],
+        "choices": state.get("choices", {})
+    }
+
+
+def apply_values(party: Party, values: Dict[str, Any]) -> Party:
+    """
+    Copy column values onto a Party row
+    """
+    for key, value in values.items():
+        setattr(party, key, value)
+    return party
+
+
+def bump_version(party: Party) -> Party:
+    """
+    Advance the party's version for a new save
+    """
+    party.version = (party.version or 0) + 1
+    return party
+
+
+def party_state(party: Party) -> Dict[str, Any]:
+    """
+    Build the client state payload for a Party row
+    """
+    return {
+        "scene_index": party.scene_index,
+        "party_name": party.name,
+        "heroes": party.heroes,
+        "symbol_choice": party.symbol_choice,
+        "choices": party.choices
+    }
+
+
+def raw_state(row) -> Dict[str, Any]:
+    """
+    Build the client state payload from a raw_party_query() row. The JSON
+    columns are passed through as RawJSON.
+    """
+    return {
+        "scene_index": row.scene_index,
+        "party_name": row.name,
+        "heroes": RawJSON(raw_party_state(row.heroes)),
+        "symbol_choice": row.symbol_choice,
+        "choices": RawJSON(raw_party_state(row.choices))
+    }
+
+
+def values_state(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the client state payload from Party column values
+    """
+    return {
+        "scene_index": values["scene_index"],
+        "party_name": values["name"],
+        "heroes": values["heroes"],
+        "symbol_choice": values["symbol_choice"],
+        "choices": values["choices"]
+    }
+
+
+def get_party(db: Session, session_id: str) -> Party:
+    """
+    Retrieve a party by session ID
+    """
+    return db.query(Party).filter(Party.session_id == session_id).first()
+
+
+def raw_party_query(db: Session):
+    """
+    Query the columns of the client state, with heroes and choices as stored
+    JSON rather than decoded values
+    """
+    return db.query(
+        Party.session_id, Party.version, Party.scene_index, Party.name, Party.symbol_choice,
+        raw_party_state_column(Party.heroes).label("heroes"),
+        raw_party_state_column(Party.choices).label("choices")
+    )
+
+
+def get_party_raw(db: Session, session_id: str):
+    """
+    Retrieve a party's state columns by session ID, see raw_party_query()
+    """
+    return raw_party_query(db).filter(Party.session_id == session_id).first()
+
+
+def get_parties_raw(db: Session, session_ids: List[str]) -> list:
+    """
+    Retrieve several parties' state columns with a single IN query
+    """
+    return raw_party_query(db).filter(Party.session_id.in_(session_ids)).all()
+
+
+def get_party_version(db: Session, session_id: str) -> Optional[int]:
+    """
+    Retrieve only the version of a party, served from the
+    (session_id, version) index
+    """
+    return db.query(Party.version).filter(Party.session_id == session_id).scalar()
+
+
+def get_parties(db: Session, session_ids: List[str]) -> List[Party]:
+    """
+    Retrieve several parties with a single IN query
+    """
+    return db.query(Party).filter(Party.session_id.in_(session_ids)).all()
+
+
+def save_parties(db: Session, values: Dict[str, Dict[str, Any]]) -> List[Party]:
+    """
+    Insert or update several parties, keyed by session ID, with a single
+    lookup query.
+
+    The caller owns the transaction: nothing is committed here.
+    """
+    existing = {party.session_id: party for party in get_parties(db, list(values))}
+    parties = []
+    for session_id, party_columns in values.items():
+        party = existing.get(session_id)
+        if party is None:
+            party = Party(session_id=session_id)
+            db.add(party)
+        parties.append(bump_version(apply_values(party, party_columns)))
+    return parties
+
+
+def upsert_parties(db: Session, values: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[int, int]]:
+    """
+    Insert or update several parties, keyed by session ID, and return the
+    stored (scene_index, version) of each.
+
+    On SQLite and PostgreSQL this is a single INSERT ... ON CONFLICT
+    (session_id) DO UPDATE ... RETURNING statement, so there is no lookup
+    query, no refresh, and no unique violation when two first saves for the
+    same session race. Other databases fall back to save_parties(). Sharded
+    sessions get one statement per shard.
+
+    The caller owns the transaction: nothing is committed here.
+    """
+    if not values:
+        return {}
+    shard_for = getattr(db, "shard_for", None)
+    if shard_for is None:
+        return _upsert_parties(db, values, {})
+
+    # A sharded session writes one statement per shard holding the sessions
+    shards: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for session_id, party_columns in values.items():
+        shards.setdefault(shard_for(session_id), {})[session_id] = party_columns
+    stored = {}
+    for shard, shard_values in shards.items():
+        stored.update(_upsert_parties(db, shard_values, {"shard_id": shard}))
+    return stored
+
+
+def _upsert_parties(db: Session, values: Dict[str, Dict[str, Any]],
+                    bind_arguments: Dict[str, Any]) -> Dict[str, Tuple[int, int]]:
+    bind = db.get_bind(**bind_arguments)
+    insert = UPSERT_INSERTS.get(bind.dialect.name)
+    if insert is None or not bind.dialect.insert_returning:
+        parties = save_parties(db, values)
+        db.flush()
+        return {party.session_id: (party.scene_index, party.version) for party in parties}
+
+    table = Party.__table__
+    stmt = insert(table).values([
+        {"id": uuid.uuid4(), "session_id": session_id, "version": 1, **party_columns}
+        for session_id, party_columns in values.items()
+    ])
+    updates = {name: stmt.excluded[name] for name in next(iter(values.values()))}
+    updates["version"] = table.c.version + 1
+    updates["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.session_id], set_=updates
+    ).returning(table.c.session_id, table.c.scene_index, table.c.version)
+    return {
+        row.session_id: (row.scene_index, row.version)
+        for row in db.execute(stmt, bind_arguments=bind_arguments)
+    }
@@ -0,0 +1,190 @@
+from sqlalchemy import select
+from app.models import Party
+from app.schemas import SaveRequest, error_summary
+from app.store import party_values, party_state, upsert_parties
+from pydantic import ValidationError
+from src.json_encoding import dumps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import json
+import sys
+
+# Import errors reported back to the caller are capped at this many
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_export(session_factory, chunk_size: int = 1000, shard_router=None) -> Iterator[bytes]:
+    """
+    Yield every party as an NDJSON line, in session_id order.
+
+    Rows are read in keyset-paginated chunks, each with its own short-lived
+    session, so memory use stays constant however many parties are stored.
+    With a shard router every shard is read in parallel and the streams are
+    merged back into session_id order.
+    """
+    if shard_router is not None:
+        return shard_router.merge_sorted(lambda factory: iter_export_records(factory, chunk_size))
+    return (line for _, line in iter_export_records(session_factory, chunk_size))
+
+
+def iter_export_records(session_factory, chunk_size: int = 1000) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (session_id, NDJSON line) for every party in one database
+    """
+    table = Party.__table__
+    last_session_id = None
+    while True:
+        query = select(table).order_by(table.c.session_id).limit(chunk_size)
+        if last_session_id is not None:
+            query = query.where(table.c.session_id > last_session_id)
+        db = session_factory()
+        try:
+            rows = db.execute(query).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        for row in rows:
+            yield row.session_id, dumps(
+                {"session_id": row.session_id, "version": row.version, "state": party_state(row)}
+            ) + b"\n"
+        last_session_id = rows[-1].session_id
+
+
+def import_batch(session_factory, lines: List[Tuple[int, bytes]],
+                 on_write: Optional[Callable[[Any, Dict[str, Dict[str, Any]]], None]] = None,
+                 on_commit: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None
+                 ) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Upsert a batch of numbered NDJSON lines in one transaction.
+
+    Every line is validated as a save request would be. Returns the number
+    of parties written and the errors of invalid lines. on_write and
+    on_commit receive the written values like the group-commit writer's
+    hooks.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    errors = []
+    for number, line in lines:
+        try:
+            record = SaveRequest.model_validate_json(line)
+        except ValidationError as e:
+            errors.append({"line": number, "error": f"Invalid record: {error_summary(e)}"})
+            continue
+        latest[record.session_id] = party_values(record.state.to_state())
+    if not latest:
+        return 0, errors
+
+    db = session_factory()
+    try:
+        saved = {
+            session_id: {**latest[session_id], "version": version}
+            for session_id, (_, version) in upsert_parties(db, latest).items()
+        }
+        if on_write is not None:
+            on_write(db, saved)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if on_commit is not None:
+        on_commit(saved)
+    return len(saved), errors
+
+
+def iter_lines(chunks: Iterable[bytes], max_line_bytes: int = 0) -> Iterator[Optional[bytes]]:
+    """
+    Split a stream of byte chunks into lines. The pieces of a line spanning
+    many chunks are joined once, when it ends.
+
+    With max_line_bytes, a longer line is dropped as it arrives rather than
+    buffered, and yields None in its place.
+    """
+    pending: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        *complete, tail = chunk.split(b"\n")
+        for line in complete:
+            size += len(line)
+            if max_line_bytes and size > max_line_bytes:
+                yield None
+            elif pending:
+                pending.append(line)
+                yield b"".join(pending)
+            else:
+                yield line
+            pending, size = [], 0
+        size += len(tail)
+        if max_line_bytes and size > max_line_bytes:
+            pending = []
+        elif tail:
+            pending.append(tail)
+    if max_line_bytes and size > max_line_bytes:
+        yield None
+    elif pending:
+        yield b"".join(pending)
+
+
+def import_lines(session_factory, lines: Iterable[Optional[bytes]], batch_size: int = 500,
+                 **hooks) -> Dict[str, Any]:
+    """
+    Import NDJSON lines in batches of batch_size parties. A None line, from
+    iter_lines, is reported as too long.
+    """
+    imported, errors = 0, []
+    batch: List[Tuple[int, bytes]] = []
+    for number, line in enumerate(lines, start=1):
+        if line is None:
+            errors.append({"line": number, "error": "Record is too long"})
+            continue
+        if not line.strip():
+            continue
+        batch.append((number, line))
+        if len(batch) >= batch_size:
+            count, batch_errors = import_batch(session_factory, batch, **hooks)
+            imported += count
+            errors.extend(batch_errors)
+            batch = []
+    if batch:
+        count, batch_errors = import_batch(session_factory, batch, **hooks)
+        imported += count
+        errors.extend(batch_errors)
+    return {"imported": imported, "errors": errors[:MAX_REPORTED_ERRORS], "error_count": len(errors)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import saved parties as NDJSON")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", help="File to write or read (stdout/stdin by default)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read per export query")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Parties written per import transaction (defaults to IMPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal, shard_router
+
+    if args.command == "export":
+        out = open(args.path, "wb") if args.path else sys.stdout.buffer
+        try:
+            for line in iter_export(SessionLocal, args.chunk_size, shard_router):
+                out.write(line)
+        finally:
+            if args.path:
+                out.close()
+    else:
+        # Import as the API does, recording history when it is enabled
+        from app.main import IMPORT_BATCH_SIZE, import_hooks
+        from app.schemas import SAVE_MAX_BODY_BYTES
+
+        source = open(args.path, "rb") if args.path else sys.stdin.buffer
+        try:
+            result = import_lines(
+                SessionLocal, iter_lines(source, SAVE_MAX_BODY_BYTES),
+                args.batch_size or IMPORT_BATCH_SIZE, **import_hooks()
+            )
+        finally:
+            if args.path:
+                source.close()
+        print(json.dumps(result), file=sys.stderr)
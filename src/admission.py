@@ -0,0 +1,338 @@
+from collections import OrderedDict, deque
+from src.idempotency import replay_receive
+from src.metrics import REGISTRY, Counter, Gauge, UNMATCHED_ROUTE
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
+import json
+import math
+import os
+import time
+
+# Shed excess load with rate limits and a concurrency limit (opt-in)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+# Token buckets as "rate/burst": requests per second and bucket size
+# (unset disables the bucket)
+RATE_LIMIT_CLIENT = os.getenv("RATE_LIMIT_CLIENT", "")
+RATE_LIMIT_SESSION = os.getenv("RATE_LIMIT_SESSION", "")
+# Requests handled at once across all routes (0 is unlimited), and how many
+# more may wait, for how long, before being shed with a 503
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "0"))
+CONCURRENCY_QUEUE_SIZE = int(os.getenv("CONCURRENCY_QUEUE_SIZE", "100"))
+CONCURRENCY_QUEUE_TIMEOUT_MS = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_MS", "1000"))
+# Per-route overrides as JSON keyed by "METHOD /route/template" or
+# "/route/template", e.g. {"POST /api/v1/save": {"session": "2/5"},
+# "/health": {"exempt": true}}
+ADMISSION_ROUTE_LIMITS = os.getenv("ADMISSION_ROUTE_LIMITS", "")
+# Use the first X-Forwarded-For address as the client (behind a proxy only)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true"
+# Largest JSON body read to find a session_id for session limits; larger
+# bodies fall back to the X-Session-ID header
+ADMISSION_BODY_MAX_BYTES = int(os.getenv("ADMISSION_BODY_MAX_BYTES", "262144"))
+
+# Clients and sessions with a token bucket; the least recently seen are
+# forgotten beyond this
+MAX_TRACKED_KEYS = 100000
+
+SESSION_HEADER = b"x-session-id"
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+DEFAULT_ROUTE_LIMITS = {"/metrics": {"exempt": True}, "/health": {"exempt": True}}
+
+SHED = REGISTRY.register(Counter(
+    "admission_shed_total", "Requests rejected by admission control, by route template and reason"
+))
+QUEUED = REGISTRY.register(Gauge(
+    "admission_queued_requests", "Requests waiting for a concurrency slot"
+))
+
+
+def parse_rate(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Parse "rate/burst" (or just "rate", with a burst of the same size)
+    """
+    if not value:
+        return None
+    rate, _, burst = str(value).partition("/")
+    rate = float(rate)
+    return (rate, float(burst) if burst else max(rate, 1.0)) if rate > 0 else None
+
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled at rate tokens per second up to burst
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Any, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: Any, now: Optional[float] = None) -> float:
+        """
+        Take a token for key. Returns 0 when allowed, otherwise the seconds
+        until a token is available.
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimiter:
+    """
+    Admits at most limit requests at once; up to queue_size more wait in
+    arrival order for at most queue_timeout seconds
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> Optional[str]:
+        """
+        Wait for a slot. Returns None once admitted, or why it was refused.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        QUEUED.inc()
+        try:
+            # release() hands its slot straight to the waiter
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return None
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived as this request gave up: pass it on
+                self.release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return "queue_timeout"
+        finally:
+            QUEUED.dec()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class RouteLimits:
+    """
+    The buckets and concurrency limit that apply to one route. Settings a
+    route does not mention fall back to defaults.
+    """
+
+    def __init__(self, settings: Dict[str, Any], defaults: Optional["RouteLimits"] = None,
+                 queue_size: int = CONCURRENCY_QUEUE_SIZE,
+                 queue_timeout_ms: float = CONCURRENCY_QUEUE_TIMEOUT_MS):
+        self.exempt = bool(settings.get("exempt", False))
+        self.client = self._buckets(settings, "client", defaults)
+        self.session = self._buckets(settings, "session", defaults)
+        concurrency = int(settings.get("concurrency", 0))
+        self.concurrency = ConcurrencyLimiter(
+            concurrency, queue_size, queue_timeout_ms / 1000
+        ) if concurrency > 0 else None
+
+    @staticmethod
+    def _buckets(settings: Dict[str, Any], name: str,
+                 defaults: Optional["RouteLimits"]) -> Optional[TokenBuckets]:
+        if name not in settings:
+            return getattr(defaults, name, None)
+        rate = parse_rate(settings[name])
+        return TokenBuckets(*rate) if rate else None
+
+
+def load_route_limits(value: str) -> Dict[str, Dict[str, Any]]:
+    limits = dict(DEFAULT_ROUTE_LIMITS)
+    if value:
+        limits.update(json.loads(value))
+    return limits
+
+
+class AdmissionMiddleware:
+    """
+    Rejects requests early, before they reach a handler or the database:
+    429 when a client's or session's token bucket is empty, 503 when the
+    concurrency limit's wait queue is full or the wait times out. Both carry
+    Retry-After.
+
+    Clients are identified by address. Sessions are identified by the
+    session_id path parameter, or for routes with a session limit by the
+    top-level session_id of a JSON body up to body_max_bytes, falling back
+    to the X-Session-ID header. The body read is handed on to the app.
+    """
+
+    def __init__(self, app: ASGIApp, routes=None, client_rate: str = RATE_LIMIT_CLIENT,
+                 session_rate: str = RATE_LIMIT_SESSION, concurrency: int = CONCURRENCY_LIMIT,
+                 queue_size: int = CONCURRENCY_QUEUE_SIZE,
+                 queue_timeout_ms: float = CONCURRENCY_QUEUE_TIMEOUT_MS,
+                 route_limits: str = ADMISSION_ROUTE_LIMITS,
+                 trust_forwarded: bool = ADMISSION_TRUST_FORWARDED,
+                 body_max_bytes: int = ADMISSION_BODY_MAX_BYTES):
+        self.app = app
+        self.body_max_bytes = body_max_bytes
+        self.routes = routes if routes is not None else []
+        self.trust_forwarded = trust_forwarded
+        self.defaults = RouteLimits({"client": client_rate, "session": session_rate})
+        self.route_limits = {
+            key: RouteLimits(settings, self.defaults, queue_size, queue_timeout_ms)
+            for key, settings in load_route_limits(route_limits).items()
+        }
+        self.limiter = ConcurrencyLimiter(
+            concurrency, queue_size, queue_timeout_ms / 1000
+        ) if concurrency > 0 else None
+
+    def match(self, scope: Scope) -> Tuple[Optional[BaseRoute], Dict[str, Any]]:
+        """
+        Route and path parameters, matched the way the router will
+        """
+        for route in self.routes:
+            matched, child_scope = route.matches(scope)
+            if matched == Match.FULL:
+                return route, child_scope.get("path_params", {})
+        return None, {}
+
+    def client_key(self, scope: Scope) -> str:
+        if self.trust_forwarded:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def session_key(self, scope: Scope, path_params: Dict[str, Any],
+                    body: Optional[bytes] = None) -> Optional[str]:
+        if "session_id" in path_params:
+            return str(path_params["session_id"])
+        if body:
+            try:
+                document = json.loads(body)
+            except ValueError:
+                document = None
+            if isinstance(document, dict) and isinstance(document.get("session_id"), str):
+                return document["session_id"]
+        for name, value in scope.get("headers", []):
+            if name == SESSION_HEADER:
+                return value.decode("latin-1")
+        return None
+
+    async def read_body(self, scope: Scope,
+                        receive: Receive) -> Tuple[List[Message], Optional[bytes]]:
+        """
+        The body messages read so far, and the body if it is JSON and
+        complete within body_max_bytes
+        """
+        headers = dict(scope.get("headers", []))
+        length = headers.get(b"content-length", b"")
+        if (b"json" not in headers.get(b"content-type", b"")
+                or length.isdigit() and int(length) > self.body_max_bytes):
+            return [], None
+        messages, size = [], 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return messages, None
+            size += len(message.get("body", b""))
+            if size > self.body_max_bytes:
+                return messages, None
+            if not message.get("more_body", False):
+                return messages, b"".join(m.get("body", b"") for m in messages)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        matched, path_params = self.match(scope)
+        route = getattr(matched, "path", UNMATCHED_ROUTE)
+        limits = (
+            self.route_limits.get(f"{scope['method']} {route}")
+            or self.route_limits.get(route)
+            or self.defaults
+        )
+        if limits.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if limits.client is not None:
+            wait = limits.client.take((route, self.client_key(scope)))
+            if wait:
+                await self.reject(scope, receive, send, matched, 429, "client_rate", wait,
+                                  "Too many requests from this client")
+                return
+        if limits.session is not None:
+            body = None
+            if "session_id" not in path_params and scope["method"] in BODY_METHODS:
+                messages, body = await self.read_body(scope, receive)
+                receive = replay_receive(messages, receive)
+            session_id = self.session_key(scope, path_params, body)
+            if session_id is not None:
+                wait = limits.session.take((route, session_id))
+                if wait:
+                    await self.reject(scope, receive, send, matched, 429, "session_rate", wait,
+                                      "Too many requests for this session")
+                    return
+
+        acquired = []
+        try:
+            for limiter in (self.limiter, limits.concurrency):
+                if limiter is None:
+                    continue
+                refused = await limiter.acquire()
+                if refused is not None:
+                    await self.reject(scope, receive, send, matched, 503, f"concurrency_{refused}",
+                                      limiter.queue_timeout, "Server is busy, retry later")
+                    return
+                acquired.append(limiter)
+            await self.app(scope, receive, send)
+        finally:
+            for limiter in acquired:
+                limiter.release()
+
+    async def reject(self, scope: Scope, receive: Receive, send: Send,
+                     matched: Optional[BaseRoute], status_code: int, reason: str,
+                     retry_after: float, detail: str):
+        if matched is not None:
+            # The request never reaches the router, so set the route it would
+            # have, for the metrics and access log of the rejection
+            scope["route"] = matched
+        SHED.inc(route=getattr(matched, "path", UNMATCHED_ROUTE), reason=reason)
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+
+def install_admission(app) -> None:
+    """
+    Add admission control to an app, matching routes against its router
+    """
+    if ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware, routes=app.router.routes)
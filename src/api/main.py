@@ -1,31 +1,64 @@
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from src.database import SessionLocal, engine
+from src.database import SessionLocal, engine, ASYNC_DB_ENABLED, get_async_db
 from src.models.feature_specification import FeatureSpecification
 from src.models.implementation_plan import ImplementationPlan
 from src.models.task_list import TaskList
-from src.services.feature_service import FeatureService
+from src.models.job import Job
+from src.services.feature_service import FeatureService, AsyncFeatureService
 from src.services.planning_service import PlanningService
 from src.services.task_service import TaskService
-from src.api.middleware import LoggingMiddleware, ErrorHandlerMiddleware
+from src.services.task_graph import TaskGraphError
+from src.api.middleware import LoggingMiddleware, ErrorHandlerMiddleware, ProfilingMiddleware, PROFILING_ENABLED
 from src.api.security import add_cors_middleware, add_security_headers
-from typing import Dict, Any, List
+from src.structured_logging import configure_logging
+from src.admission import install_admission
+from src.idempotency import install_idempotency
+from src.metrics import install_metrics
+from src.query_stats import install_query_stats
+from src.artifacts import GENERATORS, SPECS_DIR
+from src.jobs import JobQueue, JOBS_ENABLED, job_status
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
 import uuid
 
 # Create database tables
 FeatureSpecification.metadata.create_all(bind=engine)
 ImplementationPlan.metadata.create_all(bind=engine)
 TaskList.metadata.create_all(bind=engine)
+Job.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Spiral Archives API", version="1.0.0")
+configure_logging()
+
+# Artifact generation runs on background workers when jobs are enabled
+job_queue = JobQueue(SessionLocal, GENERATORS) if JOBS_ENABLED else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if job_queue is not None:
+        # Pick up jobs a previous process left unfinished
+        job_queue.resume()
+    yield
+    if job_queue is not None:
+        job_queue.shutdown()
+
+app = FastAPI(title="Spiral Archives API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS and security headers
 add_cors_middleware(app)
 add_security_headers(app)
 
 # Add other middleware
+install_idempotency(app)
+install_admission(app)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(ErrorHandlerMiddleware)
+install_query_stats(app)
+install_metrics(app)
 
 # Dependency to get database session
 def get_db():
@@ -36,9 +69,31 @@ def get_db():
         db.close()
 
 # Import validation models
-from src.api.validation import FeatureCreateRequest, FeatureCreateResponse, PlanCreateResponse, TasksCreateResponse
+from src.api.validation import (
+    FeatureCreateRequest, FeatureCreateResponse, PlanCreateResponse, TasksCreateResponse,
+    JobAcceptedResponse, JobStatusResponse, TaskGraphResponse, ReadyTasksResponse
+)
+
+def job_accepted(kind: str, params: Dict[str, Any]) -> JSONResponse:
+    """
+    Queue a generation job and answer 202 with where to follow it
+    """
+    job = job_queue.submit(kind, {"specs_dir": SPECS_DIR, **params})
+    status_url = f"/jobs/{job.id}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": str(job.id), "status": job.status, "status_url": status_url},
+        headers={"Location": status_url}
+    )
+
+def feature_create_response(request: FeatureCreateRequest) -> FeatureCreateResponse:
+    # Mock response that matches contract
+    return FeatureCreateResponse(
+        branch_name="001-" + request.feature_description.replace(" ", "-").lower()[:20],
+        spec_file_path=f"/specs/001-{request.feature_description.replace(' ', '-')}/spec.md",
+        status="specification created"
+    )
 
-@app.post("/specify", response_model=FeatureCreateResponse)
 def create_feature_spec(request: FeatureCreateRequest, db: Session = Depends(get_db)):
     """
     Creates a new feature specification based on user description
@@ -51,16 +106,75 @@ def create_feature_spec(request: FeatureCreateRequest, db: Session = Depends(get
         name="temp_feature", 
         description=request.feature_description
     )
-    
-    # Mock response that matches contract
-    response = FeatureCreateResponse(
-        branch_name="001-" + request.feature_description.replace(" ", "-").lower()[:20],
-        spec_file_path=f"/specs/001-{request.feature_description.replace(' ', '-')}/spec.md",
-        status="specification created"
+    return feature_create_response(request)
+
+async def create_feature_spec_async(request: FeatureCreateRequest, db=Depends(get_async_db)):
+    """
+    Creates a new feature specification using the async database session
+    """
+    feature_service = AsyncFeatureService(db)
+    await feature_service.create_feature_specification(
+        name="temp_feature",
+        description=request.feature_description
     )
-    return response
+    return feature_create_response(request)
+
+def create_feature_spec_job(request: FeatureCreateRequest, db: Session = Depends(get_db)):
+    """
+    Records the feature and queues generation of its specification
+    """
+    feature_spec = FeatureService(db).create_feature_specification(
+        name="temp_feature",
+        description=request.feature_description
+    )
+    return job_accepted("specify", {
+        "feature_description": request.feature_description,
+        "feature_id": str(feature_spec.id)
+    })
+
+if JOBS_ENABLED:
+    app.add_api_route(
+        "/specify", create_feature_spec_job, methods=["POST"],
+        response_model=JobAcceptedResponse, status_code=202
+    )
+else:
+    app.add_api_route(
+        "/specify",
+        create_feature_spec_async if ASYNC_DB_ENABLED else create_feature_spec,
+        methods=["POST"],
+        response_model=FeatureCreateResponse
+    )
+
+def create_implementation_plan_job(feature: Optional[str] = None):
+    """
+    Queues generation of the implementation plan for a feature (the latest
+    one by default)
+    """
+    return job_accepted("plan", {"feature": feature})
+
+def generate_tasks_job(feature: Optional[str] = None):
+    """
+    Queues generation of the task list for a feature (the latest one by
+    default)
+    """
+    return job_accepted("tasks", {"feature": feature})
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: uuid.UUID, wait: float = 0):
+    """
+    Reports a job's status and result. With wait, holds the request until
+    the job finishes or that many seconds pass.
+    """
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Background jobs are disabled")
+    if wait > 0:
+        job = await job_queue.wait(job_id, wait)
+    else:
+        job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
 
-@app.post("/plan", response_model=PlanCreateResponse)
 def create_implementation_plan(db: Session = Depends(get_db)):
     """
     Generates an implementation plan based on the feature specification
@@ -75,7 +189,6 @@ def create_implementation_plan(db: Session = Depends(get_db)):
     )
     return response
 
-@app.post("/tasks", response_model=TasksCreateResponse)
 def generate_tasks(db: Session = Depends(get_db)):
     """
     Generates a task list based on the implementation plan
@@ -88,4 +201,39 @@ def generate_tasks(db: Session = Depends(get_db)):
         status="tasks generated",
         task_count=25
     )
-    return response
\ No newline at end of file
+    return response
+
+if JOBS_ENABLED:
+    app.add_api_route("/plan", create_implementation_plan_job, methods=["POST"],
+                      response_model=JobAcceptedResponse, status_code=202)
+    app.add_api_route("/tasks", generate_tasks_job, methods=["POST"],
+                      response_model=JobAcceptedResponse, status_code=202)
+else:
+    app.add_api_route("/plan", create_implementation_plan, methods=["POST"],
+                      response_model=PlanCreateResponse)
+    app.add_api_route("/tasks", generate_tasks, methods=["POST"],
+                      response_model=TasksCreateResponse)
+
+@app.get("/features/{feature_id}/tasks/graph", response_model=TaskGraphResponse)
+def get_task_graph(feature_id: uuid.UUID, db: Session = Depends(get_db)):
+    """
+    Returns a feature's tasks in dependency order, grouped into waves that
+    can run in parallel, with the critical path through them
+    """
+    try:
+        graph = TaskService(db).get_task_graph(feature_id)
+    except TaskGraphError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"feature_id": str(feature_id), **graph.to_dict()}
+
+@app.get("/features/{feature_id}/tasks/ready", response_model=ReadyTasksResponse)
+def get_ready_tasks(feature_id: uuid.UUID, db: Session = Depends(get_db)):
+    """
+    Returns the tasks of a feature that can run now: not complete, with
+    every dependency complete
+    """
+    try:
+        tasks = TaskService(db).get_ready_tasks(feature_id)
+    except TaskGraphError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"feature_id": str(feature_id), "tasks": tasks}
@@ -1,67 +1,243 @@
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.exceptions import HTTPException
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.profiling import PROFILE_FORMATS, StackSampler, profile_filename, write_profile
+from src.structured_logging import sample_rate
+from starlette.concurrency import run_in_threadpool
 import logging
+import os
+import hmac
+import random
 import time
-import traceback
+import uuid
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Log the incoming request
-        logger.info(f"Request: {request.method} {request.url}")
-        if request.query_params:
-            logger.info(f"Query params: {dict(request.query_params)}")
-        
-        # Only log body for POST/PUT/PATCH requests
-        if request.method in ["POST", "PUT", "PATCH"]:
-            body = await request.body()
-            if body:
-                logger.info(f"Request body: {body.decode('utf-8')}")
-        
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# At most this many bytes of a request body are logged (0 disables body logging)
+LOG_BODY_MAX_BYTES = int(os.getenv("LOG_BODY_MAX_BYTES", "1024"))
+# Fraction of POST/PUT/PATCH requests whose body is logged
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "1.0"))
+
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+# Requests sending this token in the X-Profile header are profiled (unset
+# disables the header trigger)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Fraction of all requests profiled regardless of the header
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Profile output: "collapsed" stacks for flamegraphs, or "pstats"
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "collapsed")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Profiles kept in PROFILE_DIR; the oldest are deleted beyond this
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# The profiling middleware is only installed when something can trigger it
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+class LoggingMiddleware:
+    """
+    Writes one structured access log line per request, with its route,
+    status, duration and request ID.
+
+    Request bodies are captured as the app reads them, up to body_max_bytes,
+    so the payload is never buffered a second time. Only a body_sample_rate
+    fraction of requests has its body logged, and each route template is
+    sampled at its configured rate (server errors are always logged).
+    """
+
+    def __init__(self, app: ASGIApp, body_max_bytes: int = LOG_BODY_MAX_BYTES,
+                 body_sample_rate: float = LOG_BODY_SAMPLE_RATE):
+        self.app = app
+        self.body_max_bytes = body_max_bytes
+        self.body_sample_rate = body_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        request_id = request_id_for(scope)
+        captured = bytearray()
+        truncated = False
+        status_code = 500
+
+        async def capture_receive() -> Message:
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                room = self.body_max_bytes - len(captured)
+                if room > 0:
+                    captured.extend(chunk[:room])
+                if len(chunk) > max(room, 0):
+                    truncated = True
+            return message
+
+        async def capture_send(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        log_body = (
+            scope["method"] in BODY_METHODS
+            and self.body_max_bytes > 0
+            and random.random() < self.body_sample_rate
+        )
+        failed = False
         try:
-            response = await call_next(request)
-        except Exception as e:
-            # Log the exception
-            logger.error(f"Exception occurred: {str(e)}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Re-raise the exception so it can be handled by FastAPI's exception handlers
-            raise e
+            await self.app(scope, capture_receive if log_body else receive, capture_send)
+        except Exception:
+            # The traceback is logged by ErrorHandlerMiddleware
+            failed = True
+            raise
         finally:
-            # Calculate request duration
-            duration = time.time() - start_time
-            
-            # Log the response
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Duration: {duration:.2f}s")
-        
-        return response
-
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+            route = getattr(scope.get("route"), "path", None)
+            level = logging.ERROR if failed or status_code >= 500 else logging.INFO
+            if (status_code >= 500 or random.random() < sample_rate(route)) and logger.isEnabledFor(level):
+                fields = {
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope.get("path", ""),
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start_time) * 1000, 2),
+                }
+                if scope.get("query_string"):
+                    fields["query"] = scope["query_string"].decode("latin-1")
+                if captured:
+                    fields["body"] = captured.decode("utf-8", errors="replace")
+                    fields["body_truncated"] = truncated
+                logger.log(
+                    level,
+                    "%s %s %s %.1fms", scope["method"], fields["path"], status_code,
+                    fields["duration_ms"], extra=fields
+                )
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under the statistical profiler when it carries the
+    profile token in X-Profile, or when it is sampled.
+
+    Each profile is written to a bounded ring of files in profile_dir, named
+    after the route and request ID, which the response returns in
+    X-Profile-File.
+    """
+
+    def __init__(self, app: ASGIApp, token: str = PROFILE_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, profile_format: str = PROFILE_FORMAT,
+                 profile_dir: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        if profile_format not in PROFILE_FORMATS:
+            raise ValueError(f"PROFILE_FORMAT must be one of {PROFILE_FORMATS}")
+        self.app = app
+        self.token = token.encode("latin-1")
+        self.sample_rate = sample_rate
+        self.profile_format = profile_format
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+        self.interval = interval_ms / 1000
+
+    def requested(self, scope: Scope) -> bool:
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.token)
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = request_id_for(scope)
+        started_ms = int(time.time() * 1000)
+        filenames = []
+
+        async def send_with_profile(message: Message):
+            if message["type"] == "http.response.start":
+                # The route is known once the router has matched the request
+                route = getattr(scope.get("route"), "path", scope.get("path", ""))
+                filenames.append(profile_filename(started_ms, route, request_id, self.profile_format))
+                MutableHeaders(scope=message)["X-Profile-File"] = filenames[0]
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            sampler.stop()
+            if not filenames:
+                route = getattr(scope.get("route"), "path", scope.get("path", ""))
+                filenames.append(profile_filename(started_ms, route, request_id, self.profile_format))
+            try:
+                path = await run_in_threadpool(
+                    write_profile, self.profile_dir, filenames[0], sampler,
+                    self.profile_format, self.max_files
+                )
+                logger.info("Wrote profile %s", path, extra={"request_id": request_id, "profile": path})
+            except OSError:
+                logger.exception("Could not write profile")
+
+
+def request_id_for(scope: Scope) -> str:
+    """
+    The request's ID: the client's X-Request-ID if sent, else a new one.
+    Stored in the scope state so handlers can log it too.
+    """
+    state = scope.setdefault("state", {})
+    if "request_id" not in state:
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                state["request_id"] = value.decode("latin-1")[:128]
+                break
+        else:
+            state["request_id"] = uuid.uuid4().hex
+    return state["request_id"]
+
+
+class ErrorHandlerMiddleware:
+    """
+    Turns exceptions escaping the app into JSON error responses, as long as
+    the response has not started yet
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def track_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, track_send)
         except HTTPException as e:
-            # Log HTTP exceptions
-            logger.error(f"HTTP Exception: {e.status_code} - {e.detail}")
-            return JSONResponse(
-                status_code=e.status_code,
-                content={"error": e.detail}
-            )
-        except Exception as e:
-            # Log unexpected exceptions
-            logger.error(f"Unexpected exception: {str(e)}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return JSONResponse(
-                status_code=500,
-                content={"error": "Internal server error"}
-            )
-        
-        return response
\ No newline at end of file
+            logger.error("HTTP Exception: %s - %s", e.status_code, e.detail)
+            if response_started:
+                raise
+            response = JSONResponse(status_code=e.status_code, content={"error": e.detail})
+            await response(scope, receive, send)
+        except Exception:
+            logger.exception("Unexpected exception")
+            if response_started:
+                raise
+            response = JSONResponse(status_code=500, content={"error": "Internal server error"})
+            await response(scope, receive, send)
@@ -1,5 +1,8 @@
 from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict
 import os
 
 def add_cors_middleware(app: FastAPI):
@@ -17,17 +20,38 @@ def add_cors_middleware(app: FastAPI):
         expose_headers=["Content-Range", "X-Content-Range"],
     )
 
+# Headers added to every HTTP response
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+}
+
+class SecurityHeadersMiddleware:
+    """
+    Adds the security headers to the response start message as it is sent
+    """
+
+    def __init__(self, app: ASGIApp, headers: Dict[str, str] = SECURITY_HEADERS):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in self.headers.items():
+                    headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
 def add_security_headers(app: FastAPI):
     """
-    Add security headers middleware
-    Note: For a production application, you would use a dedicated security middleware
-    like secure-headers or create a custom middleware to add security headers
+    Add the security headers middleware
     """
-    @app.middleware("http")
-    async def security_headers_middleware(request, call_next):
-        response = await call_next(request)
-        # Add basic security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        return response
\ No newline at end of file
+    app.add_middleware(SecurityHeadersMiddleware)
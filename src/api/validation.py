@@ -1,12 +1,13 @@
-from pydantic import BaseModel, validator
-from typing import List, Optional
+from pydantic import BaseModel, field_validator
+from typing import Any, Dict, List, Optional
 import re
 
 
 class FeatureCreateRequest(BaseModel):
     feature_description: str
 
-    @validator('feature_description')
+    @field_validator('feature_description')
+    @classmethod
     def validate_feature_description(cls, v):
         if not v or len(v.strip()) == 0:
             raise ValueError('Feature description cannot be empty')
@@ -20,7 +21,8 @@ class FeatureCreateResponse(BaseModel):
     spec_file_path: str
     status: str
 
-    @validator('branch_name')
+    @field_validator('branch_name')
+    @classmethod
     def validate_branch_name(cls, v):
         # Branch name should follow format: NNN-feature-name
         if not re.match(r'^\d{3}-[a-z0-9-]+$', v):
@@ -39,8 +41,44 @@ class TasksCreateResponse(BaseModel):
     status: str
     task_count: int
 
-    @validator('task_count')
+    @field_validator('task_count')
+    @classmethod
     def validate_task_count(cls, v):
         if v < 0:
             raise ValueError('Task count cannot be negative')
-        return v
\ No newline at end of file
+        return v
+
+
+class JobAcceptedResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_date: Optional[str] = None
+    started_date: Optional[str] = None
+    finished_date: Optional[str] = None
+
+
+class TaskGraphResponse(BaseModel):
+    feature_id: str
+    task_count: int
+    order: List[str]
+    waves: List[List[str]]
+    critical_path: List[str]
+
+
+class ReadyTask(BaseModel):
+    task_id: str
+    status: Optional[str] = None
+
+
+class ReadyTasksResponse(BaseModel):
+    feature_id: str
+    tasks: List[ReadyTask]
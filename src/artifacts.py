@@ -0,0 +1,173 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+import os
+import re
+
+# Directory holding one NNN-feature-name directory per feature
+SPECS_DIR = os.getenv("SPECS_DIR", "specs")
+
+FEATURE_DIR = re.compile(r"^(\d{3})-[a-z0-9-]+$")
+
+PLAN_ARTIFACTS = ["research.md", "data-model.md", "quickstart.md"]
+
+# Task phases generated for every plan, in order: (phase, [(description, parallel)])
+TASK_PHASES = [
+    ("Setup", [
+        ("Create project structure per implementation plan", False),
+        ("Configure linting and formatting tools", True),
+    ]),
+    ("Tests First (TDD)", [
+        ("Contract tests for every endpoint in contracts/", True),
+        ("Integration tests for the scenarios in quickstart.md", True),
+    ]),
+    ("Core Implementation", [
+        ("Models for the entities in data-model.md", True),
+        ("Services implementing the functional requirements", False),
+        ("API endpoints", False),
+    ]),
+    ("Polish", [
+        ("Unit tests for the services", True),
+        ("Update documentation", True),
+    ]),
+]
+
+
+def slugify(text: str, max_length: int = 40) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length].rstrip("-") or "feature"
+
+
+def feature_dirs(specs_dir: str) -> List[str]:
+    """
+    Feature directory names, in number order
+    """
+    if not os.path.isdir(specs_dir):
+        return []
+    return sorted(name for name in os.listdir(specs_dir) if FEATURE_DIR.match(name))
+
+
+def create_feature_dir(specs_dir: str, description: str) -> str:
+    """
+    Create the next numbered directory for a feature and return its name.
+    Concurrent callers each get their own number.
+    """
+    os.makedirs(specs_dir, exist_ok=True)
+    slug = slugify(description)
+    existing = feature_dirs(specs_dir)
+    number = int(FEATURE_DIR.match(existing[-1]).group(1)) + 1 if existing else 1
+    while True:
+        name = f"{number:03d}-{slug}"
+        try:
+            os.mkdir(os.path.join(specs_dir, name))
+            return name
+        except FileExistsError:
+            number += 1
+
+
+def resolve_feature(specs_dir: str, feature: Optional[str]) -> str:
+    """
+    The named feature directory, or the latest one
+    """
+    if feature:
+        if not FEATURE_DIR.match(feature) or not os.path.isdir(os.path.join(specs_dir, feature)):
+            raise ValueError(f"No feature directory {feature!r}")
+        return feature
+    existing = feature_dirs(specs_dir)
+    if not existing:
+        raise ValueError("No feature specification to work from")
+    return existing[-1]
+
+
+def write_file(path: str, content: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def title(feature: str) -> str:
+    return feature.split("-", 1)[1].replace("-", " ").title()
+
+
+def generate_spec(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write spec.md for a new feature
+    """
+    specs_dir = params.get("specs_dir", SPECS_DIR)
+    description = params["feature_description"]
+    feature = create_feature_dir(specs_dir, description)
+    path = os.path.join(specs_dir, feature, "spec.md")
+    write_file(path, (
+        f"# Feature Specification: {title(feature)}\n\n"
+        f"**Feature Branch**: `{feature}`  \n"
+        f"**Created**: {date.today().isoformat()}  \n"
+        f"**Status**: Draft  \n"
+        f"**Input**: User description: \"{description}\"\n\n"
+        "## User Scenarios & Testing *(mandatory)*\n\n"
+        "### Primary User Story\n"
+        f"{description}\n\n"
+        "## Requirements *(mandatory)*\n\n"
+        "### Functional Requirements\n"
+        f"- **FR-001**: System MUST {description}\n"
+    ))
+    return {"branch_name": feature, "spec_file_path": path}
+
+
+def generate_plan(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write plan.md and the Phase 0/1 artifacts for a feature
+    """
+    specs_dir = params.get("specs_dir", SPECS_DIR)
+    feature = resolve_feature(specs_dir, params.get("feature"))
+    directory = os.path.join(specs_dir, feature)
+    path = os.path.join(directory, "plan.md")
+    write_file(path, (
+        f"# Implementation Plan: {title(feature)}\n\n"
+        f"**Branch**: `{feature}` | **Date**: {date.today().isoformat()}\n"
+        f"**Input**: Feature specification from `/{specs_dir}/{feature}/spec.md`\n\n"
+        "## Summary\n\n"
+        "## Technical Context\n\n"
+        "## Phase 0: Outline & Research\n"
+        "Output: research.md\n\n"
+        "## Phase 1: Design & Contracts\n"
+        "Output: data-model.md, quickstart.md\n"
+    ))
+    for name in PLAN_ARTIFACTS:
+        heading = name[:-3].replace("-", " ").title()
+        write_file(os.path.join(directory, name), f"# {heading}: {title(feature)}\n")
+    return {"plan_file_path": path, "artifacts": list(PLAN_ARTIFACTS)}
+
+
+def generate_tasks(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write tasks.md for a planned feature
+    """
+    specs_dir = params.get("specs_dir", SPECS_DIR)
+    feature = resolve_feature(specs_dir, params.get("feature"))
+    directory = os.path.join(specs_dir, feature)
+    if not os.path.exists(os.path.join(directory, "plan.md")):
+        raise ValueError(f"No implementation plan for {feature}")
+
+    lines = [
+        f"# Tasks: {title(feature)}\n",
+        f"**Input**: Design documents from `/{specs_dir}/{feature}/`\n",
+        "## Format: `[ID] [P?] Description`\n",
+    ]
+    number = 0
+    for phase, tasks in TASK_PHASES:
+        lines.append(f"## Phase: {phase}")
+        for description, parallel in tasks:
+            number += 1
+            marker = " [P]" if parallel else ""
+            lines.append(f"- [ ] T{number:03d}{marker} {description}")
+        lines.append("")
+    path = os.path.join(directory, "tasks.md")
+    write_file(path, "\n".join(lines))
+    return {"tasks_file_path": path, "task_count": number}
+
+
+# Job kind to generator. Generators take and return plain dicts so they can
+# run in a worker process.
+GENERATORS = {
+    "specify": generate_spec,
+    "plan": generate_plan,
+    "tasks": generate_tasks,
+}
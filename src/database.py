@@ -1,12 +1,12 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from src.engines import async_url, create_async_session_factory, create_tuned_engine
 import os
 
 # Get database URL from environment, default to SQLite for demo
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./omega.db")
 
-engine = create_engine(DATABASE_URL, echo=False)  # Set echo=True for SQL debugging
+engine = create_tuned_engine(DATABASE_URL)  # Pass echo=True for SQL debugging
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -16,4 +16,18 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async engine for the async request path (opt-in, needs greenlet and an
+# async driver such as aiosqlite or asyncpg)
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() == "true"
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB_ENABLED:
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url(DATABASE_URL))
+    async_engine, AsyncSessionLocal = create_async_session_factory(ASYNC_DATABASE_URL)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,174 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from src.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, track_pool
+from typing import Any, Dict, Tuple
+import os
+
+# Async drivers used when a sync URL is reused for the async engine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+# Named engine tuning profiles, selected with DB_PROFILE. "default" keeps
+# SQLAlchemy's own settings; "web" suits many short concurrent requests and
+# "bulk" a few long-running writers such as imports and conversions.
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "web": {
+        "pool": {
+            "pool_size": 10,
+            "max_overflow": 20,
+            "pool_timeout": 10,
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+        },
+        "query_cache_size": 1000,
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 268435456,
+            "cache_size": -65536,
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+        },
+        "connect_args": {
+            "sqlite": {"cached_statements": 256},
+            "postgresql": {"connect_timeout": 10},
+        },
+    },
+    "bulk": {
+        "pool": {
+            "pool_size": 4,
+            "max_overflow": 4,
+            "pool_timeout": 60,
+            "pool_pre_ping": True,
+            "pool_recycle": 3600,
+        },
+        "query_cache_size": 500,
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 1073741824,
+            "cache_size": -262144,
+            "busy_timeout": 30000,
+            "temp_store": "MEMORY",
+        },
+        "connect_args": {
+            "sqlite": {"cached_statements": 256},
+            "postgresql": {"connect_timeout": 30},
+        },
+    },
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+
+# Individual overrides of the selected profile's settings
+POOL_OVERRIDES = {
+    "pool_size": os.getenv("DB_POOL_SIZE"),
+    "max_overflow": os.getenv("DB_MAX_OVERFLOW"),
+    "pool_timeout": os.getenv("DB_POOL_TIMEOUT"),
+    "pool_recycle": os.getenv("DB_POOL_RECYCLE"),
+}
+DB_STATEMENT_CACHE_SIZE = os.getenv("DB_STATEMENT_CACHE_SIZE")
+
+
+def engine_options(url: str, profile: str = DB_PROFILE) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Build the create_engine() keyword arguments and the SQLite pragmas of a
+    profile for the given database URL
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}, expected one of {sorted(ENGINE_PROFILES)}")
+    settings = ENGINE_PROFILES[profile]
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    in_memory = backend == "sqlite" and parsed.database in (None, "", ":memory:")
+
+    options: Dict[str, Any] = {}
+    # In-memory SQLite uses a single-connection pool that takes no sizing
+    if not in_memory:
+        options.update(settings.get("pool", {}))
+        for name, value in POOL_OVERRIDES.items():
+            if value is not None:
+                options[name] = int(value)
+    if DB_STATEMENT_CACHE_SIZE is not None:
+        options["query_cache_size"] = int(DB_STATEMENT_CACHE_SIZE)
+    elif "query_cache_size" in settings:
+        options["query_cache_size"] = settings["query_cache_size"]
+    connect_args = settings.get("connect_args", {}).get(backend)
+    if connect_args and parsed.drivername == backend:
+        # Only the default drivers are known to accept these arguments
+        options["connect_args"] = dict(connect_args)
+
+    pragmas = settings.get("sqlite_pragmas", {}) if backend == "sqlite" and not in_memory else {}
+    return options, pragmas
+
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, Any]) -> None:
+    """
+    Set the pragmas on every new connection of a (sync) SQLite engine
+    """
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def uses_queue_pool(url: str) -> bool:
+    """
+    Whether SQLAlchemy pools connections to this database in a QueuePool
+    """
+    parsed = make_url(url)
+    return not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"))
+
+
+def create_tuned_engine(url: str, profile: str = DB_PROFILE, **kwargs):
+    """
+    Create an engine with the settings of a tuning profile, timing pool
+    checkouts for the metrics endpoint
+    """
+    options, pragmas = engine_options(url, profile)
+    if uses_queue_pool(url):
+        options["poolclass"] = TimedQueuePool
+    engine = create_engine(url, echo=False, **{**options, **kwargs})
+    apply_sqlite_pragmas(engine, pragmas)
+    track_pool(engine, make_url(url).render_as_string(hide_password=True))
+    return engine
+
+
+def async_url(url: str) -> str:
+    """
+    Convert a sync database URL to the matching async driver URL
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def create_async_session_factory(url: str, profile: str = DB_PROFILE):
+    """
+    Create an async engine and session factory for the given database URL,
+    tuned by the same profiles as the sync engines.
+
+    sqlalchemy.ext.asyncio needs greenlet and an async driver, so it is only
+    imported when the async path is enabled.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    options, pragmas = engine_options(url, profile)
+    if uses_queue_pool(url):
+        options["poolclass"] = TimedAsyncAdaptedQueuePool
+    engine = create_async_engine(url, echo=False, **options)
+    apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    track_pool(engine.sync_engine, make_url(url).render_as_string(hide_password=True))
+    return engine, async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
@@ -0,0 +1,383 @@
+from collections import OrderedDict
+from sqlalchemy import JSON, Column, Float, Integer, LargeBinary, MetaData, String, Table
+from sqlalchemy.exc import IntegrityError
+from src.engines import create_tuned_engine
+from src.metrics import REGISTRY, Counter
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+# Replay the stored response for requests repeating an Idempotency-Key
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# Responses kept in the in-process LRU, and for how many seconds
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Also keep keys in this database, shared by every worker process (unset is
+# in-process only)
+IDEMPOTENCY_DATABASE_URL = os.getenv("IDEMPOTENCY_DATABASE_URL", "")
+# Seconds a duplicate waits for the original request before getting a 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+# Seconds a request holds its key in the shared table before another may
+# take it over, so a worker that dies mid-request does not lock the key
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE", "60"))
+# Larger request bodies are passed through without deduplication, rather
+# than buffered to fingerprint them
+IDEMPOTENCY_MAX_REQUEST_BYTES = int(os.getenv("IDEMPOTENCY_MAX_REQUEST_BYTES", "1048576"))
+# Larger responses are not stored, so their keys can be retried
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", "1048576"))
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Failures worth retrying: the request is run again rather than replayed
+RETRYABLE_STATUS = {408, 409, 425, 429}
+POLL_INTERVAL = 0.05
+
+REPLAYS = REGISTRY.register(Counter(
+    "idempotency_replays_total", "Requests answered with the stored response of an earlier request"
+))
+
+
+class StoredResponse:
+    """
+    A finished response, kept for requests repeating its key. A response
+    of None marks a request still in progress in another process.
+    """
+
+    def __init__(self, fingerprint: str, status: Optional[int] = None,
+                 headers: Optional[List[Tuple[str, str]]] = None, body: bytes = b"",
+                 expires_at: float = 0.0):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers or []
+        self.body = body
+        self.expires_at = expires_at
+
+    @property
+    def pending(self) -> bool:
+        return self.status is None
+
+
+class MemoryIdempotencyStore:
+    """
+    Bounded LRU of stored responses, expiring after ttl seconds
+    """
+
+    def __init__(self, capacity: int = IDEMPOTENCY_CACHE_SIZE, ttl: float = IDEMPOTENCY_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return stored
+
+    def put(self, key: str, stored: StoredResponse) -> None:
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+metadata = MetaData()
+
+idempotency_keys = Table(
+    "idempotency_keys", metadata,
+    Column("key", String(320), primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("status", Integer, nullable=True),   # NULL while in progress
+    Column("owner", String(32), nullable=True),  # Request holding a pending key
+    Column("headers", JSON, nullable=True),
+    Column("body", LargeBinary, nullable=True),
+    Column("expires_at", Float, nullable=False),
+)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Stored responses in the idempotency_keys table, so every worker process
+    sees them. A request claims its key by inserting a pending row, which
+    expires after a short lease; the full ttl starts once its response is
+    stored. A pending row whose lease ran out is taken over by the next
+    request, and only the owner of a claim can complete or release it.
+    """
+
+    def __init__(self, engine, ttl: float = IDEMPOTENCY_TTL, lease: float = IDEMPOTENCY_LEASE):
+        self.engine = engine
+        self.ttl = ttl
+        self.lease = lease
+        metadata.create_all(bind=engine)
+
+    def claim(self, key: str, fingerprint: str, owner: str) -> Optional[StoredResponse]:
+        """
+        Claim key for a new request. Returns None once claimed, or the row
+        already holding it.
+        """
+        table = idempotency_keys
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key, table.c.expires_at <= now))
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(table.insert().values(
+                    key=key, fingerprint=fingerprint, owner=owner, expires_at=now + self.lease
+                ))
+            return None
+        except IntegrityError:
+            return self.get(key)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        table = idempotency_keys
+        with self.engine.connect() as conn:
+            row = conn.execute(table.select().where(
+                table.c.key == key, table.c.expires_at > time.time()
+            )).first()
+        if row is None:
+            return None
+        return StoredResponse(
+            row.fingerprint, row.status, [tuple(header) for header in row.headers or []],
+            row.body or b"", row.expires_at
+        )
+
+    def complete(self, key: str, stored: StoredResponse, owner: str) -> None:
+        table = idempotency_keys
+        with self.engine.begin() as conn:
+            conn.execute(table.update().where(
+                table.c.key == key, table.c.owner == owner, table.c.status.is_(None)
+            ).values(
+                status=stored.status, headers=[list(header) for header in stored.headers],
+                body=stored.body, owner=None, expires_at=time.time() + self.ttl
+            ))
+
+    def release(self, key: str, owner: str) -> None:
+        table = idempotency_keys
+        with self.engine.begin() as conn:
+            conn.execute(table.delete().where(
+                table.c.key == key, table.c.owner == owner, table.c.status.is_(None)
+            ))
+
+
+def fingerprint(scope: Scope):
+    """
+    A hash of the request line, for the body to be added to as it arrives
+    """
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b"")):
+        digest.update(part + b"\0")
+    return digest
+
+
+def replay_receive(messages: List[Message], receive: Receive) -> Receive:
+    """
+    A receive that hands out already-read messages before reading on
+    """
+    pending = list(messages)
+
+    async def receive_next() -> Message:
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return receive_next
+
+
+class IdempotencyMiddleware:
+    """
+    Deduplicates retried writes carrying an Idempotency-Key header.
+
+    The first request with a key runs; its response is stored and replayed
+    for later requests with the same key, method and path, marked with
+    Idempotent-Replayed: true. Duplicates arriving while it runs wait for it.
+    Reusing a key for a different request body is a 422. Server errors and
+    retryable statuses are not stored, so the client's retry runs again.
+
+    Keys are scoped by the Authorization header, when one is sent. The body
+    is hashed as it arrives and held only up to max_request_bytes; larger
+    requests are passed through, body still streaming, without
+    deduplication, leaving size limits and streaming uploads to the route.
+    """
+
+    def __init__(self, app: ASGIApp, memory: Optional[MemoryIdempotencyStore] = None,
+                 database: Optional[DatabaseIdempotencyStore] = None,
+                 wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT,
+                 max_response_bytes: int = IDEMPOTENCY_MAX_RESPONSE_BYTES,
+                 max_request_bytes: int = IDEMPOTENCY_MAX_REQUEST_BYTES):
+        self.app = app
+        self.memory = memory if memory is not None else MemoryIdempotencyStore()
+        self.database = database
+        self.wait_timeout = wait_timeout
+        self.max_response_bytes = max_response_bytes
+        self.max_request_bytes = max_request_bytes
+        self._running: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in UNSAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        key = headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self.error(scope, receive, send, 400,
+                             f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        length = headers.get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_request_bytes:
+            await self.app(scope, receive, send)
+            return
+        messages, request_fingerprint, disconnected = await self.read_body(scope, receive)
+        if disconnected:
+            return
+        if request_fingerprint is None:
+            # Too large to hold: run it as if no key was sent
+            await self.app(scope, replay_receive(messages, receive), send)
+            return
+        authorization = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()[:16]
+        store_key = f"{scope['method']} {scope['path']} {authorization} {key.decode('latin-1')}"
+
+        owner = uuid.uuid4().hex
+        stored = await self.wait_for(store_key, request_fingerprint, owner)
+        if stored == "timeout":
+            await self.error(scope, receive, send, 409,
+                             "A request with this Idempotency-Key is still in progress")
+            return
+        if stored is not None:
+            if stored.fingerprint != request_fingerprint:
+                await self.error(scope, receive, send, 422,
+                                 "Idempotency-Key was already used for a different request")
+                return
+            REPLAYS.inc()
+            await self.replay(stored, send)
+            return
+
+        # This request owns the key
+        done = self._running[store_key] = asyncio.Event()
+        try:
+            await self.run(scope, messages, receive, send, store_key, request_fingerprint, owner)
+        finally:
+            del self._running[store_key]
+            done.set()
+
+    async def read_body(self, scope: Scope,
+                        receive: Receive) -> Tuple[List[Message], Optional[str], bool]:
+        """
+        Read the body messages, hashing them as they arrive. The fingerprint
+        is None if the body grew past max_request_bytes, in which case
+        reading stops there.
+        """
+        messages, size, digest = [], 0, fingerprint(scope)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return messages, None, True
+            messages.append(message)
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_request_bytes:
+                return messages, None, False
+            digest.update(chunk)
+            if not message.get("more_body", False):
+                return messages, digest.hexdigest(), False
+
+    async def wait_for(self, store_key: str, request_fingerprint: str, owner: str):
+        """
+        The stored response for a key, waiting while another request holds
+        it. None means the key is now claimed by this request, as owner.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            stored = self.memory.get(store_key)
+            if stored is not None:
+                return stored
+            running = self._running.get(store_key)
+            if running is not None:
+                try:
+                    await asyncio.wait_for(running.wait(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    return "timeout"
+                continue
+            if self.database is None:
+                return None
+            stored = await run_in_threadpool(
+                self.database.claim, store_key, request_fingerprint, owner
+            )
+            if stored is None or not stored.pending:
+                return stored
+            # Held by a request in another process: poll until it finishes
+            if time.monotonic() >= deadline:
+                return "timeout"
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def run(self, scope: Scope, messages: List[Message], receive: Receive, send: Send,
+                  store_key: str, request_fingerprint: str, owner: str):
+        status, response_headers, chunks, size = None, [], [], 0
+
+        async def capture(message: Message):
+            nonlocal status, response_headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body" and size <= self.max_response_bytes:
+                size += len(message.get("body", b""))
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        stored = None
+        try:
+            await self.app(scope, replay_receive(messages, receive), capture)
+            if (status is not None and status < 500 and status not in RETRYABLE_STATUS
+                    and size <= self.max_response_bytes):
+                stored = StoredResponse(
+                    request_fingerprint, status, response_headers, b"".join(chunks),
+                    time.time() + self.memory.ttl
+                )
+                self.memory.put(store_key, stored)
+        finally:
+            if self.database is not None:
+                if stored is not None:
+                    await run_in_threadpool(self.database.complete, store_key, stored, owner)
+                else:
+                    await run_in_threadpool(self.database.release, store_key, owner)
+
+    async def replay(self, stored: StoredResponse, send: Send):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": stored.status, "headers": headers})
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def error(self, scope: Scope, receive: Receive, send: Send, status_code: int, detail: str):
+        await JSONResponse(status_code=status_code, content={"detail": detail})(scope, receive, send)
+
+
+def install_idempotency(app) -> None:
+    """
+    Add Idempotency-Key handling to an app
+    """
+    if not IDEMPOTENCY_ENABLED:
+        return
+    database = None
+    if IDEMPOTENCY_DATABASE_URL:
+        database = DatabaseIdempotencyStore(create_tuned_engine(IDEMPOTENCY_DATABASE_URL))
+    app.add_middleware(IdempotencyMiddleware, database=database)
@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from src.models.job import Job
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Run /specify, /plan and /tasks as background jobs (opt-in)
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "false").lower() == "true"
+# Generators run on "thread" or "process" workers
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "thread")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Longest wait a GET /jobs/{id}?wait= long-poll may ask for, in seconds
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+# Seconds a running job's lease lasts without being renewed by its owner;
+# jobs whose lease ran out are run again by any queue
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = {SUCCEEDED, FAILED}
+
+POLL_INTERVAL = 0.1
+
+
+def job_status(job: Job) -> Dict[str, Any]:
+    """
+    The public view of a job
+    """
+    return {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_date": job.created_date.isoformat() if job.created_date else None,
+        "started_date": job.started_date.isoformat() if job.started_date else None,
+        "finished_date": job.finished_date.isoformat() if job.finished_date else None,
+    }
+
+
+class JobQueue:
+    """
+    Persisted background jobs run by a pool of workers.
+
+    Every job is a row in the jobs table, written before it is queued. A
+    queue running a job records itself as the owner and holds a lease on
+    it, renewed by a heartbeat thread. Jobs left queued, or running under a
+    lease that has run out because their owner stopped, are run again by
+    resume(), which the heartbeat also calls, so several processes can
+    share the table without running a job twice. Dispatcher threads track
+    each job's state; with the "process" executor the generator itself runs
+    in a worker process, and must be a picklable top-level function.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+                 executor: str = JOB_EXECUTOR, workers: int = JOB_WORKERS,
+                 lease: float = JOB_LEASE):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown job executor {executor!r}")
+        self.session_factory = session_factory
+        self.handlers = handlers
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._dispatch = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._processes = ProcessPoolExecutor(max_workers=workers) if executor == "process" else None
+        # Jobs waiting in this queue's dispatcher, so resume() adds each once
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        """
+        Persist a job and queue it. Returns the queued job.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        db = self.session_factory()
+        try:
+            job = Job(kind=kind, status=QUEUED, params=params)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        self._queue(job.id)
+        return job
+
+    def resume(self) -> int:
+        """
+        Queue every job left queued, and every running job whose owner's
+        lease has run out. Returns the number of jobs queued. Jobs another
+        queue also picks up still run once, as running a job claims it.
+        """
+        db = self.session_factory()
+        try:
+            db.query(Job).filter(
+                Job.status == RUNNING,
+                Job.lease_expires.is_(None) | (Job.lease_expires < datetime.utcnow())
+            ).update(
+                {Job.status: QUEUED, Job.started_date: None, Job.owner: None,
+                 Job.lease_expires: None},
+                synchronize_session=False
+            )
+            db.commit()
+            job_ids = [job_id for (job_id,) in db.query(Job.id).filter(
+                Job.status == QUEUED
+            ).order_by(Job.created_date)]
+        finally:
+            db.close()
+        return sum(self._queue(job_id) for job_id in job_ids)
+
+    def _queue(self, job_id: uuid.UUID) -> bool:
+        with self._lock:
+            if job_id in self._queued:
+                return False
+            self._queued.add(job_id)
+        self._dispatch.submit(self._run, job_id)
+        return True
+
+    def get(self, job_id: uuid.UUID) -> Optional[Job]:
+        db = self.session_factory()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    async def wait(self, job_id: uuid.UUID, timeout: float) -> Optional[Job]:
+        """
+        The job once finished, or as it stands after timeout seconds. The
+        table is polled, so jobs run by other processes are seen too.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(timeout, JOB_MAX_WAIT)
+        while True:
+            job = await loop.run_in_executor(None, self.get, job_id)
+            if job is None or job.status in FINISHED or loop.time() >= deadline:
+                return job
+            await asyncio.sleep(min(POLL_INTERVAL, max(deadline - loop.time(), 0)))
+
+    def _run(self, job_id: uuid.UUID) -> None:
+        with self._lock:
+            self._queued.discard(job_id)
+        db = self.session_factory()
+        try:
+            # Claim the job, so a job queued twice only runs once
+            now = datetime.utcnow()
+            claimed = db.query(Job).filter(Job.id == job_id, Job.status == QUEUED).update(
+                {Job.status: RUNNING, Job.started_date: now, Job.owner: self.owner,
+                 Job.lease_expires: now + timedelta(seconds=self.lease)},
+                synchronize_session=False
+            )
+            db.commit()
+            if not claimed:
+                return
+            job = db.query(Job).filter(Job.id == job_id).one()
+            handler = self.handlers[job.kind]
+            try:
+                if self._processes is not None:
+                    result = self._processes.submit(handler, job.params).result()
+                else:
+                    result = handler(job.params)
+                job.status, job.result = SUCCEEDED, result
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job_id, job.kind)
+                job.status, job.error = FAILED, str(e) or type(e).__name__
+            job.finished_date = datetime.utcnow()
+            job.lease_expires = None
+            db.commit()
+        finally:
+            db.close()
+
+    def _beat(self) -> None:
+        # Renew the leases of this queue's running jobs, and pick up jobs
+        # whose owners stopped renewing theirs
+        while not self._stopped.wait(self.lease / 3):
+            db = self.session_factory()
+            try:
+                db.query(Job).filter(Job.owner == self.owner, Job.status == RUNNING).update(
+                    {Job.lease_expires: datetime.utcnow() + timedelta(seconds=self.lease)},
+                    synchronize_session=False
+                )
+                db.commit()
+            except Exception:
+                logger.exception("Renewing job leases failed")
+            finally:
+                db.close()
+            try:
+                self.resume()
+            except Exception:
+                logger.exception("Resuming expired jobs failed")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers. Jobs not yet started stay queued in the table and
+        run after the next resume().
+        """
+        self._stopped.set()
+        self._heartbeat.join()
+        self._dispatch.shutdown(wait=wait, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=True)
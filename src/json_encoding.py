@@ -0,0 +1,91 @@
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+from typing import Any
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used instead
+    orjson = None
+
+# Response JSON encoder: "auto" uses orjson when it is installed, "json"
+# always uses the stdlib
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto")
+
+
+class RawJSON:
+    """
+    Already-serialized JSON, such as a cached body or a stored column,
+    spliced into the output of dumps() as is
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def _default(value: Any) -> Any:
+    # Anything that is not plain JSON (UUIDs, datetimes, models) goes through
+    # FastAPI's encoder, as it would have without this layer
+    return jsonable_encoder(value)
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(
+        value, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits, which the stdlib encoder handles
+        return _stdlib_dumps(value)
+
+
+def _encoder(name: str):
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise RuntimeError("JSON_ENCODER=orjson needs the orjson package")
+        return _orjson_dumps
+    return _stdlib_dumps
+
+
+_encode = _encoder(JSON_ENCODER)
+
+
+def _contains_raw(value: Any) -> bool:
+    if isinstance(value, RawJSON):
+        return True
+    return isinstance(value, dict) and any(_contains_raw(item) for item in value.values())
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode a value as compact UTF-8 JSON, splicing in RawJSON values (at any
+    depth of nested dicts) without re-encoding them
+    """
+    if isinstance(value, RawJSON):
+        return value.data
+    if isinstance(value, dict) and _contains_raw(value):
+        return b"{" + b",".join(
+            _encode(str(key)) + b":" + dumps(item) for key, item in value.items()
+        ) + b"}"
+    return _encode(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with dumps(). Bytes are sent as they are, so
+    pre-serialized bodies skip encoding entirely.
+
+    Returning one from an endpoint also skips FastAPI's jsonable_encoder
+    pass, which endpoints returning plain dicts do not need.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
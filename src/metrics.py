@@ -0,0 +1,266 @@
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.structured_logging import dropped_records
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import bisect
+import os
+import threading
+import time
+import weakref
+
+# Collect request and pool metrics and serve them on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Label used for requests that matched no route, so 404 scans cannot
+# create unbounded label sets
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels, extra: Labels = ()) -> str:
+    parts = [f'{name}="{escape_label(value)}"' for name, value in labels + extra]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram family: one bisect and one locked increment per
+    observation, whatever the number of observations
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels.items())
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then +Inf, sum and count
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in snapshot:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(key, (('le', str(bound)),))} {format_value(cumulative)}"
+            cumulative += series[len(self.buckets)]
+            yield f"{self.name}_bucket{format_labels(key, (('le', '+Inf'),))} {format_value(cumulative)}"
+            yield f"{self.name}_sum{format_labels(key)} {format_value(series[-2])}"
+            yield f"{self.name}_count{format_labels(key)} {format_value(series[-1])}"
+
+
+class Counter:
+    """
+    Monotonic counter family
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(labels.items())
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(labels.items()), 0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            snapshot = list(self._values.items())
+        for key, value in snapshot:
+            yield f"{self.name}{format_labels(key)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    Gauge family that can go up and down
+    """
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Registry:
+    """
+    Metric families plus callbacks that collect values at scrape time
+    """
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template"
+))
+REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "Requests by route template and status code"
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"
+))
+POOL_CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection",
+    POOL_WAIT_BUCKETS
+))
+
+# Pools created with a timed pool class, by name, reported at scrape time
+_pools: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+
+
+class TimedCheckout:
+    """
+    Pool mixin that records how long each connection checkout waits
+    """
+    metrics_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, pool=self.metrics_name)
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep reporting under the same name
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        _pools[self.metrics_name] = pool
+        return pool
+
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def track_pool(engine, name: str) -> None:
+    """
+    Report an engine's pool under name, if it uses a timed pool class
+    """
+    if isinstance(engine.pool, TimedCheckout):
+        engine.pool.metrics_name = name
+        _pools[name] = engine.pool
+
+
+def collect_pools() -> Iterable[str]:
+    yield "# HELP db_pool_connections Pooled connections by state"
+    yield "# TYPE db_pool_connections gauge"
+    for name, pool in list(_pools.items()):
+        labels = (("pool", name),)
+        yield f"db_pool_connections{format_labels(labels + (('state', 'checked_out'),))} {pool.checkedout()}"
+        yield f"db_pool_connections{format_labels(labels + (('state', 'idle'),))} {pool.checkedin()}"
+
+
+def collect_log_drops() -> Iterable[str]:
+    yield "# HELP log_records_dropped_total Log records dropped because the log queue was full"
+    yield "# TYPE log_records_dropped_total counter"
+    yield f"log_records_dropped_total {dropped_records()}"
+
+
+REGISTRY.add_collector(collect_pools)
+REGISTRY.add_collector(collect_log_drops)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status codes and in-flight requests per route template
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def record_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, record_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            REQUEST_DURATION.observe(time.perf_counter() - start, route=route, method=scope["method"])
+            REQUESTS.inc(route=route, method=scope["method"], status=str(status_code))
+
+
+def metrics_endpoint():
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def install_metrics(app) -> None:
+    """
+    Add the metrics middleware and the /metrics endpoint to an app
+    """
+    if not METRICS_ENABLED:
+        return
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, Text, JSON, UUID, Index
+from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+import uuid
+
+Base = declarative_base()
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)  # specify, plan or tasks
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    params = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON)  # Generator output once succeeded
+    error = Column(Text)  # Failure message once failed
+    created_date = Column(DateTime, default=datetime.utcnow)
+    started_date = Column(DateTime)
+    finished_date = Column(DateTime)
+    owner = Column(String)  # Queue running the job
+    lease_expires = Column(DateTime)  # Renewed by the owner while it runs
+
+    __table_args__ = (
+        # Unfinished jobs are looked up by status on startup
+        Index("ix_jobs_status", "status"),
+    )
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind={self.kind}, status={self.status})>"
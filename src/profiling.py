@@ -0,0 +1,141 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import marshal
+import os
+import re
+import sys
+import threading
+
+# A function as pstats identifies it: (filename, first line, name)
+FunctionKey = Tuple[str, int, str]
+Stack = Tuple[FunctionKey, ...]
+
+# Innermost frames of threads that are waiting rather than working
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+PROFILE_FORMATS = ("collapsed", "pstats")
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread records the stacks of every
+    busy thread each interval.
+
+    Sampling covers all threads rather than only the calling one, because
+    sync endpoints run in the thread pool, not on the event loop. Work done
+    concurrently for other requests is sampled too.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[tuple(stack)] += 1
+
+    def collapsed(self) -> str:
+        """
+        Samples in the collapsed-stack format read by flamegraph tools
+        """
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def pstats(self) -> bytes:
+        """
+        Samples as a marshalled pstats table, loadable with pstats.Stats.
+
+        Call counts are sample counts and times are samples times the
+        interval, so ratios are meaningful but absolute call counts are not.
+        """
+        stats: Dict[FunctionKey, List] = {}
+        for stack, count in self.samples.items():
+            elapsed = count * self.interval
+            seen = set()
+            for depth, function in enumerate(stack):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                leaf = depth == len(stack) - 1
+                if leaf:
+                    entry[2] += elapsed
+                # Cumulative time counts a recursive function once per sample
+                if function not in seen:
+                    seen.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += elapsed
+                if depth:
+                    caller = stack[depth - 1]
+                    nc, cc, tt, ct = entry[4].get(caller, (0, 0, 0.0, 0.0))
+                    entry[4][caller] = (nc + count, cc + count, tt + (elapsed if leaf else 0.0), ct + elapsed)
+        return marshal.dumps({
+            function: (cc, nc, tt, ct, callers) for function, (cc, nc, tt, ct, callers) in stats.items()
+        })
+
+
+def profile_filename(started_ms: int, route: str, request_id: str, profile_format: str) -> str:
+    """
+    Name of a profile file, tagged with route and request ID. The timestamp
+    prefix keeps names in creation order.
+    """
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    request = re.sub(r"[^A-Za-z0-9-]+", "", request_id)[:64]
+    extension = "pstats" if profile_format == "pstats" else "collapsed"
+    return f"{started_ms:013d}-{slug}-{request}.{extension}"
+
+
+def write_profile(directory: str, filename: str, sampler: StackSampler,
+                  profile_format: str, max_files: int) -> str:
+    """
+    Write a profile into the ring directory, deleting the oldest profiles
+    beyond max_files. Returns the path written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    if profile_format == "pstats":
+        with open(path, "wb") as f:
+            f.write(sampler.pstats())
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+
+    profiles = sorted(
+        name for name in os.listdir(directory) if name.endswith((".pstats", ".collapsed"))
+    )
+    for name in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return path
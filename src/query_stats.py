@@ -0,0 +1,176 @@
+from collections import Counter as ShapeCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.metrics import REGISTRY, Counter, Histogram, UNMATCHED_ROUTE
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Iterator, Optional
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Count SQL statements, DB time and rows per request
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+# Report each request's counts in X-DB-* response headers (debug only)
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() == "true"
+# A statement shape repeated this many times in one request is flagged as a
+# likely N+1 query (0 disables the check)
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+STATEMENTS_PER_REQUEST = REGISTRY.register(Histogram(
+    "db_statements_per_request", "SQL statements issued per request by route template",
+    STATEMENT_BUCKETS
+))
+DB_TIME_PER_REQUEST = REGISTRY.register(Histogram(
+    "db_time_per_request_seconds", "Time spent executing SQL per request by route template"
+))
+ROWS = REGISTRY.register(Counter(
+    "db_rows_total", "Rows reported by the driver for statements, by route template"
+))
+REPEATED_STATEMENTS = REGISTRY.register(Counter(
+    "db_repeated_statements_total", "Requests with a statement shape repeated past the threshold"
+))
+
+# Collapse bind parameter lists so "IN (?, ?)" and "IN (?, ?, ?)" share a shape
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalize a statement so executions differing only in parameters match
+    """
+    return _PARAMETER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """
+    Statements, DB time and rows recorded for one request
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.shapes: ShapeCounter = ShapeCounter()
+
+    def record(self, statement: str, elapsed: float, rowcount: int) -> None:
+        self.statements += 1
+        self.db_time += elapsed
+        if rowcount > 0:
+            self.rows += rowcount
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD):
+        """
+        Statement shapes issued at least threshold times, most frequent first
+        """
+        if not threshold:
+            return []
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def record_queries() -> Iterator[QueryStats]:
+    """
+    Record the statements issued inside the block, e.g. to pin the query
+    count of a service method in a test
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_stats_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    start = getattr(context, "_query_stats_start", None)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    stats.record(statement, elapsed, getattr(cursor, "rowcount", -1))
+
+
+class QueryStatsMiddleware:
+    """
+    Records the SQL issued while handling each request, reports it to the
+    metrics and, in debug mode, in X-DB-* response headers
+    """
+
+    def __init__(self, app: ASGIApp, headers: bool = QUERY_STATS_HEADERS,
+                 repeat_threshold: int = QUERY_REPEAT_THRESHOLD):
+        self.app = app
+        self.headers = headers
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Sync endpoints run in a thread pool with a copy of this context,
+        # so the shared QueryStats object sees their statements too
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.statements)
+                headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+                headers["X-DB-Rows"] = str(stats.rows)
+                repeated = stats.repeated(self.repeat_threshold)
+                if repeated:
+                    headers["X-DB-Repeated-Statements"] = str(len(repeated))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.headers else send)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            STATEMENTS_PER_REQUEST.observe(stats.statements, route=route)
+            DB_TIME_PER_REQUEST.observe(stats.db_time, route=route)
+            if stats.rows:
+                ROWS.inc(stats.rows, route=route)
+            repeated = stats.repeated(self.repeat_threshold)
+            if repeated:
+                REPEATED_STATEMENTS.inc(route=route)
+                shape, count = repeated[0]
+                logger.warning(
+                    "Possible N+1 query: %s statement shapes repeated in %s %s",
+                    len(repeated), scope["method"], route,
+                    extra={
+                        "route": route,
+                        "request_id": scope.get("state", {}).get("request_id"),
+                        "repeated_shape": shape,
+                        "repeat_count": count,
+                    }
+                )
+
+
+def install_query_stats(app) -> None:
+    """
+    Add per-request SQL accounting to an app
+    """
+    if QUERY_STATS_ENABLED:
+        app.add_middleware(QueryStatsMiddleware)
@@ -0,0 +1,32 @@
+from src.singleflight import async_single_flight
+from typing import Any
+
+
+class AsyncService:
+    """
+    Async facade over a sync service class.
+
+    Every public method of service_class becomes awaitable: the call runs
+    against the AsyncSession's underlying Session through run_sync, so the
+    query logic stays in the sync service and is never duplicated. Methods
+    marked @single_flight are coalesced on the event loop.
+    """
+    service_class: Any = None
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name: str):
+        method = getattr(self.service_class, name, None)
+        if name.startswith("_") or not callable(method):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            if hasattr(method, "single_flight"):
+                return await async_single_flight(self.db, self.service_class, method, args, kwargs)
+            return await self.db.run_sync(
+                lambda session: method(self.service_class(session), *args, **kwargs)
+            )
+
+        call.__name__ = name
+        return call
@@ -1,4 +1,6 @@
 from sqlalchemy.orm import Session
+from src.services.async_service import AsyncService
+from src.singleflight import single_flight
 from src.models.feature_specification import FeatureSpecification
 import uuid
 from typing import Optional, List, Dict, Any
@@ -22,6 +24,7 @@ class FeatureService:
         self.db.refresh(feature_spec)
         return feature_spec
 
+    @single_flight
     def get_feature_specification(self, feature_id: uuid.UUID) -> Optional[FeatureSpecification]:
         """
         Retrieve a feature specification by ID
@@ -51,4 +54,11 @@ class FeatureService:
             self.db.delete(feature_spec)
             self.db.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+class AsyncFeatureService(AsyncService):
+    """
+    Awaitable FeatureService for use with an AsyncSession
+    """
+    service_class = FeatureService
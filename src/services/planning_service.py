@@ -1,4 +1,6 @@
 from sqlalchemy.orm import Session
+from src.services.async_service import AsyncService
+from src.singleflight import single_flight
 from src.models.implementation_plan import ImplementationPlan
 import uuid
 from typing import Optional, List, Dict, Any
@@ -32,6 +34,7 @@ class PlanningService:
             ImplementationPlan.id == plan_id
         ).first()
 
+    @single_flight
     def get_implementation_plan_by_feature(self, feature_id: uuid.UUID) -> Optional[ImplementationPlan]:
         """
         Retrieve an implementation plan by feature ID
@@ -61,4 +64,11 @@ class PlanningService:
             self.db.delete(plan)
             self.db.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+class AsyncPlanningService(AsyncService):
+    """
+    Awaitable PlanningService for use with an AsyncSession
+    """
+    service_class = PlanningService
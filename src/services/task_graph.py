@@ -0,0 +1,290 @@
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
+
+# Task graphs kept in memory, one per feature, and for how many seconds.
+# Writes only invalidate the graphs of the process that made them, so the
+# TTL bounds how long other workers, and changes made outside TaskService,
+# can go unseen (0 keeps them until a task of the feature changes)
+TASK_GRAPH_CACHE_SIZE = int(os.getenv("TASK_GRAPH_CACHE_SIZE", "256"))
+TASK_GRAPH_CACHE_TTL = float(os.getenv("TASK_GRAPH_CACHE_TTL", "30"))
+# Seconds a ready-task index is served for. Statuses change far more often
+# than dependencies, and a task completed by another worker only unblocks
+# its dependents here once the index is rebuilt.
+TASK_READY_CACHE_TTL = float(os.getenv("TASK_READY_CACHE_TTL", "5"))
+
+# Task columns the graph is built from; changing any other column (such as
+# status) leaves a feature's graph as it was
+GRAPH_FIELDS = {"task_id", "feature_id", "dependencies", "parallelizable"}
+
+COMPLETE = "Complete"
+
+
+class TaskGraphError(ValueError):
+    """
+    The tasks of a feature do not form a valid dependency graph
+    """
+
+
+class TaskGraph:
+    """
+    Dependency DAG of a feature's tasks.
+
+    Tasks are indexed by position, with an adjacency list from each task to
+    the tasks depending on it, and everything is resolved once, when the
+    graph is built, in O(tasks + dependencies): the topological order (Kahn's
+    algorithm, ties broken by task ID), the depth of each task, and the
+    critical path. A task's dependencies name the task_ids it waits for.
+    """
+
+    def __init__(self, tasks: Iterable[Any]):
+        tasks = sorted(tasks, key=lambda task: task.task_id)
+        self.task_ids = [task.task_id for task in tasks]
+        self.parallelizable = [bool(task.parallelizable) for task in tasks]
+        self.index = {task_id: i for i, task_id in enumerate(self.task_ids)}
+        if len(self.index) != len(self.task_ids):
+            duplicates = sorted({t for t in self.task_ids if self.task_ids.count(t) > 1})
+            raise TaskGraphError(f"Duplicate task IDs: {', '.join(duplicates)}")
+
+        self.dependencies: List[List[int]] = []
+        self.dependents: List[List[int]] = [[] for _ in tasks]
+        missing = set()
+        for i, task in enumerate(tasks):
+            deps = []
+            for dep in dict.fromkeys(task.dependencies or []):
+                j = self.index.get(dep)
+                if j is None:
+                    missing.add(dep)
+                    continue
+                deps.append(j)
+                self.dependents[j].append(i)
+            self.dependencies.append(deps)
+        if missing:
+            raise TaskGraphError(f"Unknown dependencies: {', '.join(sorted(missing))}")
+
+        self.order = self._topological_order()
+        self.depth, self.critical_path = self._longest_paths()
+
+    def _topological_order(self) -> List[int]:
+        in_degree = [len(deps) for deps in self.dependencies]
+        ready = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for j in self.dependents[i]:
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    ready.append(j)
+        if len(order) < len(self.task_ids):
+            cycle = self._find_cycle([i for i, degree in enumerate(in_degree) if degree])
+            raise TaskGraphError(
+                "Task dependencies form a cycle: "
+                + " -> ".join(self.task_ids[i] for i in cycle)
+            )
+        return order
+
+    def _find_cycle(self, blocked: List[int]) -> List[int]:
+        # Every task left blocked by Kahn's algorithm waits on another blocked
+        # task, so following those dependencies must come back around
+        blocked_set = set(blocked)
+        path: List[int] = []
+        seen: Dict[int, int] = {}
+        i = blocked[0]
+        while i not in seen:
+            seen[i] = len(path)
+            path.append(i)
+            i = next(j for j in self.dependencies[i] if j in blocked_set)
+        cycle = path[seen[i]:] + [i]
+        cycle.reverse()
+        return cycle
+
+    def _longest_paths(self) -> Tuple[List[int], List[int]]:
+        depth = [0] * len(self.task_ids)
+        previous = [-1] * len(self.task_ids)
+        for i in self.order:
+            for j in self.dependents[i]:
+                if depth[i] + 1 > depth[j]:
+                    depth[j] = depth[i] + 1
+                    previous[j] = i
+        if not depth:
+            return depth, []
+        i = max(range(len(depth)), key=lambda k: (depth[k], -k))
+        path = []
+        while i != -1:
+            path.append(i)
+            i = previous[i]
+        path.reverse()
+        return depth, path
+
+    def waves(self) -> List[List[str]]:
+        """
+        Tasks grouped into waves that run one after another. Every task's
+        dependencies finish in earlier waves; tasks that are not
+        parallelizable get a wave to themselves.
+        """
+        levels: List[List[int]] = [[] for _ in range(max(self.depth, default=-1) + 1)]
+        for i in self.order:
+            levels[self.depth[i]].append(i)
+        waves = []
+        for level in levels:
+            parallel = [self.task_ids[i] for i in level if self.parallelizable[i]]
+            if parallel:
+                waves.append(parallel)
+            waves.extend([self.task_ids[i]] for i in level if not self.parallelizable[i])
+        return waves
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_count": len(self.task_ids),
+            "order": [self.task_ids[i] for i in self.order],
+            "waves": self.waves(),
+            "critical_path": [self.task_ids[i] for i in self.critical_path],
+        }
+
+
+class ReadyTasks:
+    """
+    Index of the tasks of a feature that are ready to run: not complete,
+    with every dependency complete.
+
+    Each task keeps a count of its unmet dependencies. A task completing (or
+    reopening) walks the graph's reverse index to adjust the counts of the
+    tasks depending on it, so a status change costs O(out-degree) rather
+    than a scan of the feature.
+    """
+
+    def __init__(self, graph: TaskGraph, statuses: Dict[str, str]):
+        self.graph = graph
+        self.status = [statuses.get(task_id) for task_id in graph.task_ids]
+        self.unmet = [
+            sum(1 for j in deps if self.status[j] != COMPLETE) for deps in graph.dependencies
+        ]
+        self.ready = {
+            i for i, unmet in enumerate(self.unmet) if not unmet and self.status[i] != COMPLETE
+        }
+        self._lock = threading.Lock()
+
+    def set_status(self, task_id: str, status: str) -> None:
+        i = self.graph.index.get(task_id)
+        if i is None:
+            return
+        with self._lock:
+            was_complete = self.status[i] == COMPLETE
+            self.status[i] = status
+            if was_complete == (status == COMPLETE):
+                return
+            if was_complete:
+                step = 1
+                if not self.unmet[i]:
+                    self.ready.add(i)
+            else:
+                step = -1
+                self.ready.discard(i)
+            for j in self.graph.dependents[i]:
+                self.unmet[j] += step
+                if self.status[j] != COMPLETE:
+                    if self.unmet[j]:
+                        self.ready.discard(j)
+                    else:
+                        self.ready.add(j)
+
+    def tasks(self) -> List[Dict[str, Any]]:
+        """
+        The ready tasks in task ID order
+        """
+        with self._lock:
+            return [{"task_id": self.graph.task_ids[i], "status": self.status[i]}
+                    for i in sorted(self.ready)]
+
+
+class TaskGraphCache:
+    """
+    Bounded in-process cache of built task graphs, or of indexes over them,
+    keyed by feature ID.
+
+    Writers call invalidate() after committing a change to a feature's
+    tasks, which drops its graph and records the change. Readers take
+    version() before querying and store with add(), which is ignored if the
+    feature changed in between, so a slow reader never caches a graph built
+    from tasks a writer has since replaced.
+    """
+
+    def __init__(self, capacity: int = TASK_GRAPH_CACHE_SIZE, ttl: float = TASK_GRAPH_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        # Version at which each recently changed feature last changed.
+        # Features forgotten to stay bounded count as changed at _floor.
+        self._changed: "OrderedDict[Any, int]" = OrderedDict()
+        self._version = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, feature_id: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(feature_id)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at and expires_at <= time.monotonic():
+                    del self._entries[feature_id]
+                else:
+                    self._entries.move_to_end(feature_id)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def add(self, feature_id: Any, value: Any, version: int) -> None:
+        """
+        Store a graph built from tasks read at the given version, unless the
+        feature changed since
+        """
+        with self._lock:
+            if self._changed.get(feature_id, self._floor) > version:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl else 0
+            self._entries[feature_id] = (value, expires_at)
+            self._entries.move_to_end(feature_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, feature_id: Any) -> None:
+        with self._lock:
+            self._entries.pop(feature_id, None)
+            self._record_change(feature_id)
+
+    def apply(self, feature_id: Any, update: Callable[[Any], None]) -> None:
+        """
+        Update the cached value in place. With nothing cached, the change is
+        recorded instead, so a value being built from older rows is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(feature_id)
+            if entry is None:
+                self._record_change(feature_id)
+            else:
+                update(entry[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _record_change(self, feature_id: Any) -> None:
+        self._version += 1
+        self._changed[feature_id] = self._version
+        self._changed.move_to_end(feature_id)
+        while len(self._changed) > self.capacity:
+            _, self._floor = self._changed.popitem(last=False)
+
+
+graph_cache = TaskGraphCache()
+ready_cache = TaskGraphCache(ttl=TASK_READY_CACHE_TTL)
@@ -1,9 +1,20 @@
 from sqlalchemy.orm import Session
+from src.services.async_service import AsyncService
+from src.services.task_graph import (
+    COMPLETE, GRAPH_FIELDS, ReadyTasks, TaskGraph, graph_cache, ready_cache
+)
+from src.singleflight import single_flight
 from src.models.task_list import TaskList
 import uuid
 from typing import Optional, List, Dict, Any
 
 
+def invalidate_feature(feature_id: uuid.UUID) -> None:
+    # The graph goes first: a ready index built after this sees the new graph
+    graph_cache.invalidate(feature_id)
+    ready_cache.invalidate(feature_id)
+
+
 class TaskService:
     def __init__(self, db: Session):
         self.db = db
@@ -28,6 +39,7 @@ class TaskService:
         )
         self.db.add(task)
         self.db.commit()
+        invalidate_feature(feature_id)
         self.db.refresh(task)
         return task
 
@@ -39,6 +51,7 @@ class TaskService:
             TaskList.task_id == task_id
         ).first()
 
+    @single_flight
     def get_tasks_by_feature(self, feature_id: uuid.UUID) -> List[TaskList]:
         """
         Retrieve all tasks for a feature
@@ -53,9 +66,17 @@ class TaskService:
         """
         task = self.get_task(task_id)
         if task:
+            feature_id = task.feature_id
             for key, value in kwargs.items():
                 setattr(task, key, value)
             self.db.commit()
+            if GRAPH_FIELDS.intersection(kwargs):
+                invalidate_feature(feature_id)
+                invalidate_feature(task.feature_id)
+            elif "status" in kwargs:
+                ready_cache.apply(
+                    feature_id, lambda ready: ready.set_status(task_id, kwargs["status"])
+                )
             self.db.refresh(task)
         return task
 
@@ -65,8 +86,10 @@ class TaskService:
         """
         task = self.get_task(task_id)
         if task:
+            feature_id = task.feature_id
             self.db.delete(task)
             self.db.commit()
+            invalidate_feature(feature_id)
             return True
         return False
 
@@ -74,4 +97,43 @@ class TaskService:
         """
         Mark a task as complete
         """
-        return self.update_task(task_id, status="Complete")
\ No newline at end of file
+        return self.update_task(task_id, status=COMPLETE)
+
+    def get_task_graph(self, feature_id: uuid.UUID) -> TaskGraph:
+        """
+        The dependency graph of a feature's tasks, built once and cached
+        until a task of the feature changes. Raises TaskGraphError if the
+        dependencies are not a DAG.
+        """
+        graph = graph_cache.get(feature_id)
+        if graph is None:
+            version = graph_cache.version()
+            rows = self.db.query(
+                TaskList.task_id, TaskList.dependencies, TaskList.parallelizable
+            ).filter(TaskList.feature_id == feature_id).all()
+            graph = TaskGraph(rows)
+            graph_cache.add(feature_id, graph, version)
+        return graph
+
+    def get_ready_tasks(self, feature_id: uuid.UUID) -> List[Dict[str, Any]]:
+        """
+        The tasks of a feature that are not complete and whose dependencies
+        all are, answered from an index kept up to date as tasks change
+        """
+        ready = ready_cache.get(feature_id)
+        if ready is None:
+            version = ready_cache.version()
+            graph = self.get_task_graph(feature_id)
+            statuses = dict(self.db.query(TaskList.task_id, TaskList.status).filter(
+                TaskList.feature_id == feature_id
+            ).all())
+            ready = ReadyTasks(graph, statuses)
+            ready_cache.add(feature_id, ready, version)
+        return ready.tasks()
+
+
+class AsyncTaskService(AsyncService):
+    """
+    Awaitable TaskService for use with an AsyncSession
+    """
+    service_class = TaskService
@@ -0,0 +1,221 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from src.metrics import REGISTRY, Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import copy
+import functools
+import itertools
+import os
+import threading
+
+# Let concurrent identical reads share one in-flight query
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+SHARED = REGISTRY.register(Counter(
+    "singleflight_shared_total", "Reads answered by another caller's in-flight query, by query"
+))
+
+# Bumped by every commit in the process. Flights are keyed by the value at
+# the time a caller arrives, so a read that starts after a commit never joins
+# one that started before it and cannot see older data than a plain query.
+_commits = itertools.count(1)
+_generation = 0
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    global _generation
+    _generation = next(_commits)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, across threads: the first
+    caller runs the function, callers arriving while it runs wait for it and
+    share its result or exception. Nothing is kept once the call returns.
+    """
+
+    def __init__(self, name: str, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call fn, or wait for the identical call already running. Returns the
+        result and whether it came from another caller.
+        """
+        if not self.enabled:
+            return fn(), False
+        key = (_generation, key)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            SHARED.inc(query=self.name)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop
+    """
+
+    def __init__(self, name: str, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if not self.enabled:
+            return await fn(), False
+        flight_key = (_generation, key)
+        future = self._calls.get(flight_key)
+        if future is not None:
+            try:
+                # Shielded so a follower giving up does not cancel the leader
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled, not this caller: query afresh
+                return await self.do(key, fn)
+            SHARED.inc(query=self.name)
+            return result, True
+
+        future = self._calls[flight_key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(flight_key) is future:
+                del self._calls[flight_key]
+
+
+def snapshot(result: Any) -> Any:
+    """
+    Loaded column values of an ORM result (an instance, a list of them or
+    None), to be copied into other sessions with adopt()
+    """
+    if result is None:
+        return None
+    if isinstance(result, list):
+        return [snapshot(item) for item in result]
+    state = inspect(result)
+    return state.mapper, {
+        attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs if attr.key in state.dict
+    }
+
+
+def with_snapshot(result: Any) -> Tuple[Any, Any]:
+    return result, snapshot(result)
+
+
+def adopt(session: Session, snapshot: Any) -> Any:
+    """
+    Rebuild a snapshot as instances of session, without querying
+    """
+    if snapshot is None:
+        return None
+    if isinstance(snapshot, list):
+        return [adopt(session, item) for item in snapshot]
+    mapper, values = snapshot
+    instance = mapper.class_manager.new_instance()
+    for key, value in values.items():
+        # Copied so JSON columns are never shared between sessions
+        set_committed_value(instance, key, copy.deepcopy(value))
+    make_transient_to_detached(instance)
+    return session.merge(instance, load=False)
+
+
+def coalescable(session) -> bool:
+    # A session with unflushed changes must see its own writes
+    return not (session.new or session.dirty or session.deleted)
+
+
+def flight_key(session, name: str, args: tuple, kwargs: Dict[str, Any]) -> Hashable:
+    return (str(session.get_bind().url), name, args, tuple(sorted(kwargs.items())))
+
+
+def single_flight(method: Callable) -> Callable:
+    """
+    Coalesce concurrent calls of a read-only service method with the same
+    arguments. The leader returns the instances it loaded; every other
+    caller gets copies merged into its own session (self.db).
+    """
+    name = method.__qualname__
+    flights = SingleFlight(name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        session = self.db
+        # Async sessions are coalesced by AsyncService on the event loop;
+        # blocking the loop thread here would deadlock
+        if session.get_bind().dialect.is_async or not coalescable(session):
+            return method(self, *args, **kwargs)
+        (result, loaded), shared = flights.do(
+            flight_key(session, name, args, kwargs),
+            lambda: with_snapshot(method(self, *args, **kwargs))
+        )
+        return adopt(session, loaded) if shared else result
+
+    wrapper.single_flight = method
+    wrapper.async_flights = AsyncSingleFlight(name)
+    return wrapper
+
+
+async def async_single_flight(db, service_class, wrapper: Callable, args: tuple,
+                              kwargs: Dict[str, Any]) -> Any:
+    """
+    Run a @single_flight service method against an AsyncSession, coalescing
+    concurrent identical calls
+    """
+    method = wrapper.single_flight
+
+    def call(session):
+        return method(service_class(session), *args, **kwargs)
+
+    if not coalescable(db):
+        return await db.run_sync(call)
+    (result, loaded), shared = await wrapper.async_flights.do(
+        flight_key(db, method.__qualname__, args, kwargs),
+        lambda: db.run_sync(lambda session: with_snapshot(call(session)))
+    )
+    return await db.run_sync(adopt, loaded) if shared else result
@@ -0,0 +1,140 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+# Level of the root logger once logging is configured
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records waiting for the log thread; beyond this they are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of requests that get an access log line, by default and per route
+# template, e.g. "/health=0,/api/v1/load/{session_id}=0.1". Server errors are
+# always logged.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_ROUTE_SAMPLE_RATES = os.getenv("LOG_ROUTE_SAMPLE_RATES", "")
+
+# Attributes every LogRecord has; anything else came in through extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def parse_route_sample_rates(value: str) -> Dict[str, float]:
+    """
+    Parse "route=rate,route=rate" into a dict
+    """
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+ROUTE_SAMPLE_RATES = parse_route_sample_rates(LOG_ROUTE_SAMPLE_RATES)
+
+
+def sample_rate(route: Optional[str]) -> float:
+    """
+    Access log sample rate for a route template
+    """
+    return ROUTE_SAMPLE_RATES.get(route, LOG_SAMPLE_RATE)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, including any fields
+    passed with extra=
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the log thread without ever blocking the caller.
+
+    Records are queued unformatted, so message interpolation and JSON
+    encoding happen on the log thread. When the queue is full the record is
+    dropped and counted instead.
+    """
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, stream=None,
+                      queue_size: int = LOG_QUEUE_SIZE) -> DroppingQueueHandler:
+    """
+    Route the root logger through a bounded queue to a background thread
+    that writes JSON lines to stream (stderr by default).
+
+    Safe to call more than once: later calls return the installed handler.
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(JSONFormatter())
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _listener = QueueListener(_handler.queue, sink, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging() -> None:
+    """
+    Flush queued records and stop the log thread
+    """
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+    _handler = None
+    _listener = None
+
+
+def dropped_records() -> int:
+    """
+    Number of records dropped because the log queue was full
+    """
+    return _handler.dropped if _handler is not None else 0
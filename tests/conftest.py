@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# Point the apps' default engines at a scratch directory, so importing them
+# in tests never writes a database into the working tree
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/omega.db")
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.models import Base
+from src.models.job import Base as JobBase
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Session factory over a fresh SQLite file with the party and job tables.
+    The factory records the statements run (`statements`) and transactions
+    committed (`commits`) on its engine.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/test.db",
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    JobBase.metadata.create_all(bind=engine)
+    statements, commits = [], []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    factory.statements = statements
+    factory.commits = commits
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    session.statements = session_factory.statements
+    yield session
+    session.close()
@@ -1,4 +1,5 @@
 import pytest
+import tempfile
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -6,8 +7,8 @@ from app.main import app
 from app.database import Base, get_db
 from app.models import Party
 
-# Create an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# Create a scratch SQLite database for testing
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{tempfile.mkdtemp()}/test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.models import Base
+from app.database import get_async_db
+from app.main import save_game_async, load_game_async
+from src.engines import async_url, create_async_session_factory
+from src.services.async_service import AsyncService
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine, factory = create_async_session_factory(async_url(f"sqlite:///{tmp_path}/async.db"))
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield factory
+    asyncio.run(engine.dispose())
+
+
+def test_async_url():
+    """Sync URLs map onto their async drivers"""
+    assert async_url("sqlite:///./omega.db") == "sqlite+aiosqlite:///./omega.db"
+    assert async_url("postgresql://u:p@db/omega") == "postgresql+asyncpg://u:p@db/omega"
+
+
+def test_async_save_and_load(async_session_factory):
+    """The async handlers save and load through an AsyncSession"""
+    app = FastAPI()
+    app.add_api_route("/api/v1/save", save_game_async, methods=["POST"])
+    app.add_api_route("/api/v1/load/{session_id}", load_game_async, methods=["GET"])
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    client = TestClient(app)
+
+    state = {
+        "scene_index": 7,
+        "party_name": "Async Party",
+        "heroes": [{"name": "Hero1", "class": "mage", "hp": 60}],
+        "symbol_choice": "order",
+        "choices": {"scene6": "talk"}
+    }
+    response = client.post("/api/v1/save", json={"session_id": "async-1", "state": state})
+    assert response.status_code == 200
+    assert response.json() == {"status": "saved", "scene_index": 7}
+
+    response = client.get("/api/v1/load/async-1")
+    assert response.status_code == 200
+    assert response.json()["state"] == state
+
+    assert client.get("/api/v1/load/async-missing").status_code == 404
+
+
+def test_async_service_runs_sync_methods(async_session_factory):
+    """AsyncService awaits the wrapped service's methods on the sync session"""
+    class CountService:
+        def __init__(self, db):
+            self.db = db
+
+        def count_parties(self):
+            return self.db.execute(text("SELECT COUNT(*) FROM parties")).scalar()
+
+    class AsyncCountService(AsyncService):
+        service_class = CountService
+
+    async def run():
+        async with async_session_factory() as db:
+            return await AsyncCountService(db).count_parties()
+
+    assert asyncio.run(run()) == 0
+    with pytest.raises(AttributeError):
+        AsyncCountService(None).missing_method
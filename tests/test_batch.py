@@ -0,0 +1,62 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+
+def make_state(scene_index, party_name="Batch Party"):
+    return {
+        "scene_index": scene_index,
+        "party_name": party_name,
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "symbol_choice": None,
+        "choices": {}
+    }
+
+
+def test_batch_save_reports_each_session():
+    """Valid saves are written together and invalid ones fail on their own"""
+    response = client.post("/api/v1/save/batch", json={"saves": [
+        {"session_id": "batch-1", "state": make_state(1)},
+        {"session_id": "batch-2", "state": make_state(2)},
+        {"session_id": "batch-bad", "state": {"party_name": "No Scene"}},
+        {"session_id": "batch-1", "state": make_state(3)}
+    ]})
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["saved", "saved", "error", "saved"]
+    assert results[2]["session_id"] == "batch-bad"
+
+    state = client.get("/api/v1/load/batch-1").json()["state"]
+    assert state["scene_index"] == 3
+
+
+def test_batch_load_returns_found_and_missing():
+    """Batch load returns every stored session and lists the missing ones"""
+    client.post("/api/v1/save/batch", json={"saves": [
+        {"session_id": "batch-load-1", "state": make_state(4)},
+        {"session_id": "batch-load-2", "state": make_state(5)}
+    ]})
+    response = client.post("/api/v1/load/batch", json={
+        "session_ids": ["batch-load-2", "batch-load-missing", "batch-load-1"]
+    })
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [session["session_id"] for session in data["sessions"]] == ["batch-load-2", "batch-load-1"]
+    assert data["sessions"][0]["state"]["scene_index"] == 5
+    assert data["missing"] == ["batch-load-missing"]
+
+
+def test_batch_rejects_non_list():
+    """Batch bodies must carry a list"""
+    response = client.post("/api/v1/load/batch", json={"session_ids": "batch-1"})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("session_ids", [[{"a": 1}], [1, 2], [], [""], ["x"] * 501])
+def test_batch_load_rejects_invalid_session_ids(session_ids):
+    response = client.post("/api/v1/load/batch", json={"session_ids": session_ids})
+    assert response.status_code == 422
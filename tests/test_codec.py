@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.codec import CompactJSON, FRAME_MAGIC, FLAG_ZLIB, HEADER, encode, decode, convert_party_state
+from app.models import Base, Party
+
+
+def test_frame_round_trip_and_compression():
+    """Small values stay raw, large ones are compressed, both decode back"""
+    small = {"scene8": None}
+    large = [{"name": f"Hero{i}", "class": "scribe", "hp": 70} for i in range(200)]
+
+    small_frame = encode(small, compress_threshold=1024)
+    large_frame = encode(large, compress_threshold=1024)
+    assert small_frame.startswith(FRAME_MAGIC)
+    assert HEADER.unpack_from(small_frame)[2] == 0
+    assert HEADER.unpack_from(large_frame)[2] == FLAG_ZLIB
+    assert len(large_frame) < len(encode(large, compress_threshold=0))
+    assert decode(small_frame) == small
+    assert decode(large_frame) == large
+
+
+def test_decode_legacy_json():
+    """JSON stored before the codec was enabled still decodes"""
+    assert decode('[{"name": "Aether"}]') == [{"name": "Aether"}]
+    assert decode(b'{"scene1": "fight"}') == {"scene1": "fight"}
+    assert decode({"already": "decoded"}) == {"already": "decoded"}
+
+
+def test_unknown_format_version_is_rejected():
+    """Frames from a newer format version fail loudly"""
+    frame = bytearray(encode([1, 2, 3]))
+    frame[1] = 99
+    with pytest.raises(ValueError):
+        decode(bytes(frame))
+
+
+def test_convert_existing_rows(tmp_path):
+    """Rows written as JSON convert to frames and back without loss"""
+    engine = create_engine(f"sqlite:///{tmp_path}/codec.db")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    heroes = [{"name": "Aether", "class": "scribe", "hp": 70}]
+    db.add(Party(session_id="codec-1", name="Codec Party", heroes=heroes, choices={"scene8": None}))
+    db.commit()
+    db.close()
+
+    assert convert_party_state(engine, to_compact=True, batch_size=1) == 1
+    compact = Table(
+        "parties", MetaData(),
+        Column("session_id", Integer), Column("heroes", CompactJSON()), Column("choices", CompactJSON())
+    )
+    with engine.connect() as conn:
+        raw = conn.exec_driver_sql("SELECT heroes FROM parties").scalar()
+        assert raw.startswith(FRAME_MAGIC)
+        row = conn.execute(select(compact.c.heroes, compact.c.choices)).one()
+        assert row.heroes == heroes
+        assert row.choices == {"scene8": None}
+
+    assert convert_party_state(engine, to_compact=False) == 1
+    db = sessionmaker(bind=engine)()
+    assert db.query(Party).one().heroes == heroes
+    db.close()
+    engine.dispose()
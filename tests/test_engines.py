@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from src.engines import async_url, create_async_session_factory, create_tuned_engine, engine_options
+
+
+def pragma(conn, name):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_default_profile_keeps_sqlalchemy_defaults(tmp_path):
+    """The default profile passes no pool or pragma settings"""
+    assert engine_options(f"sqlite:///{tmp_path}/default.db", "default") == ({}, {})
+
+
+def test_web_profile_tunes_sqlite_connections(tmp_path):
+    """SQLite connections get WAL and the profile's pragmas on connect"""
+    engine = create_tuned_engine(f"sqlite:///{tmp_path}/web.db", "web")
+    try:
+        with engine.connect() as conn:
+            assert pragma(conn, "journal_mode") == "wal"
+            assert pragma(conn, "synchronous") == 1
+            assert pragma(conn, "busy_timeout") == 5000
+            assert pragma(conn, "cache_size") == -65536
+        assert engine.pool.size() == 10
+    finally:
+        engine.dispose()
+
+
+def test_postgres_profile_options():
+    """Server databases get pool sizing, pre-ping, recycling and a connect timeout"""
+    options, pragmas = engine_options("postgresql://user:secret@db/omega", "web")
+    assert options["pool_size"] == 10
+    assert options["max_overflow"] == 20
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == 1800
+    assert options["query_cache_size"] == 1000
+    assert options["connect_args"] == {"connect_timeout": 10}
+    assert pragmas == {}
+
+    # Non-default drivers may not accept the connect arguments
+    options, _ = engine_options("postgresql+asyncpg://user:secret@db/omega", "web")
+    assert "connect_args" not in options
+
+
+def test_in_memory_sqlite_skips_pool_sizing():
+    """In-memory SQLite keeps its single-connection pool"""
+    options, pragmas = engine_options("sqlite://", "bulk")
+    assert "pool_size" not in options
+    assert pragmas == {}
+    create_tuned_engine("sqlite://", "bulk").dispose()
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        engine_options("sqlite://", "turbo")
+
+
+def test_async_engine_uses_profile_pragmas(tmp_path):
+    """The async engine is tuned by the same profile"""
+    engine, _ = create_async_session_factory(async_url(f"sqlite:///{tmp_path}/async.db"), "web")
+
+    async def read_journal_mode():
+        async with engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        await engine.dispose()
+        return mode
+
+    assert asyncio.run(read_journal_mode()) == "wal"
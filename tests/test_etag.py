@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.database import engine
+from app.main import app
+
+client = TestClient(app)
+
+
+def save(scene_index):
+    state = {
+        "scene_index": scene_index,
+        "party_name": "ETag Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "choices": {}
+    }
+    client.post("/api/v1/save", json={"session_id": "etag-test", "state": state})
+
+
+def test_unchanged_state_returns_304_from_version_lookup():
+    """A matching If-None-Match is answered without loading the JSON columns"""
+    save(1)
+    tag = client.get("/api/v1/load/etag-test").headers["ETag"]
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/api/v1/load/etag-test", headers={"If-None-Match": tag})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag
+    assert response.content == b""
+    assert len(statements) == 1
+    assert "heroes" not in statements[0]
+
+
+def test_changed_state_returns_full_body():
+    """After another save the old ETag no longer matches"""
+    save(1)
+    tag = client.get("/api/v1/load/etag-test").headers["ETag"]
+    save(2)
+
+    response = client.get("/api/v1/load/etag-test", headers={"If-None-Match": f'"0", {tag}'})
+    assert response.status_code == 200
+    assert response.json()["state"]["scene_index"] == 2
+    assert response.headers["ETag"] != tag
+
+
+def test_missing_session_with_if_none_match():
+    """Revalidating a session that does not exist is still a 404"""
+    response = client.get("/api/v1/load/etag-missing", headers={"If-None-Match": '"1"'})
+    assert response.status_code == 404
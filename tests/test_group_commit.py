@@ -0,0 +1,52 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.models import Party
+from app.group_commit import GroupCommitWriter
+
+
+def make_state(scene_index, party_name="Group Party"):
+    return {
+        "scene_index": scene_index,
+        "party_name": party_name,
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "symbol_choice": None,
+        "choices": {}
+    }
+
+
+def test_concurrent_saves_share_one_commit(session_factory):
+    """Saves arriving inside one window are written in a single transaction"""
+    writer = GroupCommitWriter(session_factory, window_ms=200, max_batch=100)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(
+            lambda i: writer.save(f"group-{i}", make_state(i)), range(10)
+        ))
+    writer.stop()
+
+    assert sorted(results) == list(range(10))
+    assert len(session_factory.commits) == 1
+    db = session_factory()
+    assert db.query(Party).filter(Party.session_id.like("group-%")).count() == 10
+    db.close()
+
+
+def test_repeated_session_collapses_to_last_save(session_factory):
+    """Several saves for one session in a batch keep only the newest state"""
+    writer = GroupCommitWriter(session_factory, window_ms=200, max_batch=100)
+    futures = [writer.submit("group-repeat", make_state(i)) for i in range(1, 4)]
+    assert [future.result(timeout=5) for future in futures] == [1, 2, 3]
+    writer.stop()
+
+    db = session_factory()
+    party = db.query(Party).filter(Party.session_id == "group-repeat").one()
+    assert party.scene_index == 3
+    db.close()
+
+
+def test_malformed_save_fails_alone(session_factory):
+    """A payload missing required fields is rejected before it joins a batch"""
+    writer = GroupCommitWriter(session_factory, window_ms=50)
+    with pytest.raises(KeyError):
+        writer.submit("group-bad", {"party_name": "No Scene"})
+    assert writer.save("group-good", make_state(2), timeout=5) == 2
+    writer.stop()
@@ -0,0 +1,132 @@
+import json
+from fastapi.testclient import TestClient
+from app import main
+from app.history import record_saves, record_patch, load_as_of, compact_history, SNAPSHOT
+from app.models import PartySave
+from app.patch import MERGE_PATCH
+from app.store import values_state
+
+client = TestClient(main.app)
+
+
+def make_values(scene_index, version, hp=100):
+    return {
+        "name": "History Party",
+        "heroes": [{"name": "Hero1", "hp": hp}],
+        "symbol_choice": None,
+        "scene_index": scene_index,
+        "choices": {},
+        "version": version
+    }
+
+
+def add_history(db, session_id, snapshot_interval=3):
+    """Version 1 is a full save, versions 2-6 are patches lowering hero HP"""
+    previous = make_values(1, 1)
+    record_saves(db, {session_id: previous})
+    for version in range(2, 7):
+        saved = make_values(version, version, hp=100 - version)
+        record_patch(db, session_id, previous, saved, snapshot_interval)
+        previous = saved
+    db.commit()
+
+
+def test_full_saves_are_stored_as_deltas(db):
+    """Full saves record a JSON Patch against the previous version between snapshots"""
+    saves = []
+    for version in range(1, 8):
+        values = make_values(version, version, hp=100 - version)
+        values["symbol_choice"] = "sun" if version % 2 else None
+        values["choices"] = {f"scene-{n}": None if n % 2 else "left" for n in range(version)}
+        saves.append(values)
+        record_saves(db, {"history-full": values}, snapshot_interval=3)
+        db.commit()
+
+    entries = db.query(PartySave).order_by(PartySave.version).all()
+    assert [entry.kind for entry in entries] == [
+        SNAPSHOT, "json-patch", SNAPSHOT, "json-patch", "json-patch", SNAPSHOT, "json-patch"
+    ]
+    assert {"op": "replace", "path": "/heroes/0/hp", "value": 98} in entries[1].payload
+    for values in saves:
+        assert load_as_of(db, "history-full", version=values["version"]) == (
+            values["version"], values_state(values)
+        )
+
+
+def test_full_save_after_a_gap_is_a_snapshot(db):
+    record_saves(db, {"history-gap": make_values(1, 1)}, snapshot_interval=5)
+    record_saves(db, {"history-gap": make_values(3, 3)}, snapshot_interval=5)
+    db.commit()
+    kinds = [entry.kind for entry in db.query(PartySave).order_by(PartySave.version)]
+    assert kinds == [SNAPSHOT, SNAPSHOT]
+
+
+def test_load_as_of_version_and_scene(db):
+    """States are rebuilt from the nearest snapshot plus the following deltas"""
+    add_history(db, "history-1")
+    kinds = [entry.kind for entry in db.query(PartySave).order_by(PartySave.version)]
+    assert kinds == [SNAPSHOT, "json-patch", SNAPSHOT, "json-patch", "json-patch", SNAPSHOT]
+
+    version, state = load_as_of(db, "history-1", version=5)
+    assert version == 5
+    assert state["heroes"][0]["hp"] == 95
+
+    version, state = load_as_of(db, "history-1", scene_index=2)
+    assert version == 2
+    assert state["scene_index"] == 2
+
+    assert load_as_of(db, "history-1")[0] == 6
+    assert load_as_of(db, "history-1", version=9) is None
+    assert load_as_of(db, "history-missing") is None
+
+
+def test_compaction_keeps_newest_entries_replayable(db):
+    """Compaction bounds entries per session and snapshots the oldest kept one"""
+    add_history(db, "history-2")
+    assert compact_history(db, max_entries=2) == 4
+
+    entries = db.query(PartySave).filter(PartySave.session_id == "history-2").order_by(PartySave.version).all()
+    assert [(entry.version, entry.kind) for entry in entries] == [(5, SNAPSHOT), (6, SNAPSHOT)]
+    assert load_as_of(db, "history-2", version=5)[1]["heroes"][0]["hp"] == 95
+    assert load_as_of(db, "history-2", version=4) is None
+
+
+def test_history_endpoint(monkeypatch):
+    """Saves are recorded and older versions can be loaded back"""
+    monkeypatch.setattr(main, "SAVE_HISTORY_ENABLED", True)
+    state = {"scene_index": 1, "party_name": "Rewind", "heroes": [], "choices": {}}
+    client.post("/api/v1/save", json={"session_id": "history-api", "state": state})
+    first = client.get("/api/v1/load/history-api").headers["ETag"].strip('"')
+    client.post("/api/v1/save", json={"session_id": "history-api", "state": {**state, "scene_index": 2}})
+
+    response = client.get(f"/api/v1/load/history-api/history?version={first}")
+    assert response.status_code == 200
+    assert response.json()["state"]["scene_index"] == 1
+
+    response = client.get("/api/v1/load/history-api/history?scene=2")
+    assert response.json()["state"]["scene_index"] == 2
+
+
+def test_patch_history_matches_the_saved_state(monkeypatch):
+    """Patched saves are recorded as saved, not as the client's patch document"""
+    monkeypatch.setattr(main, "SAVE_HISTORY_ENABLED", True)
+    state = {"scene_index": 1, "party_name": "Rewind", "symbol_choice": "sun",
+             "heroes": [{"name": "Hero1", "class": "fighter"}], "choices": {}}
+    client.post("/api/v1/save", json={"session_id": "history-patch", "state": state})
+    etag = client.get("/api/v1/load/history-patch").headers["ETag"]
+    response = client.patch(
+        "/api/v1/save/history-patch",
+        content=json.dumps({"symbol_choice": None, "scene_index": 2}),
+        headers={"Content-Type": MERGE_PATCH, "If-Match": etag}
+    )
+    assert response.status_code == 200
+
+    live = client.get("/api/v1/load/history-patch").json()["state"]
+    assert live["symbol_choice"] is None
+    with main.SessionLocal() as db:
+        version, rebuilt = load_as_of(db, "history-patch")
+        entry = db.query(PartySave).filter(
+            PartySave.session_id == "history-patch", PartySave.version == version
+        ).one()
+    assert entry.kind == "json-patch"
+    assert rebuilt == live
@@ -0,0 +1,150 @@
+import asyncio
+import httpx
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from app import main
+from src.idempotency import (
+    DatabaseIdempotencyStore, IdempotencyMiddleware, MemoryIdempotencyStore, StoredResponse
+)
+
+
+def make_app(database=None, status_code=200, delay=0.0, max_request_bytes=1024):
+    app = FastAPI()
+    app.calls = []
+
+    @app.post("/items")
+    async def create_item(payload: dict):
+        app.calls.append(payload)
+        await asyncio.sleep(delay)
+        if status_code >= 500:
+            raise RuntimeError("write failed")
+        return {"id": len(app.calls), **payload}
+
+    app.add_middleware(IdempotencyMiddleware, memory=MemoryIdempotencyStore(capacity=8),
+                       database=database, wait_timeout=5, max_request_bytes=max_request_bytes)
+    return app
+
+
+def test_repeated_key_replays_the_first_response():
+    app = make_app()
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "key-1"}
+
+    first = client.post("/items", json={"name": "a"}, headers=headers)
+    second = client.post("/items", json={"name": "a"}, headers=headers)
+
+    assert first.json() == second.json() == {"id": 1, "name": "a"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert len(app.calls) == 1
+    # Requests without a key are never deduplicated
+    client.post("/items", json={"name": "a"})
+    assert len(app.calls) == 2
+
+
+def test_key_reused_for_different_request_is_rejected():
+    client = TestClient(make_app())
+    headers = {"Idempotency-Key": "key-1"}
+    client.post("/items", json={"name": "a"}, headers=headers)
+    response = client.post("/items", json={"name": "b"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_concurrent_duplicates_wait_for_the_first():
+    """Duplicates arriving while the first request runs share its response"""
+    app = make_app(delay=0.2)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "key-1"})
+                for _ in range(5)
+            ])
+
+    responses = asyncio.run(run())
+    assert len(app.calls) == 1
+    assert {response.json()["id"] for response in responses} == {1}
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 4
+
+
+def test_server_errors_are_not_stored():
+    """A failed request can be retried with the same key"""
+    app = make_app(status_code=500)
+    client = TestClient(app, raise_server_exceptions=False)
+    headers = {"Idempotency-Key": "key-1"}
+    assert client.post("/items", json={"name": "a"}, headers=headers).status_code == 500
+    assert client.post("/items", json={"name": "a"}, headers=headers).status_code == 500
+    assert len(app.calls) == 2
+
+
+def test_database_store_is_shared_between_processes(tmp_path):
+    """A key stored by one worker is replayed by another"""
+    engine = create_engine(f"sqlite:///{tmp_path}/idempotency.db")
+    first_worker = make_app(database=DatabaseIdempotencyStore(engine))
+    second_worker = make_app(database=DatabaseIdempotencyStore(engine))
+    headers = {"Idempotency-Key": "key-1"}
+
+    first = TestClient(first_worker).post("/items", json={"name": "a"}, headers=headers)
+    second = TestClient(second_worker).post("/items", json={"name": "a"}, headers=headers)
+
+    assert first.json() == second.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(first_worker.calls) == 1 and not second_worker.calls
+    engine.dispose()
+
+
+def test_large_requests_pass_through():
+    """Bodies over the limit run every time instead of being buffered"""
+    app = make_app(max_request_bytes=64)
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "key-1"}
+    payload = {"name": "a" * 100}
+    for _ in range(2):
+        response = client.post("/items", json=payload, headers=headers)
+        assert response.status_code == 200
+        assert "Idempotent-Replayed" not in response.headers
+    assert len(app.calls) == 2
+
+
+def test_expired_claim_is_taken_over(tmp_path):
+    """A key left pending by a dead worker is free again once its lease ends"""
+    engine = create_engine(f"sqlite:///{tmp_path}/idempotency.db")
+    store = DatabaseIdempotencyStore(engine, lease=0.1)
+    assert store.claim("key-1", "fingerprint", "dead-worker") is None
+    assert store.claim("key-1", "fingerprint", "retry").pending
+    time.sleep(0.2)
+    assert store.claim("key-1", "fingerprint", "retry") is None
+
+    # The first owner finishing late cannot overwrite or release the new claim
+    late = StoredResponse("fingerprint", 200, [], b"late", 0)
+    store.complete("key-1", late, "dead-worker")
+    store.release("key-1", "dead-worker")
+    assert store.get("key-1").pending
+    store.complete("key-1", StoredResponse("fingerprint", 200, [], b"retry", 0), "retry")
+    stored = store.get("key-1")
+    assert stored.body == b"retry"
+    assert stored.expires_at > time.time() + 3600
+    engine.dispose()
+
+
+def test_save_retry_is_deduplicated(monkeypatch):
+    """A retried save returns the stored response without writing again"""
+    client = TestClient(main.app)
+    saves = []
+    original = main.write_save
+    monkeypatch.setattr(main, "write_save", lambda *args: saves.append(1) or original(*args))
+    state = {
+        "scene_index": 2,
+        "party_name": "Retry Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "choices": {}
+    }
+    headers = {"Idempotency-Key": "save-retry-1"}
+    for _ in range(3):
+        response = client.post("/api/v1/save", json={"session_id": "retry-1", "state": state},
+                               headers=headers)
+        assert response.json() == {"status": "saved", "scene_index": 2}
+    assert len(saves) == 1
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from src.artifacts import GENERATORS, create_feature_dir
+from src.jobs import JobQueue, FAILED, QUEUED, RUNNING, SUCCEEDED
+from src.models.job import Job
+
+
+def run_job(queue, kind, params):
+    job = queue.submit(kind, params)
+    assert job.status == QUEUED
+    return asyncio.run(queue.wait(job.id, timeout=10))
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_workflow_jobs_write_artifacts(session_factory, tmp_path, executor):
+    """Spec, plan and tasks jobs generate their files under the feature directory"""
+    specs_dir = str(tmp_path / "specs")
+    queue = JobQueue(session_factory, GENERATORS, executor=executor, workers=2)
+    try:
+        spec = run_job(queue, "specify", {"specs_dir": specs_dir, "feature_description": "Party Chat"})
+        assert spec.status == SUCCEEDED
+        assert spec.result["branch_name"] == "001-party-chat"
+        assert os.path.exists(spec.result["spec_file_path"])
+
+        plan = run_job(queue, "plan", {"specs_dir": specs_dir})
+        assert plan.status == SUCCEEDED
+        for name in ["plan.md"] + plan.result["artifacts"]:
+            assert os.path.exists(os.path.join(specs_dir, "001-party-chat", name))
+
+        tasks = run_job(queue, "tasks", {"specs_dir": specs_dir, "feature": "001-party-chat"})
+        assert tasks.status == SUCCEEDED
+        with open(tasks.result["tasks_file_path"], encoding="utf-8") as f:
+            assert f.read().count("- [ ] T") == tasks.result["task_count"]
+    finally:
+        queue.shutdown()
+
+
+def test_failed_job_records_error(session_factory, tmp_path):
+    queue = JobQueue(session_factory, GENERATORS, workers=1)
+    try:
+        job = run_job(queue, "tasks", {"specs_dir": str(tmp_path / "empty")})
+        assert job.status == FAILED
+        assert "No feature specification" in job.error
+        assert job.finished_date is not None
+    finally:
+        queue.shutdown()
+
+
+def test_unfinished_jobs_resume_after_restart(session_factory, tmp_path):
+    """Jobs left queued or running by a stopped process run on resume"""
+    db = session_factory()
+    params = {"specs_dir": str(tmp_path / "specs"), "feature_description": "Resumed"}
+    stale = [Job(kind="specify", status=RUNNING, params=params),
+             Job(kind="specify", status=QUEUED, params=params)]
+    db.add_all(stale)
+    db.commit()
+    job_ids = [job.id for job in stale]
+    db.close()
+
+    queue = JobQueue(session_factory, GENERATORS, workers=2)
+    try:
+        assert queue.resume() == 2
+        jobs = [asyncio.run(queue.wait(job_id, timeout=10)) for job_id in job_ids]
+        assert [job.status for job in jobs] == [SUCCEEDED, SUCCEEDED]
+        assert {job.result["branch_name"] for job in jobs} == {"001-resumed", "002-resumed"}
+    finally:
+        queue.shutdown()
+
+
+def test_jobs_held_by_a_live_queue_are_not_resumed(session_factory, tmp_path):
+    """Only running jobs whose owner stopped renewing the lease run again"""
+    db = session_factory()
+    params = {"specs_dir": str(tmp_path / "specs"), "feature_description": "Leased"}
+    live = Job(kind="specify", status=RUNNING, params=params, owner="other",
+               lease_expires=datetime.utcnow() + timedelta(minutes=5))
+    expired = Job(kind="specify", status=RUNNING, params=params, owner="gone",
+                  lease_expires=datetime.utcnow() - timedelta(seconds=1))
+    db.add_all([live, expired])
+    db.commit()
+    live_id, expired_id = live.id, expired.id
+    db.close()
+
+    queue = JobQueue(session_factory, GENERATORS, workers=2)
+    try:
+        assert queue.resume() == 1
+        assert asyncio.run(queue.wait(expired_id, timeout=10)).status == SUCCEEDED
+        job = queue.get(live_id)
+        assert (job.status, job.owner) == (RUNNING, "other")
+    finally:
+        queue.shutdown()
+
+
+def test_heartbeat_renews_leases_and_recovers_jobs(session_factory, tmp_path):
+    runs = []
+    slow = lambda params: runs.append(1) or asyncio.run(asyncio.sleep(0.6))
+    queue = JobQueue(session_factory, {"slow": slow}, workers=1, lease=0.3)
+    try:
+        job = queue.submit("slow", {})
+        first = asyncio.run(queue.wait(job.id, timeout=0.25))
+        assert (first.status, first.owner) == (RUNNING, queue.owner)
+        # Still owned, with its lease renewed, after the first lease ran out
+        assert asyncio.run(queue.wait(job.id, timeout=10)).status == SUCCEEDED
+        assert len(runs) == 1
+
+        # A job abandoned mid-run by a dead queue is picked up without a restart
+        db = session_factory()
+        params = {"specs_dir": str(tmp_path / "specs"), "feature_description": "Orphan"}
+        orphan = Job(kind="specify", status=RUNNING, params=params, owner="gone",
+                     lease_expires=datetime.utcnow())
+        db.add(orphan)
+        db.commit()
+        orphan_id = orphan.id
+        db.close()
+        queue.handlers = GENERATORS
+        assert asyncio.run(queue.wait(orphan_id, timeout=10)).status == SUCCEEDED
+    finally:
+        queue.shutdown()
+
+
+def test_wait_returns_current_state_on_timeout(session_factory):
+    """A long-poll that times out reports the job as it stands"""
+    queue = JobQueue(session_factory, {"slow": lambda params: asyncio.run(asyncio.sleep(1))},
+                     workers=1)
+    try:
+        job = queue.submit("slow", {})
+        assert asyncio.run(queue.wait(job.id, timeout=0.2)).status in (QUEUED, RUNNING)
+    finally:
+        queue.shutdown()
+
+
+def test_feature_numbers_are_unique_under_concurrency(tmp_path):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        names = list(pool.map(lambda i: create_feature_dir(str(tmp_path), "same feature"), range(8)))
+    assert sorted(names) == [f"{number:03d}-same-feature" for number in range(1, 9)]
@@ -0,0 +1,80 @@
+import json
+import uuid
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import codec
+from app.models import Base, Party
+from app.store import get_party_raw, raw_state
+from src import json_encoding
+from src.json_encoding import FastJSONResponse, RawJSON, dumps
+
+STATE = {
+    "scene_index": 4,
+    "party_name": "Ünïcode Party",
+    "heroes": [{"name": "Hero1", "class": "fighter", "hp": 90}],
+    "symbol_choice": None,
+    "choices": {"scene2": "fight", "scene3": None}
+}
+
+
+@pytest.fixture(params=["json", "orjson"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson" and json_encoding.orjson is None:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(json_encoding, "_encode", json_encoding._encoder(request.param))
+    return request.param
+
+
+def test_encoders_agree_on_plain_values(encoder):
+    """Both encoders produce compact UTF-8 JSON with the same content"""
+    encoded = dumps({"session_id": "s-1", "state": STATE})
+    assert json.loads(encoded) == {"session_id": "s-1", "state": STATE}
+    assert b": " not in encoded and "Ünïcode".encode("utf-8") in encoded
+
+
+def test_non_json_values_use_fastapi_encoder(encoder):
+    """UUIDs and datetimes are encoded as jsonable_encoder would"""
+    value = uuid.uuid4()
+    moment = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    decoded = json.loads(dumps({"id": value, "at": moment}))
+    assert decoded["id"] == str(value)
+    assert datetime.fromisoformat(decoded["at"]) == moment
+
+
+def test_raw_json_is_spliced_in(encoder):
+    """RawJSON values at any dict depth are copied into the output as is"""
+    encoded = dumps({"session_id": "s-1", "state": {"heroes": RawJSON(b'[{"hp": 1}]'), "n": 2}})
+    assert encoded == b'{"session_id":"s-1","state":{"heroes":[{"hp": 1}],"n":2}}'
+
+
+def test_response_passes_bytes_through():
+    """Pre-serialized bodies are sent without encoding"""
+    assert FastJSONResponse(b'{"a": 1}').body == b'{"a": 1}'
+    assert FastJSONResponse({"a": 1}).body == b'{"a":1}'
+
+
+def test_raw_party_state_reads_frames():
+    """Compact frames and plain JSON text both yield the stored JSON bytes"""
+    heroes = [{"name": "Hero" + str(i), "hp": i} for i in range(100)]
+    assert json.loads(codec.raw_party_state(codec.encode(heroes, compress_threshold=64))) == heroes
+    assert codec.raw_party_state('{"scene2": "fight"}') == b'{"scene2": "fight"}'
+    assert codec.raw_party_state(None) == b"null"
+
+
+def test_load_state_skips_decoding(tmp_path):
+    """A stored party is rebuilt from its raw columns into the same state"""
+    engine = create_engine(f"sqlite:///{tmp_path}/raw.db")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Party(session_id="raw-1", name=STATE["party_name"], heroes=STATE["heroes"],
+                 symbol_choice=None, scene_index=4, choices=STATE["choices"]))
+    db.commit()
+
+    row = get_party_raw(db, "raw-1")
+    state = raw_state(row)
+    assert isinstance(state["heroes"], RawJSON)
+    assert json.loads(dumps(state)) == STATE
+    db.close()
+    engine.dispose()
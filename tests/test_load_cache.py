@@ -0,0 +1,72 @@
+from fastapi.testclient import TestClient
+from app import main
+from app.cache import SessionStateCache
+
+client = TestClient(main.app)
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted once capacity is reached"""
+    cache = SessionStateCache(capacity=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    """Entries older than the ttl count as misses"""
+    now = [100.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = SessionStateCache(capacity=4, ttl=10)
+    cache.put("a", b"1")
+    assert cache.get("a") == b"1"
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_add_does_not_replace_saved_entry():
+    """A read miss filling the cache never overwrites a newer save"""
+    cache = SessionStateCache(capacity=4)
+    cache.put("a", b"saved")
+    cache.add("a", b"stale")
+    assert cache.get("a") == b"saved"
+
+
+def test_out_of_order_saves_keep_newest_version():
+    """A save committed earlier but cached later does not replace a newer one"""
+    cache = SessionStateCache(capacity=4)
+    cache.put("a", b"v3", version=3)
+    cache.put("a", b"v2", version=2)
+    assert cache.get("a") == b"v3"
+    cache.put("a", b"v4", version=4)
+    assert cache.get("a") == b"v4"
+
+
+def test_load_served_from_cache_after_save(monkeypatch):
+    """A save refreshes the cache so the following load skips the database"""
+    monkeypatch.setattr(main, "load_cache", SessionStateCache(capacity=8))
+    state = {
+        "scene_index": 3,
+        "party_name": "Cached Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 90}],
+        "symbol_choice": "order",
+        "choices": {"scene2": "fight"}
+    }
+    response = client.post("/api/v1/save", json={"session_id": "cache-test", "state": state})
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/load/cache-test")
+    assert response.status_code == 200
+    assert response.json() == {"session_id": "cache-test", "state": state}
+
+    stats = client.get("/api/v1/cache/stats").json()
+    assert stats["enabled"] is True
+    assert stats["hits"] == 1
+    assert stats["misses"] == 0
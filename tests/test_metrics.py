@@ -0,0 +1,46 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from src.metrics import Histogram
+
+client = TestClient(app)
+
+
+def test_histogram_buckets_are_cumulative():
+    """Observations land in fixed buckets that render cumulatively with sum and count"""
+    histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, route="/x")
+    assert list(histogram.collect())[2:] == [
+        'test_seconds_bucket{route="/x",le="0.1"} 2',
+        'test_seconds_bucket{route="/x",le="1.0"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 3.65',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_metrics_endpoint_reports_routes_statuses_and_pool():
+    """Requests are labelled by route template and scraped in Prometheus format"""
+    state = {
+        "scene_index": 1,
+        "party_name": "Metrics Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "choices": {}
+    }
+    client.post("/api/v1/save", json={"session_id": "metrics-1", "state": state})
+    client.get("/api/v1/load/metrics-1")
+    client.get("/api/v1/load/metrics-missing")
+    client.get("/no/such/route")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_count{route="/api/v1/load/{session_id}",method="GET"}' in text
+    assert 'http_requests_total{route="/api/v1/load/{session_id}",method="GET",status="404"}' in text
+    assert 'http_requests_total{route="/api/v1/save",method="POST",status="200"}' in text
+    assert 'route="unmatched"' in text
+    assert "db_pool_checkout_wait_seconds_bucket" in text
+    assert 'state="checked_out"' in text
+    assert "http_requests_in_flight 1" in text
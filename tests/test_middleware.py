@@ -0,0 +1,83 @@
+import logging
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from src.api.middleware import LoggingMiddleware, ErrorHandlerMiddleware
+from src.api.security import SecurityHeadersMiddleware
+
+
+def make_app(**logging_options):
+    app = FastAPI()
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(LoggingMiddleware, **logging_options)
+    app.add_middleware(ErrorHandlerMiddleware)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        return {"length": len(body)}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    @app.get("/unavailable")
+    def unavailable():
+        return JSONResponse({}, status_code=503)
+
+    return app
+
+
+def access_records(caplog):
+    return [record for record in caplog.records if record.name == "src.api.middleware"]
+
+
+def test_body_capture_is_bounded(caplog):
+    """Only the first body_max_bytes of a streamed body are logged, and the app still sees all of it"""
+    client = TestClient(make_app(body_max_bytes=8, body_sample_rate=1.0))
+    with caplog.at_level(logging.INFO, logger="src.api.middleware"):
+        response = client.post("/echo", content=b"0123456789" * 100)
+    assert response.json() == {"length": 1000}
+    [record] = access_records(caplog)
+    assert record.body == "01234567"
+    assert record.body_truncated is True
+    assert record.route == "/echo"
+    assert record.status == 200
+    assert response.headers["X-Request-ID"] == record.request_id
+
+
+def test_body_logging_is_sampled(caplog):
+    """A zero sample rate never logs bodies, and the request still gets one access line"""
+    client = TestClient(make_app(body_max_bytes=1024, body_sample_rate=0.0))
+    with caplog.at_level(logging.INFO, logger="src.api.middleware"):
+        response = client.post("/echo", content=b"secret", headers={"X-Request-ID": "req-1"})
+    assert response.json() == {"length": 6}
+    [record] = access_records(caplog)
+    assert not hasattr(record, "body")
+    assert record.getMessage().startswith("POST /echo 200 ")
+    assert response.headers["X-Request-ID"] == "req-1"
+
+
+def test_server_errors_are_logged_above_info(caplog):
+    """Server error access lines are logged at ERROR, so they survive LOG_LEVEL=WARNING"""
+    client = TestClient(make_app(), raise_server_exceptions=False)
+    with caplog.at_level(logging.WARNING, logger="src.api.middleware"):
+        assert client.post("/echo", content=b"{}").status_code == 200
+        assert client.get("/unavailable").status_code == 503
+        assert client.get("/boom").status_code == 500
+    assert [(record.status, record.levelno) for record in access_records(caplog)
+            if hasattr(record, "status")] == [
+        (503, logging.ERROR), (500, logging.ERROR)
+    ]
+
+
+def test_security_headers_and_error_handling():
+    """Responses carry the security headers; unhandled errors become a JSON 500"""
+    client = TestClient(make_app(), raise_server_exceptions=False)
+    response = client.post("/echo", content=b"{}")
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert response.headers["X-Frame-Options"] == "DENY"
+
+    response = client.get("/boom")
+    assert response.status_code == 500
+    assert response.json() == {"error": "Internal server error"}
@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.patch import apply_merge_patch, apply_json_patch, diff_json_patch, PatchError, PatchTestFailed
+
+client = TestClient(app)
+
+
+def test_merge_patch_replaces_and_removes_keys():
+    """Merge patches update nested objects and drop keys set to null"""
+    target = {"choices": {"scene1": "fight", "scene2": "run"}, "scene_index": 2}
+    result = apply_merge_patch(target, {"choices": {"scene2": None, "scene3": "talk"}, "scene_index": 3})
+
+    assert result == {"choices": {"scene1": "fight", "scene3": "talk"}, "scene_index": 3}
+    assert target["choices"] == {"scene1": "fight", "scene2": "run"}
+
+
+def test_json_patch_copies_only_touched_path():
+    """JSON Patch leaves the original document and untouched branches alone"""
+    target = {"heroes": [{"name": "A", "hp": 10}, {"name": "B", "hp": 20}], "choices": {}}
+    result = apply_json_patch(target, [
+        {"op": "test", "path": "/heroes/1/name", "value": "B"},
+        {"op": "replace", "path": "/heroes/1/hp", "value": 5},
+        {"op": "add", "path": "/choices/scene~1end", "value": None}
+    ])
+
+    assert result["heroes"][1]["hp"] == 5
+    assert result["choices"] == {"scene/end": None}
+    assert target["heroes"][1]["hp"] == 20
+    assert result["heroes"][0] is target["heroes"][0]
+
+
+def test_diff_json_patch_round_trips():
+    """A generated patch turns the source into the target, nulls and odd keys included"""
+    source = {"heroes": [{"hp": 10}, {"hp": 5}], "choices": {"a/b": "x", "c~d": None}, "gone": 1}
+    target = {"heroes": [{"hp": 9}, {"hp": 5}], "choices": {"a/b": None, "new": "y"}, "flag": True}
+    operations = diff_json_patch(source, target)
+    assert apply_json_patch(source, operations) == target
+    assert {"op": "replace", "path": "/heroes/0/hp", "value": 9} in operations
+    assert diff_json_patch(target, target) == []
+
+
+def test_json_patch_errors():
+    """Bad paths and failed tests raise patch errors"""
+    with pytest.raises(PatchError):
+        apply_json_patch({"heroes": []}, [{"op": "replace", "path": "/heroes/0", "value": 1}])
+    with pytest.raises(PatchTestFailed):
+        apply_json_patch({"hp": 1}, [{"op": "test", "path": "/hp", "value": 2}])
+
+
+def save_party(session_id):
+    state = {
+        "scene_index": 4,
+        "party_name": "Patch Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "symbol_choice": "fire",
+        "choices": {"scene3": "fight"}
+    }
+    client.post("/api/v1/save", json={"session_id": session_id, "state": state})
+    return client.get(f"/api/v1/load/{session_id}").headers["ETag"]
+
+
+def test_patch_save_applies_delta():
+    """A JSON Patch against the current version updates only what changed"""
+    base = save_party("patch-delta")
+    response = client.patch(
+        "/api/v1/save/patch-delta",
+        content='[{"op": "replace", "path": "/heroes/0/hp", "value": 42},'
+                ' {"op": "replace", "path": "/scene_index", "value": 5}]',
+        headers={"Content-Type": "application/json-patch+json", "If-Match": base}
+    )
+    assert response.status_code == 200
+    assert response.json()["scene_index"] == 5
+    assert response.headers["ETag"] != base
+
+    state = client.get("/api/v1/load/patch-delta").json()["state"]
+    assert state["heroes"][0]["hp"] == 42
+    assert state["choices"] == {"scene3": "fight"}
+
+
+def test_merge_patch_requires_current_version():
+    """Patches against a stale or missing base version are rejected"""
+    base = save_party("patch-stale")
+    headers = {"Content-Type": "application/merge-patch+json"}
+    body = '{"choices": {"scene4": "run"}}'
+
+    response = client.patch("/api/v1/save/patch-stale", content=body, headers=headers)
+    assert response.status_code == 428
+
+    response = client.patch("/api/v1/save/patch-stale", content=body, headers={**headers, "If-Match": base})
+    assert response.status_code == 200
+
+    response = client.patch("/api/v1/save/patch-stale", content=body, headers={**headers, "If-Match": base})
+    assert response.status_code == 412
+
+
+@pytest.mark.parametrize("if_match", ['"1", {current}', "W/{current}", "*"])
+def test_if_match_accepts_lists_weak_tags_and_wildcard(if_match):
+    current = save_party("patch-if-match")
+    headers = {"Content-Type": "application/merge-patch+json",
+               "If-Match": if_match.format(current=current)}
+    response = client.patch("/api/v1/save/patch-if-match", content='{"choices": {"s": "x"}}',
+                            headers=headers)
+    assert response.status_code == 200
@@ -0,0 +1,53 @@
+import pstats
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.middleware import ProfilingMiddleware
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_client(tmp_path, **options):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, token="secret", profile_dir=str(tmp_path),
+                       interval_ms=1, **options)
+
+    @app.get("/slow/{item}")
+    def slow(item: str):
+        busy_wait(0.05)
+        return {"item": item}
+
+    return TestClient(app)
+
+
+def test_profile_token_writes_collapsed_stacks(tmp_path):
+    """Requests with the token are profiled into a file named after route and request"""
+    client = make_client(tmp_path)
+    response = client.get("/slow/1", headers={"X-Profile": "secret", "X-Request-ID": "req-42"})
+    assert response.status_code == 200
+    filename = response.headers["X-Profile-File"]
+    assert filename.endswith("-slow_item-req-42.collapsed")
+    collapsed = (tmp_path / filename).read_text()
+    assert "busy_wait" in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+    # A wrong token or no header leaves the request alone
+    assert "X-Profile-File" not in client.get("/slow/2", headers={"X-Profile": "wrong"}).headers
+    assert "X-Profile-File" not in client.get("/slow/3").headers
+
+
+def test_pstats_ring_is_bounded(tmp_path):
+    """pstats profiles load with pstats and only the newest max_files are kept"""
+    client = make_client(tmp_path, profile_format="pstats", max_files=2)
+    names = [
+        client.get(f"/slow/{i}", headers={"X-Profile": "secret"}).headers["X-Profile-File"]
+        for i in range(3)
+    ]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(names[1:])
+    stats = pstats.Stats(str(tmp_path / names[-1]))
+    assert any(name == "busy_wait" for _, _, name in stats.stats)
@@ -0,0 +1,79 @@
+import logging
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.store import get_party, get_parties, party_values, upsert_parties
+from src.query_stats import QueryStatsMiddleware, record_queries, statement_shape
+
+
+def make_values(scene_index):
+    return party_values({
+        "scene_index": scene_index,
+        "party_name": "Query Party",
+        "heroes": [],
+        "choices": {}
+    })
+
+
+def test_statement_shape_ignores_parameter_lists():
+    assert statement_shape("SELECT a FROM t WHERE id IN (?, ?)") == statement_shape(
+        "SELECT a\n  FROM t WHERE id IN (?,?,?)"
+    )
+
+
+def test_record_queries_counts_statements_and_rows(session_factory):
+    """Store lookups can be pinned to their statement count"""
+    db = session_factory()
+    with record_queries() as stats:
+        upsert_parties(db, {f"queries-{i}": make_values(i) for i in range(3)})
+        db.commit()
+    assert stats.statements == 1
+
+    with record_queries() as stats:
+        db.execute(text("UPDATE parties SET scene_index = 9"))
+        db.commit()
+    assert stats.rows == 3
+
+    with record_queries() as stats:
+        get_parties(db, [f"queries-{i}" for i in range(3)])
+    assert stats.statements == 1
+
+    with record_queries() as stats:
+        for i in range(3):
+            get_party(db, f"queries-{i}")
+    assert stats.repeated(threshold=3) == [(next(iter(stats.shapes)), 3)]
+    db.close()
+
+
+def test_middleware_reports_headers_and_flags_repeats(session_factory, caplog):
+    """Debug headers carry the request's counts; repeated shapes are logged"""
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, headers=True, repeat_threshold=3)
+
+    @app.get("/n-plus-one")
+    def n_plus_one():
+        db = session_factory()
+        try:
+            for i in range(4):
+                db.execute(text("SELECT :i"), {"i": i}).scalar()
+        finally:
+            db.close()
+        return {}
+
+    @app.get("/none")
+    def none():
+        return {}
+
+    client = TestClient(app)
+    with caplog.at_level(logging.WARNING, logger="src.query_stats"):
+        response = client.get("/n-plus-one")
+    assert response.headers["X-DB-Query-Count"] == "4"
+    assert response.headers["X-DB-Repeated-Statements"] == "1"
+    assert float(response.headers["X-DB-Time-Ms"]) >= 0
+    [record] = [record for record in caplog.records if record.name == "src.query_stats"]
+    assert record.route == "/n-plus-one"
+    assert record.repeat_count == 4
+
+    response = client.get("/none")
+    assert response.headers["X-DB-Query-Count"] == "0"
+    assert "X-DB-Repeated-Statements" not in response.headers
@@ -0,0 +1,107 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.schemas import SAVE_MAX_BODY_BYTES, SAVE_MAX_HEROES
+from src.api.validation import FeatureCreateRequest
+
+client = TestClient(main.app)
+
+
+def make_state(**overrides):
+    state = {
+        "scene_index": 2,
+        "party_name": "Schema Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "symbol_choice": None,
+        "choices": {"scene1": "fight"}
+    }
+    state.update(overrides)
+    return state
+
+
+@pytest.fixture
+def no_db(monkeypatch):
+    """Fail the test if a database session is opened"""
+    def refuse():
+        raise AssertionError("database session opened")
+    monkeypatch.setattr(main, "SessionLocal", refuse)
+
+
+def test_state_is_stored_as_sent():
+    """Validated saves keep extra hero fields and do not add missing ones"""
+    heroes = [{"name": "Hero1", "hp": 80, "level": 3}, {"name": "Hero2", "class": "mage"}]
+    state = make_state(heroes=heroes)
+    response = client.post("/api/v1/save", json={"session_id": "schema-1", "state": state})
+    assert response.status_code == 200
+    assert client.get("/api/v1/load/schema-1").json()["state"] == state
+
+
+@pytest.mark.parametrize("state", [
+    make_state(heroes=[{"name": "Hero"}] * (SAVE_MAX_HEROES + 1)),
+    make_state(party_name="x" * 10000),
+    make_state(scene_index=-1),
+    make_state(heroes=[{"class": "fighter"}]),
+    {"party_name": "No Scene", "heroes": []},
+])
+def test_invalid_state_is_rejected_before_db_work(no_db, state):
+    """Malformed or oversized states get 422 without a database session"""
+    response = client.post("/api/v1/save", json={"session_id": "schema-bad", "state": state})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+
+
+def test_oversized_body_is_rejected(no_db):
+    """Bodies over the limit get 413, whether or not Content-Length is sent"""
+    body = json.dumps({"session_id": "schema-big", "state": make_state(
+        choices={f"scene{i}": "x" * 200 for i in range(2000)}
+    )}).encode()
+    assert len(body) > SAVE_MAX_BODY_BYTES
+
+    response = client.post("/api/v1/save", content=body,
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 413
+
+    chunks = (body[i:i + 4096] for i in range(0, len(body), 4096))
+    response = client.post("/api/v1/save", content=chunks,
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 413
+
+
+def test_invalid_json_is_rejected(no_db):
+    response = client.post("/api/v1/save", content=b'{"session_id": ',
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_patch_producing_invalid_state_is_rejected():
+    """A patch whose result breaks the schema is not written"""
+    client.post("/api/v1/save", json={"session_id": "schema-patch", "state": make_state()})
+    etag = client.get("/api/v1/load/schema-patch").headers["ETag"]
+    response = client.patch(
+        "/api/v1/save/schema-patch",
+        content=json.dumps({"heroes": [{"hp": 5}]}),
+        headers={"content-type": "application/merge-patch+json", "If-Match": etag}
+    )
+    assert response.status_code == 422
+    assert client.get("/api/v1/load/schema-patch").headers["ETag"] == etag
+
+
+def test_batch_reports_invalid_entries():
+    """An entry failing the schema fails alone, with the offending field"""
+    response = client.post("/api/v1/save/batch", json={"saves": [
+        {"session_id": "schema-batch", "state": make_state()},
+        {"session_id": "schema-batch-bad", "state": make_state(scene_index="first")}
+    ]})
+    results = response.json()["results"]
+    assert results[0]["status"] == "saved"
+    assert results[1]["status"] == "error"
+    assert "state.scene_index" in results[1]["error"]
+
+
+def test_feature_description_is_stripped_and_bounded():
+    assert FeatureCreateRequest(feature_description="  a feature ").feature_description == "a feature"
+    with pytest.raises(ValueError):
+        FeatureCreateRequest(feature_description="   ")
+    with pytest.raises(ValueError):
+        FeatureCreateRequest(feature_description="x" * 501)
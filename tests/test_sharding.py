@@ -0,0 +1,122 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from app import main
+from app.models import Base, Party
+from app.sharding import ShardRouter, shard_index
+from app.store import get_party, get_parties, party_values, upsert_parties
+from app.transfer import iter_export
+
+client = TestClient(main.app)
+
+
+def make_state(scene_index, party_name="Shard Party"):
+    return {
+        "scene_index": scene_index,
+        "party_name": party_name,
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "symbol_choice": None,
+        "choices": {}
+    }
+
+
+@pytest.fixture
+def router(tmp_path):
+    router = ShardRouter([f"sqlite:///{tmp_path}/shard{i}.db" for i in range(3)])
+    for engine in router.engines.values():
+        Base.metadata.create_all(bind=engine)
+    yield router
+    router.dispose()
+
+
+@pytest.fixture
+def sharded_client(router, monkeypatch):
+    monkeypatch.setattr(main, "SessionLocal", router.session_factory)
+    monkeypatch.setattr(main, "shard_router", router)
+    return client
+
+
+def stored_session_ids(router, shard):
+    with router.engines[shard].connect() as conn:
+        return set(conn.execute(select(Party.__table__.c.session_id)).scalars())
+
+
+def test_shard_index_is_stable():
+    """Session IDs hash to the same shard in every process"""
+    assert shard_index("shard-472-demo", 3) == shard_index("shard-472-demo", 3)
+    assert {shard_index(f"session-{i}", 3) for i in range(50)} == {0, 1, 2}
+
+
+def test_save_and_load_route_to_one_shard(router, sharded_client):
+    """Each party is written to and read from the shard its session ID hashes to"""
+    session_ids = [f"shard-{i}-demo" for i in range(12)]
+    for i, session_id in enumerate(session_ids):
+        response = sharded_client.post("/api/v1/save", json={"session_id": session_id, "state": make_state(i)})
+        assert response.json() == {"status": "saved", "scene_index": i}
+    # Saving again updates the row in place on the same shard
+    sharded_client.post("/api/v1/save", json={"session_id": session_ids[0], "state": make_state(99)})
+
+    for shard in router.engines:
+        expected = {session_id for session_id in session_ids if router.shard_for(session_id) == shard}
+        assert stored_session_ids(router, shard) == expected
+
+    response = sharded_client.get(f"/api/v1/load/{session_ids[0]}")
+    assert response.json()["state"]["scene_index"] == 99
+    assert response.headers["ETag"] == '"2"'
+    assert sharded_client.get("/api/v1/load/shard-missing").status_code == 404
+
+    response = sharded_client.patch(
+        f"/api/v1/save/{session_ids[0]}",
+        content=json.dumps({"scene_index": 100}),
+        headers={"Content-Type": "application/merge-patch+json", "If-Match": '"2"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 3
+
+
+def test_batches_fan_out_across_shards(router, sharded_client):
+    """Batch saves and loads touch every shard holding one of their sessions"""
+    saves = [{"session_id": f"batch-{i}", "state": make_state(i)} for i in range(9)]
+    response = sharded_client.post("/api/v1/save/batch", json={"saves": saves})
+    assert [result["status"] for result in response.json()["results"]] == ["saved"] * 9
+    assert all(stored_session_ids(router, shard) for shard in router.engines)
+
+    requested = ["batch-8", "batch-missing", "batch-0", "batch-4"]
+    response = sharded_client.post("/api/v1/load/batch", json={"session_ids": requested})
+    body = response.json()
+    assert [entry["session_id"] for entry in body["sessions"]] == ["batch-8", "batch-0", "batch-4"]
+    assert body["missing"] == ["batch-missing"]
+
+
+def test_export_merges_shards_in_session_order(router, sharded_client):
+    """The sharded export reads every shard and keeps session_id order"""
+    session_ids = [f"export-{i:02d}" for i in range(20)]
+    sharded_client.post("/api/v1/save/batch", json={
+        "saves": [{"session_id": session_id, "state": make_state(1)} for session_id in reversed(session_ids)]
+    })
+
+    lines = list(iter_export(router.session_factory, chunk_size=3, shard_router=router))
+    assert [json.loads(line)["session_id"] for line in lines] == session_ids
+
+    response = sharded_client.get("/api/v1/export")
+    assert [json.loads(line)["session_id"] for line in response.text.splitlines()] == session_ids
+
+
+def test_lookups_query_only_the_owning_shard(router):
+    """Session ID lookups run on one shard, unrestricted queries on all of them"""
+    db = router.session_factory()
+    upsert_parties(db, {f"lookup-{i}": party_values(make_state(i)) for i in range(6)})
+    db.commit()
+
+    queried = []
+    for shard, engine in router.engines.items():
+        event.listen(engine, "before_cursor_execute", lambda *args, shard=shard: queried.append(shard))
+
+    assert get_party(db, "lookup-2").scene_index == 2
+    assert queried == [router.shard_for("lookup-2")]
+
+    queried.clear()
+    assert len(get_parties(db, [f"lookup-{i}" for i in range(6)])) == 6
+    assert len(db.query(Party).all()) == 6
+    db.close()
@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.models import Party
+from src import singleflight
+from src.singleflight import SingleFlight, AsyncSingleFlight, single_flight
+
+
+def blocking_call(result):
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    fn.calls, fn.entered, fn.release = calls, entered, release
+    return fn
+
+
+def run_concurrently(flights, key, fn, followers=4):
+    with ThreadPoolExecutor(max_workers=followers + 1) as pool:
+        leader = pool.submit(flights.do, key, fn)
+        assert fn.entered.wait(5)
+        waiting = [pool.submit(flights.do, key, fn) for _ in range(followers)]
+        # Give the followers time to join the running call
+        time.sleep(0.2)
+        fn.release.set()
+        return leader, waiting
+
+
+def test_concurrent_calls_share_one_execution():
+    """Callers arriving while a call runs wait for it instead of repeating it"""
+    fn = blocking_call({"version": 3})
+    flights = SingleFlight("test", enabled=True)
+
+    leader, waiting = run_concurrently(flights, "party-1", fn)
+
+    assert leader.result() == ({"version": 3}, False)
+    assert [future.result() for future in waiting] == [({"version": 3}, True)] * 4
+    assert len(fn.calls) == 1
+    # Nothing is kept: the next call runs again
+    assert flights.do("party-1", lambda: "fresh") == ("fresh", False)
+
+
+def test_error_is_shared():
+    """Every waiting caller sees the leader's exception"""
+    fn = blocking_call(RuntimeError("database down"))
+    flights = SingleFlight("test", enabled=True)
+
+    leader, waiting = run_concurrently(flights, "party-1", fn, followers=2)
+
+    for future in [leader] + waiting:
+        with pytest.raises(RuntimeError, match="database down"):
+            future.result()
+    assert len(fn.calls) == 1
+
+
+def test_call_after_commit_does_not_join_older_read():
+    """A caller arriving after a commit runs its own query"""
+    fn = blocking_call("before")
+    flights = SingleFlight("test", enabled=True)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "party-1", fn)
+        assert fn.entered.wait(5)
+        singleflight._after_commit(None)
+        assert flights.do("party-1", lambda: "after") == ("after", False)
+        fn.release.set()
+        assert leader.result() == ("before", False)
+
+
+def test_async_calls_share_one_execution():
+    """Coroutines awaiting the same key share one call"""
+    flights = AsyncSingleFlight("test", enabled=True)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "loaded"
+
+    async def run():
+        return await asyncio.gather(*[flights.do("party-1", fn) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert results[0] == ("loaded", False)
+    assert results[1:] == [("loaded", True)] * 4
+    assert len(calls) == 1
+
+
+def test_service_followers_get_copies_in_their_own_session(session_factory):
+    """A coalesced service read loads once and each caller gets its own instance"""
+    db = session_factory()
+    db.add(Party(session_id="sf-1", name="Shared", heroes=[{"name": "Hero1"}], choices={}))
+    db.commit()
+    db.close()
+
+    entered, release = threading.Event(), threading.Event()
+
+    class PartyService:
+        def __init__(self, db):
+            self.db = db
+
+        @single_flight
+        def get_party(self, session_id):
+            party = self.db.query(Party).filter(Party.session_id == session_id).first()
+            entered.set()
+            release.wait(5)
+            return party
+
+    def load(session):
+        return session, PartyService(session).get_party("sf-1")
+
+    session_factory.statements.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(load, session_factory())
+        assert entered.wait(5)
+        follower = pool.submit(load, session_factory())
+        time.sleep(0.2)
+        release.set()
+        leader_db, leader_party = leader.result()
+        follower_db, follower_party = follower.result()
+
+    assert len([s for s in session_factory.statements if s.startswith("SELECT")]) == 1
+    assert follower_party is not leader_party
+    assert follower_party in follower_db and leader_party in leader_db
+    assert follower_party.heroes == leader_party.heroes == [{"name": "Hero1"}]
+    follower_party.heroes.append({"name": "Hero2"})
+    assert leader_party.heroes == [{"name": "Hero1"}]
+    leader_db.close()
+    follower_db.close()
@@ -0,0 +1,41 @@
+from app import store
+from app.models import Party
+from app.store import party_values, upsert_parties
+
+
+def make_values(scene_index):
+    return party_values({
+        "scene_index": scene_index,
+        "party_name": "Store Party",
+        "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+        "choices": {"scene1": "fight"}
+    })
+
+
+def test_upsert_inserts_then_updates_in_one_statement(db):
+    """Each upsert is a single statement that returns scene index and version"""
+    assert upsert_parties(db, {"store-1": make_values(1)}) == {"store-1": (1, 1)}
+    db.commit()
+    db.statements.clear()
+
+    assert upsert_parties(db, {"store-1": make_values(2), "store-2": make_values(5)}) == {
+        "store-1": (2, 2),
+        "store-2": (5, 1)
+    }
+    db.commit()
+    assert len(db.statements) == 1
+    assert "ON CONFLICT" in db.statements[0]
+
+    party = db.query(Party).filter(Party.session_id == "store-1").one()
+    assert party.scene_index == 2
+    assert party.heroes == [{"name": "Hero1", "class": "fighter", "hp": 100}]
+    assert party.updated_at is not None
+
+
+def test_upsert_falls_back_without_dialect_support(db, monkeypatch):
+    """Databases without ON CONFLICT support use the lookup-and-write path"""
+    monkeypatch.setattr(store, "UPSERT_INSERTS", {})
+    assert upsert_parties(db, {"store-3": make_values(1)}) == {"store-3": (1, 1)}
+    db.commit()
+    assert upsert_parties(db, {"store-3": make_values(4)}) == {"store-3": (4, 2)}
+    db.commit()
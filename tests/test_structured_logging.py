@@ -0,0 +1,58 @@
+import io
+import json
+import logging
+import queue
+from src import structured_logging
+from src.structured_logging import DroppingQueueHandler, JSONFormatter, parse_route_sample_rates
+
+
+def test_json_formatter_includes_extra_fields():
+    """Records become one JSON object with their message and extra fields"""
+    record = logging.LogRecord("omega", logging.INFO, __file__, 1, "%s saved", ("party",), None)
+    record.status = 200
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "party saved"
+    assert entry["level"] == "INFO"
+    assert entry["status"] == 200
+
+
+def test_full_queue_drops_and_counts():
+    """A full queue drops records instead of blocking the caller"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("test_structured_logging.full")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(3):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+    assert handler.dropped == 2
+    # Records are queued unformatted; the log thread interpolates them
+    assert handler.queue.get_nowait().args == (0,)
+
+
+def test_records_are_written_by_the_log_thread(monkeypatch):
+    """configure_logging writes JSON lines from a background listener"""
+    monkeypatch.setattr(structured_logging, "_handler", None)
+    monkeypatch.setattr(structured_logging, "_listener", None)
+    root = logging.getLogger()
+    level = root.level
+    stream = io.StringIO()
+    structured_logging.configure_logging("INFO", stream=stream)
+    try:
+        logging.getLogger("test_structured_logging").info("hello %s", "world", extra={"route": "/x"})
+    finally:
+        structured_logging.shutdown_logging()
+        root.setLevel(level)
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry["message"] == "hello world"
+    assert entry["route"] == "/x"
+
+
+def test_parse_route_sample_rates():
+    assert parse_route_sample_rates("/health=0, /api/v1/load/{session_id}=0.25") == {
+        "/health": 0.0,
+        "/api/v1/load/{session_id}": 0.25
+    }
+    assert parse_route_sample_rates("") == {}
@@ -0,0 +1,181 @@
+import random
+import time
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from sqlalchemy.orm import Session
+from src.services.task_graph import (
+    ReadyTasks, TaskGraph, TaskGraphCache, TaskGraphError, graph_cache, ready_cache
+)
+from src.services import task_service
+from src.services.task_service import TaskService
+
+
+def task(task_id, dependencies=(), parallelizable=True):
+    return SimpleNamespace(task_id=task_id, dependencies=list(dependencies),
+                           parallelizable=parallelizable)
+
+
+TASKS = [
+    task("T001", parallelizable=False),
+    task("T002", ["T001"]),
+    task("T003", ["T001"]),
+    task("T004", ["T002", "T003"], parallelizable=False),
+    task("T005", ["T001"]),
+    task("T006", ["T004"]),
+]
+
+
+def test_order_waves_and_critical_path():
+    graph = TaskGraph(reversed(TASKS))
+    assert graph.to_dict() == {
+        "task_count": 6,
+        "order": ["T001", "T002", "T003", "T005", "T004", "T006"],
+        "waves": [["T001"], ["T002", "T003", "T005"], ["T004"], ["T006"]],
+        "critical_path": ["T001", "T002", "T004", "T006"],
+    }
+
+
+def test_tasks_that_are_not_parallelizable_run_alone():
+    graph = TaskGraph([task("T001", parallelizable=False), task("T002", parallelizable=False),
+                       task("T003"), task("T004")])
+    assert graph.waves() == [["T003", "T004"], ["T001"], ["T002"]]
+
+
+def test_cycle_is_reported():
+    tasks = [task("T001"), task("T002", ["T001", "T004"]), task("T003", ["T002"]),
+             task("T004", ["T003"])]
+    with pytest.raises(TaskGraphError, match="cycle: T002 -> T003 -> T004 -> T002"):
+        TaskGraph(tasks)
+
+
+def test_unknown_dependency_is_reported():
+    with pytest.raises(TaskGraphError, match="Unknown dependencies: T009"):
+        TaskGraph([task("T001", ["T009"])])
+
+
+def test_large_feature_resolves():
+    """Thousands of tasks, each depending on the few before it"""
+    tasks = [task(f"T{i:05d}", [f"T{j:05d}" for j in range(max(0, i - 4), i)])
+             for i in range(5000)]
+    graph = TaskGraph(tasks).to_dict()
+    assert len(graph["order"]) == 5000
+    assert len(graph["critical_path"]) == 5000
+
+
+def test_cache_ignores_graphs_read_before_a_change():
+    cache = TaskGraphCache(capacity=2)
+    version = cache.version()
+    cache.invalidate("feature")
+    cache.add("feature", "stale", version)
+    assert cache.get("feature") is None
+    cache.add("feature", "fresh", cache.version())
+    assert cache.get("feature") == "fresh"
+
+
+def test_service_caches_graph_until_dependencies_change():
+    graph_cache.clear()
+    ready_cache.clear()
+    db = Mock(spec=Session)
+    db.query().filter().all.return_value = TASKS
+    stored = SimpleNamespace(task_id="T006", feature_id=uuid.uuid4(), status="Not Started",
+                             dependencies=["T004"])
+    db.query().filter().first.return_value = stored
+    service = TaskService(db)
+    feature_id = stored.feature_id
+
+    graph = service.get_task_graph(feature_id)
+    assert service.get_task_graph(feature_id) is graph
+
+    # A status change leaves the dependency graph as it was
+    service.mark_task_complete("T006")
+    assert service.get_task_graph(feature_id) is graph
+
+    service.update_task("T006", dependencies=["T005"])
+    assert service.get_task_graph(feature_id) is not graph
+
+
+def ready_ids(ready):
+    return [task["task_id"] for task in ready.tasks()]
+
+
+def test_ready_tasks_follow_completion():
+    ready = ReadyTasks(TaskGraph(TASKS), {"T001": "Complete", "T002": "In Progress"})
+    assert ready.tasks() == [{"task_id": "T002", "status": "In Progress"},
+                             {"task_id": "T003", "status": None},
+                             {"task_id": "T005", "status": None}]
+    ready.set_status("T002", "Complete")
+    assert ready_ids(ready) == ["T003", "T005"]
+    ready.set_status("T003", "Complete")
+    assert ready_ids(ready) == ["T004", "T005"]
+    # Reopening a task blocks its dependents again
+    ready.set_status("T001", "In Progress")
+    assert ready_ids(ready) == ["T001", "T004"]
+
+
+def test_ready_index_matches_a_full_scan():
+    rng = random.Random(7)
+    tasks = [task(f"T{i:03d}", rng.sample([f"T{j:03d}" for j in range(i)], min(i, 3)))
+             for i in range(200)]
+    statuses = {}
+    ready = ReadyTasks(TaskGraph(tasks), statuses)
+    for _ in range(500):
+        task_id = rng.choice(tasks).task_id
+        statuses[task_id] = rng.choice(["Complete", "Complete", "In Progress"])
+        ready.set_status(task_id, statuses[task_id])
+        expected = [t.task_id for t in tasks if statuses.get(t.task_id) != "Complete"
+                    and all(statuses.get(dep) == "Complete" for dep in t.dependencies)]
+        assert ready_ids(ready) == expected
+
+
+def test_service_updates_ready_tasks_without_querying():
+    graph_cache.clear()
+    ready_cache.clear()
+    db = Mock(spec=Session)
+    db.query().filter().all.side_effect = [TASKS, [("T001", "Complete")]]
+    feature_id = uuid.uuid4()
+    db.query().filter().first.return_value = SimpleNamespace(
+        task_id="T002", feature_id=feature_id, status="Not Started"
+    )
+    service = TaskService(db)
+
+    assert [t["task_id"] for t in service.get_ready_tasks(feature_id)] == ["T002", "T003", "T005"]
+    service.mark_task_complete("T002")
+    assert [t["task_id"] for t in service.get_ready_tasks(feature_id)] == ["T003", "T005"]
+    assert db.query().filter().all.call_count == 2
+
+
+def test_cache_entries_expire_after_ttl(monkeypatch):
+    """Graphs changed by another process are picked up once the TTL runs out"""
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TaskGraphCache(capacity=2, ttl=30)
+    cache.add("feature", "graph", cache.version())
+    now[0] += 29
+    assert cache.get("feature") == "graph"
+    now[0] += 2
+    assert cache.get("feature") is None
+
+
+def test_ready_tasks_pick_up_changes_made_elsewhere(monkeypatch):
+    """Statuses changed outside the service show once the index expires"""
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(task_service, "ready_cache", TaskGraphCache(ttl=5))
+    graph_cache.clear()
+    db = Mock(spec=Session)
+    db.query().filter().all.side_effect = [
+        TASKS,
+        [("T001", "Complete")],
+        # Another worker completed T002 and T003
+        [("T001", "Complete"), ("T002", "Complete"), ("T003", "Complete")],
+    ]
+    service = TaskService(db)
+    feature_id = uuid.uuid4()
+
+    assert [t["task_id"] for t in service.get_ready_tasks(feature_id)] == ["T002", "T003", "T005"]
+    now[0] += 4
+    assert [t["task_id"] for t in service.get_ready_tasks(feature_id)] == ["T002", "T003", "T005"]
+    now[0] += 2
+    assert [t["task_id"] for t in service.get_ready_tasks(feature_id)] == ["T004", "T005"]
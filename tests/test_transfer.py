@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from app import main
+from app.main import app
+from app.models import PartySave
+from app.transfer import iter_export, import_lines, iter_lines
+
+client = TestClient(app)
+
+
+def make_record(session_id, scene_index):
+    return {
+        "session_id": session_id,
+        "state": {
+            "scene_index": scene_index,
+            "party_name": f"Party {session_id}",
+            "heroes": [{"name": "Hero1", "class": "fighter", "hp": 100}],
+            "symbol_choice": None,
+            "choices": {}
+        }
+    }
+
+
+def test_import_then_export_round_trip(session_factory):
+    """Imported records come back out of the export in session order"""
+    records = [make_record(f"transfer-{i:02d}", i) for i in range(7)]
+    lines = [json.dumps(record).encode() for record in reversed(records)]
+    lines.insert(3, b"")
+    lines.insert(4, b"{not json")
+
+    result = import_lines(session_factory, lines, batch_size=3)
+    assert result["imported"] == 7
+    assert result["error_count"] == 1
+    assert result["errors"][0]["line"] == 5
+
+    exported = [json.loads(line) for line in iter_export(session_factory, chunk_size=2)]
+    assert [line["session_id"] for line in exported] == [record["session_id"] for record in records]
+    assert exported[3]["state"] == records[3]["state"]
+
+
+def test_iter_lines_handles_split_chunks():
+    """Lines split across chunks are reassembled"""
+    assert list(iter_lines([b'{"a":', b'1}\n{"b"', b":2}"])) == [b'{"a":1}', b'{"b":2}']
+    assert list(iter_lines([b"x"] * 5 + [b"\n\ny\n", b"z"])) == [b"xxxxx", b"", b"y", b"z"]
+
+
+def test_iter_lines_drops_lines_over_the_limit():
+    """Long lines are dropped as they stream in, not buffered whole"""
+    chunks = [b"ab\n", b"x" * 3, b"x" * 3, b"x\ncd", b"efg", b"\n", b"x" * 9]
+    assert list(iter_lines(chunks, max_line_bytes=6)) == [b"ab", None, b"cdefg", None]
+
+
+def test_import_validates_records_like_saves(session_factory):
+    """Records the save endpoint would reject are reported by line"""
+    invalid = make_record("transfer-invalid", 1)
+    invalid["state"]["heroes"] = "not a list"
+    lines = [json.dumps(make_record("transfer-valid", 1)).encode(), json.dumps(invalid).encode(),
+             json.dumps({"session_id": "", "state": make_record("x", 1)["state"]}).encode()]
+
+    result = import_lines(session_factory, lines)
+    assert result["imported"] == 1
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert "state.heroes" in result["errors"][0]["error"]
+
+
+def test_import_and_export_endpoints():
+    """The HTTP endpoints stream NDJSON in and out"""
+    body = b"\n".join(json.dumps(make_record(f"transfer-api-{i}", i)).encode() for i in range(3))
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)] + [b"\n{broken"]
+    response = client.post("/api/v1/import", content=iter(chunks),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["imported"] == 3
+    assert response.json()["errors"][0]["line"] == 4
+
+    response = client.get("/api/v1/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    session_ids = [json.loads(line)["session_id"] for line in response.text.splitlines()]
+    assert {"transfer-api-0", "transfer-api-1", "transfer-api-2"} <= set(session_ids)
+
+
+def test_import_endpoint_reports_oversized_records(monkeypatch):
+    """A record longer than a save body may be is a line error, however long"""
+    monkeypatch.setattr(main, "SAVE_MAX_BODY_BYTES", 1024)
+    body = json.dumps(make_record("transfer-small", 1)).encode() + b"\n" + b"x" * 5000
+    response = client.post("/api/v1/import", content=iter([body[i:i + 100] for i in range(0, len(body), 100)]))
+    assert response.json()["imported"] == 1
+    assert response.json()["errors"] == [{"line": 2, "error": "Record is too long"}]
+
+
+def test_command_line_import_records_history(tmp_path):
+    """Offline imports go through the same hooks as the import endpoint"""
+    path = tmp_path / "parties.ndjson"
+    path.write_bytes(b"\n".join(json.dumps(make_record(f"transfer-cli-{i}", i)).encode() for i in range(3)))
+    url = f"sqlite:///{tmp_path}/cli.db"
+    env = {**os.environ, "DATABASE_URL": url, "SAVE_HISTORY_ENABLED": "true"}
+    result = subprocess.run([sys.executable, "-m", "app.transfer", "import", str(path), "--batch-size", "2"],
+                            env=env, capture_output=True, check=True)
+    assert json.loads(result.stderr.splitlines()[-1])["imported"] == 3
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(PartySave.__table__)).scalar() == 3
+    engine.dispose()